@@ -15,7 +15,10 @@ admin.site.register(
         models.Specification,
         models.ServiceLocation,
         models.PeopleRole,
-        models.PeopleType
+        models.PeopleType,
+        models.Holiday,
+        models.PayrollBatch,
+        models.Visit,
     ]
 )
 
@@ -4,6 +4,7 @@ from rest_framework.serializers import ValidationError
 
 from .models import People, PeopleDetailedInfo
 from .models import PeopleDetailTypeChoices as pdc
+from .utils import normalize_persian
 
 
 class ManipulateInfo:
@@ -43,7 +44,6 @@ class ManipulateInfo:
 
         for data in data_list:
             if data.get("id") is None:
-
                 value_len = len(data["value"])
                 is_digit = data["value"].isdigit()
                 if value_len == 11 and is_digit:
@@ -77,7 +77,6 @@ class ManipulateInfo:
                 self._manipulation_values.add(duplicates[info.pk]["value"])
 
             elif duplicates[info.pk].get("note") != info.note:
-
                 info.note = duplicates[info.pk].get("note")
                 self._note_manipulations_queue.append(info)
 
@@ -92,9 +91,14 @@ class ManipulateInfo:
             self._disable_queue.append(info)
 
     def _validate_queues(self):
-        duplicates = self._manipulation_values.intersection(
-            self._creation_values
-        )
+        # values are compared in their normalized form, so the same phone
+        # number typed with persian digits is still caught as a duplicate
+        creation_values = {normalize_persian(v) for v in self._creation_values}
+        manipulation_values = {
+            normalize_persian(v) for v in self._manipulation_values
+        }
+
+        duplicates = manipulation_values.intersection(creation_values)
         if duplicates:
             raise ValidationError(
                 {
@@ -106,7 +110,7 @@ class ManipulateInfo:
             )
 
         duplicates = PeopleDetailedInfo.objects.filter(
-            value__in=[*self._creation_values, *self._manipulation_values],
+            value_normalized__in=[*creation_values, *manipulation_values],
         )
         if duplicates.exists():
             raise ValidationError(
@@ -137,7 +141,6 @@ class ManipulateInfo:
                 self._disable_queue.append(info)
 
     def manipulate(self):
-
         PeopleDetailedInfo.objects.bulk_create(self._creation_queue)
 
         PeopleDetailedInfo.objects.bulk_update(
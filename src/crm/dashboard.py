@@ -0,0 +1,72 @@
+from django.core.cache import cache
+from django.db.models import Count, Q, QuerySet, Sum
+
+from . import models, utils
+
+CACHE_TIMEOUT = 60
+_CACHE_NAME = "dashboard"
+
+
+def invalidate():
+    """
+    Dropping the cached statistics, called whenever people, calls,
+    orders, contracts or payments change.
+    """
+
+    utils.invalidate_cache_version(_CACHE_NAME)
+
+
+def _windows(
+    qs: QuerySet, field: str, windows: list, aggregate=Count, over="pk"
+) -> tuple:
+    """
+    Aggregating both windows over the queryset in one query, every
+    window only aggregates the rows whose field falls inside it.
+    """
+
+    result = qs.order_by().aggregate(
+        **{
+            f"window_{index}": aggregate(
+                over,
+                filter=Q(**{f"{field}__gte": start, f"{field}__lte": end}),
+            )
+            for index, (start, end) in enumerate(windows)
+        }
+    )
+    return tuple(
+        result[f"window_{index}"] or 0 for index in range(len(windows))
+    )
+
+
+def dashboard_stats() -> dict[str, tuple[int, int]]:
+    """
+    Numbers of the dashboard cards, within the last month and the month
+    before it. Every table is aggregated once and the result is cached
+    until those tables change.
+
+    Returns:
+        Last month and previous month values of new clients, calls,
+        orders, contracts and incomes.
+    """
+
+    windows = [utils.get_month_start_end(1), utils.get_month_start_end(2)]
+
+    # windows move every day, so they are part of the key too
+    version = utils.get_cache_version(_CACHE_NAME)
+    key = f"{_CACHE_NAME}:{version}:{str(windows[0][1])}"
+    stats = cache.get(key)
+    if stats is not None:
+        return stats
+
+    stats = {
+        "clients": _windows(models.People.clients, "joined_at", windows),
+        "calls": _windows(models.Call.objects, "called_at", windows),
+        "orders": _windows(models.Order.objects, "order_at", windows),
+        "contracts": _windows(models.Contract.objects, "contract_at", windows),
+        "incomes": _windows(
+            models.Payment.incomes, "paid_at", windows, Sum, "amount"
+        ),
+    }
+
+    cache.set(key, stats, CACHE_TIMEOUT)
+    return stats
@@ -1,7 +1,8 @@
 from typing import Any, Sequence
 
 from django import forms
-from . import models
+
+from . import models, utils
 
 
 class StyledCharfiled(forms.CharField):
@@ -20,6 +21,25 @@ class StyledChoicefield(forms.ChoiceField):
         )
 
 
+class JDateFormField(StyledCharfiled):
+    """
+    Jalali date typed like 1402/05/06, cleaned into a jalali date.
+    """
+
+    def to_python(self, value):
+        value = super().to_python(value)
+        if value in self.empty_values:
+            return None
+
+        try:
+            return utils.parse_jdate(value)
+        except ValueError:
+            raise forms.ValidationError("تاریخ وارد شده معتبر نیست.")
+
+    def prepare_value(self, value):
+        return "" if value is None else str(value)
+
+
 class TestForm(forms.Form):
     firstname = StyledCharfiled(label="نام")
     lastname = StyledCharfiled(label="نام خانوادگی")
@@ -27,7 +47,7 @@ class TestForm(forms.Form):
     gender = StyledChoicefield(
         choices=models.GenderChoices.choices, label="جنسیت"
     )
-    birthdate = StyledCharfiled(label="تاریخ تولد", required=False)
+    birthdate = JDateFormField(label="تاریخ تولد", required=False)
     note = StyledCharfiled(label="یادداشت", required=False)
 
     def __init__(self, *args, **kwargs):
@@ -36,6 +56,6 @@ class TestForm(forms.Form):
         self.fields["national_code"].widget.attrs["placeholder"] = "0023403616"
         self.fields["firstname"].widget.attrs["placeholder"] = "عرفان"
         self.fields["lastname"].widget.attrs["placeholder"] = "رضایی"
-        self.fields["note"].widget.attrs[
-            "placeholder"
-        ] = "برای یادداشت کردن کلیک کنید..."
+        self.fields["note"].widget.attrs["placeholder"] = (
+            "برای یادداشت کردن کلیک کنید..."
+        )
@@ -0,0 +1,192 @@
+import heapq
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, NamedTuple
+
+from django.db import OperationalError, close_old_connections, connection
+
+from . import models, utils
+from .models import SearchEntityChoices as sec
+
+REFERRAL = "referral"
+_CACHE_NAME = "fuzzy"
+
+# same defaults as pg_trgm, so both backends suggest the same names
+SIMILARITY_THRESHOLD = 0.3
+DEFAULT_BUDGET = 0.2
+
+_WORD_RE = re.compile(r"\w+")
+
+
+class Match(NamedTuple):
+    entity: str
+    id: int
+    name: str
+    score: float
+
+
+def trigrams(text: str) -> set[str]:
+    """
+    Splitting the normalized text into trigrams the way pg_trgm does,
+    every word is padded by two spaces before and one after it.
+    """
+
+    grams = set()
+    for word in _WORD_RE.findall(utils.normalize_persian(text)):
+        padded = f"  {word} "
+        grams.update(padded[i : i + 3] for i in range(len(padded) - 2))
+
+    return grams
+
+
+class TrigramIndex:
+    """
+    In-process trigram index over names, used where the database has no
+    trigram support.
+    """
+
+    def __init__(self, names: Iterable[tuple[str, int, str]]) -> None:
+        self.names: dict[tuple[str, int], tuple[str, int]] = {}
+        self.postings: dict[str, list[tuple[str, int]]] = defaultdict(list)
+
+        for entity, pk, name in names:
+            grams = trigrams(name)
+            self.names[(entity, pk)] = (name, len(grams))
+            for gram in grams:
+                self.postings[gram].append((entity, pk))
+
+    def search(self, text: str, limit: int, deadline: float) -> list[Match]:
+        """
+        Finding the names most similar to the given text, candidates
+        found before the deadline are ranked when it passes.
+        """
+
+        grams = trigrams(text)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self.postings.get(gram, ()))
+            if time.monotonic() > deadline:
+                break
+
+        matches = []
+        for key, count in shared.items():
+            name, name_grams = self.names[key]
+            score = count / (len(grams) + name_grams - count)
+            if score >= SIMILARITY_THRESHOLD:
+                matches.append(Match(*key, name, round(score, 3)))
+
+        return heapq.nlargest(limit, matches, key=lambda match: match.score)
+
+
+def invalidate():
+    """
+    Marking the names as changed, called whenever people or referrals
+    are saved or deleted. Indexes are rebuilt in the background.
+    """
+
+    utils.invalidate_cache_version(_CACHE_NAME)
+
+
+_index_lock = threading.Lock()
+_index: dict = {"version": None, "index": None, "building": False}
+# indexes are rebuilt off the request path, one at a time
+_builder = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fuzzy")
+
+
+def _build(version: int):
+    index = None
+    try:
+        people = models.People.objects.values_list(
+            "pk", "firstname", "lastname"
+        )
+        referrals = models.Referral.objects.values_list("pk", "title")
+        index = TrigramIndex(
+            [
+                *(
+                    (sec.PEOPLE, pk, f"{firstname} {lastname}")
+                    for pk, firstname, lastname in people
+                ),
+                *((REFERRAL, pk, title) for pk, title in referrals),
+            ]
+        )
+    finally:
+        # the worker thread holds its own connection
+        close_old_connections()
+        with _index_lock:
+            _index["building"] = False
+            if index is not None:
+                _index["version"], _index["index"] = version, index
+
+
+def _get_index() -> TrigramIndex | None:
+    # the index of the current names, the previous one while they are
+    # rebuilt and None until the first one is built
+    version = utils.get_cache_version(_CACHE_NAME)
+    with _index_lock:
+        if _index["version"] != version and not _index["building"]:
+            _index["building"] = True
+            _builder.submit(_build, version)
+
+        return _index["index"]
+
+
+def similar_names(
+    text: str, limit: int = 5, budget: float = DEFAULT_BUDGET
+) -> list[Match]:
+    """
+    Finding people and referrals whose names look like the given text,
+    for suggesting the intended name of a misspelled query.
+
+    Args:
+        text: Text typed by the user.
+        limit: Maximum number of returned names.
+        budget: Seconds the lookup may take, slower lookups return fewer
+            or no names instead of holding the request. So do lookups
+            made before the names are first indexed.
+
+    Returns:
+        Names ordered by their similarity, most similar first.
+    """
+
+    if not trigrams(text):
+        return []
+
+    if connection.vendor == "postgresql":
+        return _postgres_similar_names(text, limit, budget)
+
+    index = _get_index()
+    if index is None:
+        return []
+
+    return index.search(text, limit, time.monotonic() + budget)
+
+
+def _postgres_similar_names(text, limit, budget):
+    # the expressions must match the trigram indexes of the migration
+    fullname = "(firstname_normalized || ' ' || lastname_normalized)"
+    text = utils.normalize_persian(text)
+
+    try:
+        with utils.statement_timeout(budget), connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT %s, id, firstname || ' ' || lastname, "
+                f"similarity({fullname}, %s) AS score "
+                f"FROM crm_people WHERE {fullname} %% %s "
+                "UNION ALL "
+                "SELECT %s, id, title, similarity(title_normalized, %s) "
+                "FROM crm_referral WHERE title_normalized %% %s "
+                "ORDER BY score DESC LIMIT %s",
+                [sec.PEOPLE, text, text, REFERRAL, text, text, limit],
+            )
+            rows = cursor.fetchall()
+    except OperationalError:
+        # statement timeout, no suggestion is better than a slow search
+        return []
+
+    return [
+        Match(entity, pk, name, round(score, 3))
+        for entity, pk, name, score in rows
+    ]
@@ -0,0 +1,271 @@
+import datetime
+from functools import lru_cache
+from typing import Iterable, Iterator
+
+import jdatetime
+
+# years covered by the tables, dates outside of them fall back to the
+# slower conversions of jdatetime
+FIRST_YEAR = 1300
+LAST_YEAR = 1500
+
+JDATE_FORMAT = "%Y/%m/%d"
+
+# days between the first day of the year and the first day of each month
+_MONTH_STARTS = (0, 31, 62, 93, 124, 155, 186, 216, 246, 276, 306, 336)
+
+# gregorian ordinal of 1 farvardin of every covered year, plus the year
+# after the last one for knowing the length of the last year. Built with
+# jdatetime so both always agree on leap years.
+_YEAR_STARTS = tuple(
+    jdatetime.date(year, 1, 1).togregorian().toordinal()
+    for year in range(FIRST_YEAR, LAST_YEAR + 2)
+)
+_FIRST_ORDINAL = _YEAR_STARTS[0]
+_LAST_ORDINAL = _YEAR_STARTS[-1] - 1
+_MEAN_YEAR_DAYS = (_YEAR_STARTS[-1] - _FIRST_ORDINAL) / len(_YEAR_STARTS[1:])
+
+
+class JDate(jdatetime.date):
+    """
+    Jalali date of a JDateField, printed the way dates are typed and
+    shown all over the app, like 1402/05/06. Conversions and arithmetic
+    are served by the precomputed tables of this module.
+    """
+
+    def __str__(self) -> str:
+        return to_string(self)
+
+    def __format__(self, spec: str) -> str:
+        # jdatetime formats an empty spec as an empty string, f-strings
+        # without a spec print the date like str
+        return str(self) if not spec else super().__format__(spec)
+
+    def __hash__(self) -> int:
+        # equal to the hash of jdatetime dates of the same day
+        return hash(to_gregorian(self))
+
+    def __add__(self, other):
+        if isinstance(other, datetime.timedelta):
+            return from_ordinal(to_ordinal(self) + other.days)
+
+        return super().__add__(other)
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        if isinstance(other, datetime.timedelta):
+            return from_ordinal(to_ordinal(self) - other.days)
+
+        if isinstance(other, (jdatetime.date, datetime.date)):
+            return datetime.timedelta(
+                days=to_ordinal(self) - to_ordinal(other)
+            )
+
+        return super().__sub__(other)
+
+    def togregorian(self) -> datetime.date:
+        return to_gregorian(self)
+
+
+def is_leap(year: int) -> bool:
+    return days_in_month(year, 12) == 30
+
+
+def days_in_month(year: int, month: int) -> int:
+    if month <= 6:
+        return 31
+
+    if month < 12:
+        return 30
+
+    if FIRST_YEAR <= year <= LAST_YEAR:
+        index = year - FIRST_YEAR
+        return _YEAR_STARTS[index + 1] - _YEAR_STARTS[index] - 336
+
+    return 30 if jdatetime.date(year, 1, 1).isleap() else 29
+
+
+def to_ordinal(date: jdatetime.date | datetime.date) -> int:
+    """
+    Day number of the given jalali or gregorian date, the same number
+    datetime.date.toordinal gives for the gregorian date of that day.
+    """
+
+    if not isinstance(date, jdatetime.date):
+        return date.toordinal()
+
+    year = date.year
+    if FIRST_YEAR <= year <= LAST_YEAR:
+        return (
+            _YEAR_STARTS[year - FIRST_YEAR]
+            + _MONTH_STARTS[date.month - 1]
+            + date.day
+            - 1
+        )
+
+    return jdatetime.date.togregorian(date).toordinal()
+
+
+# about ninety years of days, building a jdatetime date is the slowest
+# part of a conversion
+@lru_cache(maxsize=1 << 15)
+def from_ordinal(ordinal: int) -> JDate:
+    """
+    Jalali date of the given day number. Dates are immutable, so each
+    day is built once and shared by every later conversion.
+    """
+
+    if not _FIRST_ORDINAL <= ordinal <= _LAST_ORDINAL:
+        jdate = jdatetime.date.fromgregorian(
+            date=datetime.date.fromordinal(ordinal)
+        )
+        return JDate(jdate.year, jdate.month, jdate.day)
+
+    # the estimate is off by at most one year
+    index = int((ordinal - _FIRST_ORDINAL) / _MEAN_YEAR_DAYS)
+    if _YEAR_STARTS[index] > ordinal:
+        index -= 1
+    elif _YEAR_STARTS[index + 1] <= ordinal:
+        index += 1
+
+    day_of_year = ordinal - _YEAR_STARTS[index]
+    if day_of_year < 186:
+        month = day_of_year // 31 + 1
+    else:
+        month = (day_of_year - 186) // 30 + 7
+
+    return JDate(
+        FIRST_YEAR + index, month, day_of_year - _MONTH_STARTS[month - 1] + 1
+    )
+
+
+def from_parts(year: int, month: int, day: int) -> JDate:
+    """
+    Jalali date of the given parts.
+
+    Raises:
+        ValueError: The parts do not make a valid date.
+    """
+
+    if not FIRST_YEAR <= year <= LAST_YEAR:
+        return JDate(year, month, day)
+
+    if not 1 <= month <= 12 or not 1 <= day <= days_in_month(year, month):
+        raise ValueError(f"invalid jalali date: {year}/{month}/{day}")
+
+    return from_ordinal(
+        _YEAR_STARTS[year - FIRST_YEAR] + _MONTH_STARTS[month - 1] + day - 1
+    )
+
+
+def from_gregorian(date: datetime.date) -> JDate:
+    return from_ordinal(date.toordinal())
+
+
+def to_gregorian(date: jdatetime.date) -> datetime.date:
+    return datetime.date.fromordinal(to_ordinal(date))
+
+
+def to_string(date: jdatetime.date) -> str:
+    """
+    Formatting the given date like 1402/05/06, the same as strftime with
+    JDATE_FORMAT but without parsing the format for every date.
+    """
+
+    return f"{date.year:04d}/{date.month:02d}/{date.day:02d}"
+
+
+def today() -> JDate:
+    """
+    Jalali date of today. Only the gregorian date is looked up, its
+    conversion is memoized until the day changes.
+    """
+
+    return from_ordinal(datetime.date.today().toordinal())
+
+
+def from_gregorian_many(
+    dates: Iterable[datetime.date | None],
+) -> list[JDate | None]:
+    """
+    Converting a whole column of gregorian dates in one call, nulls are
+    kept as they are.
+    """
+
+    return [
+        None if date is None else from_ordinal(date.toordinal())
+        for date in dates
+    ]
+
+
+def to_gregorian_many(
+    dates: Iterable[jdatetime.date | None],
+) -> list[datetime.date | None]:
+    """
+    Converting a whole column of jalali dates in one call, nulls are
+    kept as they are.
+    """
+
+    fromordinal = datetime.date.fromordinal
+    return [
+        None if date is None else fromordinal(to_ordinal(date))
+        for date in dates
+    ]
+
+
+def to_string_many(dates: Iterable[jdatetime.date | None]) -> list[str]:
+    """
+    Formatting a whole column of dates in one call, nulls become empty
+    strings.
+    """
+
+    return ["" if date is None else to_string(date) for date in dates]
+
+
+def date_range(start: jdatetime.date, end: jdatetime.date) -> list[JDate]:
+    """
+    Every day from the start until the end, both included.
+    """
+
+    return [
+        from_ordinal(ordinal)
+        for ordinal in range(to_ordinal(start), to_ordinal(end) + 1)
+    ]
+
+
+def calendar(first_year: int, last_year: int) -> Iterator[dict]:
+    """
+    Calendar attributes of every day of the given jalali years, weeks
+    start on saturday and the first week of a year is the one holding
+    1 farvardin.
+
+    Args:
+        first_year: First year of the calendar.
+        last_year: Last year of the calendar, included.
+
+    Returns:
+        Date, year, quarter, month, day, week, weekday and the first and
+        last day of the month, of each day in order.
+    """
+
+    for year in range(first_year, last_year + 1):
+        first_weekday = from_parts(year, 1, 1).weekday()
+
+        for month in range(1, 13):
+            month_start = from_parts(year, month, 1)
+            month_end = from_parts(year, month, days_in_month(year, month))
+
+            for date in date_range(month_start, month_end):
+                day_of_year = _MONTH_STARTS[month - 1] + date.day - 1
+                yield dict(
+                    date=date,
+                    year=year,
+                    quarter=(month - 1) // 3 + 1,
+                    month=month,
+                    day=date.day,
+                    week=(day_of_year + first_weekday) // 7 + 1,
+                    weekday=date.weekday(),
+                    month_start=month_start,
+                    month_end=month_end,
+                )
@@ -0,0 +1,86 @@
+import datetime
+import timeit
+
+import jdatetime
+from django.core.management.base import BaseCommand
+
+from crm import jalali
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare jalali date conversions of the precomputed tables with "
+        "the jdatetime ones."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--size",
+            type=int,
+            default=10000,
+            help="Number of dates converted by each run.",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=5,
+            help=(
+                "Number of runs, the fastest one is reported, which is the "
+                "one served by warm caches."
+            ),
+        )
+
+    def handle(self, *args, **options):
+        size = options["size"]
+
+        # spread over about thirty years, like the dates of a column
+        first = datetime.date(2000, 1, 1).toordinal()
+        gdates = [
+            datetime.date.fromordinal(first + index * 7919 % 11000)
+            for index in range(size)
+        ]
+        jdates = jalali.from_gregorian_many(gdates)
+        plain_jdates = [
+            jdatetime.date(date.year, date.month, date.day) for date in jdates
+        ]
+
+        cases = [
+            (
+                "gregorian to jalali",
+                lambda: [jdatetime.date.fromgregorian(date=d) for d in gdates],
+                lambda: jalali.from_gregorian_many(gdates),
+            ),
+            (
+                "jalali to gregorian",
+                lambda: [d.togregorian() for d in plain_jdates],
+                lambda: jalali.to_gregorian_many(jdates),
+            ),
+            (
+                "formatting",
+                lambda: [
+                    d.strftime(jalali.JDATE_FORMAT) for d in plain_jdates
+                ],
+                lambda: jalali.to_string_many(jdates),
+            ),
+            (
+                "today",
+                lambda: [jdatetime.date.today() for _ in range(size)],
+                lambda: [jalali.today() for _ in range(size)],
+            ),
+        ]
+
+        self.stdout.write(
+            f"{'':<22}{'jdatetime':>12}{'tables':>12}{'speedup':>10}"
+        )
+        for title, old, new in cases:
+            old_time = self._best(old, options["repeat"]) / size
+            new_time = self._best(new, options["repeat"]) / size
+            self.stdout.write(
+                f"{title:<22}"
+                f"{old_time * 1e6:>10.2f}us"
+                f"{new_time * 1e6:>10.2f}us"
+                f"{old_time / new_time:>9.1f}x"
+            )
+
+    def _best(self, function, repeat: int) -> float:
+        return min(timeit.repeat(function, number=1, repeat=repeat))
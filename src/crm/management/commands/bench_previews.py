@@ -0,0 +1,166 @@
+import asyncio
+import itertools
+import statistics
+import time
+
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+
+from crm import models, previews
+
+# path of the previews of each entity and their objects
+_PREVIEWS = {
+    previews.ORDER: ("orders", models.Order.objects),
+    previews.CONTRACT: ("contracts", models.Contract.objects),
+    previews.CLIENT: ("clients", models.People.clients),
+    previews.PERSONNEL: ("personnel", models.People.personnels),
+    previews.PATIENT: ("patients", models.People.patients),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the latency of the sync and async preview views under "
+        "concurrent requests, served by the ASGI application in process."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--entity",
+            choices=previews.PREVIEWS,
+            default=previews.PERSONNEL,
+            help="Type of the requested previews.",
+        )
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=200,
+            help=(
+                "Number of requests of each view, every one asks for "
+                "another object while there are enough of them."
+            ),
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=16,
+            help="Number of requests on the fly at once.",
+        )
+
+    def handle(self, *args, **options):
+        if options["requests"] < 1 or options["concurrency"] < 1:
+            raise CommandError("Requests and concurrency have to be positive.")
+
+        entity = options["entity"]
+        path, objects = _PREVIEWS[entity]
+        ids = list(
+            objects.order_by("pk").values_list("pk", flat=True)[
+                : options["requests"]
+            ]
+        )
+        if not ids:
+            raise CommandError(f"There is no {entity} to preview.")
+
+        application = get_asgi_application()
+        self.stdout.write(
+            f"{len(ids)} {entity} previews, {options['requests']} requests, "
+            f"{options['concurrency']} at once"
+        )
+        self.stdout.write(
+            f"{'':<8}{'built':>8}{'mean':>10}{'p50':>10}{'p95':>10}"
+            f"{'max':>10}{'req/s':>10}"
+        )
+        for title, prefix in (
+            ("sync", f"/crm/api/{path}/"),
+            ("async", f"/crm/api/async/{path}/"),
+        ):
+            # every preview is built once by each view
+            previews.invalidate((entity, id) for id in ids)
+            misses = previews.stats()["misses"]
+
+            began = time.perf_counter()
+            latencies = asyncio.run(
+                self._run(
+                    application,
+                    [
+                        f"{prefix}{id}/"
+                        for id in itertools.islice(
+                            itertools.cycle(ids), options["requests"]
+                        )
+                    ],
+                    options["concurrency"],
+                )
+            )
+            elapsed = time.perf_counter() - began
+
+            self.stdout.write(
+                f"{title:<8}"
+                f"{previews.stats()['misses'] - misses:>8}"
+                f"{statistics.mean(latencies) * 1e3:>8.1f}ms"
+                f"{statistics.median(latencies) * 1e3:>8.1f}ms"
+                f"{self._percentile(latencies, 95) * 1e3:>8.1f}ms"
+                f"{max(latencies) * 1e3:>8.1f}ms"
+                f"{len(latencies) / elapsed:>10.1f}"
+            )
+
+    async def _run(
+        self, application, paths: list[str], concurrency: int
+    ) -> list[float]:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def request(path: str) -> float:
+            async with semaphore:
+                return await self._request(application, path)
+
+        return await asyncio.gather(*(request(path) for path in paths))
+
+    async def _request(self, application, path: str) -> float:
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "root_path": "",
+            "query_string": b"",
+            "headers": [(b"host", b"localhost")],
+            "client": ("127.0.0.1", 0),
+            "server": ("localhost", 80),
+        }
+        body_sent = False
+        disconnect = asyncio.Event()
+
+        async def receive() -> dict:
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": b""}
+
+            # the client stays connected until the response is sent
+            await disconnect.wait()
+            return {"type": "http.disconnect"}
+
+        status = None
+
+        async def send(message: dict):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+
+        began = time.perf_counter()
+        await application(scope, receive, send)
+        latency = time.perf_counter() - began
+        disconnect.set()
+
+        if status != 200:
+            raise CommandError(f"{path} answered {status}.")
+
+        return latency
+
+    def _percentile(self, values: list[float], percent: int) -> float:
+        if len(values) < 2:
+            return values[0]
+
+        return statistics.quantiles(values, n=100)[percent - 1]
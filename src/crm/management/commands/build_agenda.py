@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from crm import models
+
+
+class Command(BaseCommand):
+    help = (
+        "Build the agendas of the personnel for the coming days, meant to "
+        "run nightly after generate_visits."
+    )
+
+    def handle(self, *args, **options):
+        built = models.AgendaSnapshot.build()
+
+        self.stdout.write(self.style.SUCCESS(f"{built} agendas built."))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from crm import jalali, models
+
+
+class Command(BaseCommand):
+    help = "Build the jalali calendar table joined by reports."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--first-year",
+            type=int,
+            default=jalali.FIRST_YEAR,
+            help="First jalali year of the calendar.",
+        )
+        parser.add_argument(
+            "--last-year",
+            type=int,
+            default=jalali.LAST_YEAR,
+            help="Last jalali year of the calendar, included.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of days stored per query.",
+        )
+
+    def handle(self, *args, **options):
+        built = models.JalaliDay.build(
+            options["first_year"],
+            options["last_year"],
+            batch_size=options["batch_size"],
+        )
+
+        self.stdout.write(self.style.SUCCESS(f"{built} jalali days built."))
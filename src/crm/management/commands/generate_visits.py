@@ -0,0 +1,56 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from crm import utils, visits
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate the scheduled visits of the coming days from the "
+        "calendars of the contracts, meant to run daily."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=visits.HORIZON_DAYS,
+            help="Number of days generated ahead.",
+        )
+        parser.add_argument(
+            "--start",
+            help="First generated jalali day, today by default.",
+        )
+        parser.add_argument(
+            "--pending",
+            action="store_true",
+            help=(
+                "Only generate when holidays changed since the last run, "
+                "meant to run every few minutes."
+            ),
+        )
+
+    def handle(self, *args, **options):
+        if options["days"] < 1:
+            raise CommandError("At least one day has to be generated.")
+
+        start = None
+        if options["start"]:
+            try:
+                start = utils.parse_jdate(options["start"])
+            except ValueError:
+                raise CommandError("Invalid jalali date.")
+
+        if options["pending"] and not visits.take_holidays_changed():
+            self.stdout.write("Holidays did not change, nothing generated.")
+            return
+
+        began = time.perf_counter()
+        generated, removed = visits.generate(start=start, days=options["days"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{generated} visits written and {removed} removed in "
+                f"{time.perf_counter() - began:.2f}s."
+            )
+        )
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+
+from crm import models
+
+
+class Command(BaseCommand):
+    help = "Rebuild the daily rollups behind the dashboard charts."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "days",
+            nargs="*",
+            help="Only rebuild the given jalali days, all days by default.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100,
+            help="Number of days refreshed per batch.",
+        )
+
+    def handle(self, *args, **options):
+        days = set(options["days"])
+        if not days:
+            sources = [
+                (models.People.objects, "joined_at"),
+                (models.Order.objects, "order_at"),
+                (models.Contract.objects, "contract_at"),
+                (models.Call.objects, "called_at"),
+                (models.Payment.objects, "paid_at"),
+                (models.DailyRollup.objects, "day"),
+            ]
+            for qs, field in sources:
+                days.update(
+                    qs.values_list(field, flat=True).order_by().distinct()
+                )
+
+        days = sorted(days)
+        batch_size = options["batch_size"]
+
+        refreshed = 0
+        for index in range(0, len(days), batch_size):
+            refreshed += models.DailyRollup.refresh(
+                days[index : index + batch_size]
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(f"{refreshed} daily rollups rebuilt.")
+        )
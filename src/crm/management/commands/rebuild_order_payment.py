@@ -0,0 +1,115 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from crm import models
+
+_VIEW_SQL = Path(models.__file__).parent / "SQLs" / "order_payment.sql"
+
+
+class Command(BaseCommand):
+    help = "Rebuild or verify the order payments of orders."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "ids",
+            nargs="*",
+            type=int,
+            help="Only handle the given orders, all orders by default.",
+        )
+        parser.add_argument(
+            "--verify",
+            action="store_true",
+            help="Only report orders whose stored row is missing or stale.",
+        )
+        parser.add_argument(
+            "--against-view",
+            action="store_true",
+            help=(
+                "Compare the ORM computation with SQLs/order_payment.sql "
+                "(PostgreSQL only) instead of the stored rows."
+            ),
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of orders handled per batch.",
+        )
+
+    def handle(self, *args, **options):
+        orders = models.Order.objects.order_by("pk")
+        if options["ids"]:
+            orders = orders.filter(pk__in=options["ids"])
+
+        ids = list(orders.values_list("pk", flat=True))
+        batch_size = options["batch_size"]
+        batches = [
+            ids[index : index + batch_size]
+            for index in range(0, len(ids), batch_size)
+        ]
+
+        if options["against_view"]:
+            self.compare_with_view(batches)
+            return
+
+        if not options["verify"]:
+            refreshed = sum(models.OrderPayment.refresh(b) for b in batches)
+            self.stdout.write(
+                self.style.SUCCESS(f"{refreshed} order payments rebuilt.")
+            )
+            return
+
+        mismatches = []
+        for batch in batches:
+            mismatches.extend(models.OrderPayment.verify(batch))
+
+        if mismatches:
+            raise CommandError(
+                f"{len(mismatches)} stale order payments: "
+                + ", ".join(str(pk) for pk in mismatches)
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(f"{len(ids)} order payments verified.")
+        )
+
+    def compare_with_view(self, batches: list[list[int]]):
+        if connection.vendor != "postgresql":
+            raise CommandError("order_payment.sql only runs on PostgreSQL.")
+
+        fields = models.OrderPayment.value_fields
+        view_sql = _VIEW_SQL.read_text().strip().rstrip(";")
+        query = (
+            f"SELECT order_id, {', '.join(fields)} "
+            f"FROM ({view_sql}) AS order_payment_view WHERE order_id = ANY(%s)"
+        )
+
+        mismatches = []
+        for batch in batches:
+            with connection.cursor() as cursor:
+                cursor.execute(query, [batch])
+                view_rows = {
+                    row[0]: tuple(int(value) for value in row[1:])
+                    for row in cursor.fetchall()
+                }
+
+            for order_payment in models.OrderPayment.compute(batch):
+                computed = tuple(
+                    getattr(order_payment, field) for field in fields
+                )
+                if view_rows.get(order_payment.order_id) != computed:
+                    mismatches.append(order_payment.order_id)
+
+        if mismatches:
+            raise CommandError(
+                f"{len(mismatches)} orders differ from the view: "
+                + ", ".join(str(pk) for pk in mismatches)
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{sum(len(b) for b in batches)} orders match the view."
+            )
+        )
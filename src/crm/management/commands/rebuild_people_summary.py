@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from crm import models
+
+
+class Command(BaseCommand):
+    help = "Rebuild the denormalized counters and balances of people."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "ids",
+            nargs="*",
+            type=int,
+            help="Only rebuild the given people, all people by default.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of people refreshed per batch.",
+        )
+
+    def handle(self, *args, **options):
+        people = models.People.objects.order_by("pk")
+        if options["ids"]:
+            people = people.filter(pk__in=options["ids"])
+
+        ids = list(people.values_list("pk", flat=True))
+        batch_size = options["batch_size"]
+
+        refreshed = 0
+        for index in range(0, len(ids), batch_size):
+            refreshed += models.PeopleSummary.refresh(
+                ids[index : index + batch_size]
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(f"{refreshed} people summaries rebuilt.")
+        )
@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand
+
+from crm import models, search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the search documents behind the global search."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--entity",
+            choices=models.SearchEntityChoices.values,
+            action="append",
+            help="Only rebuild the given entities, all entities by default.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of objects indexed per batch.",
+        )
+
+    def handle(self, *args, **options):
+        entities = options["entity"] or models.SearchEntityChoices.values
+        batch_size = options["batch_size"]
+
+        for entity in entities:
+            indexer = search.INDEXERS[entity]
+            ids = list(
+                indexer.get_queryset()
+                .order_by("pk")
+                .values_list("pk", flat=True)
+            )
+
+            # documents of removed objects are dropped along the way
+            stale = set(
+                models.SearchDocument.objects.filter(
+                    entity=entity
+                ).values_list("object_id", flat=True)
+            ).difference(ids)
+            search.remove(entity, stale)
+
+            indexed = 0
+            for index in range(0, len(ids), batch_size):
+                indexed += search.index(
+                    entity, ids[index : index + batch_size]
+                )
+
+            self.stdout.write(
+                self.style.SUCCESS(f"{indexed} {entity} documents indexed.")
+            )
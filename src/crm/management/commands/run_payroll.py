@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.serializers import ValidationError
+
+from crm import payroll
+
+
+class Command(BaseCommand):
+    help = "Compute the draft payroll of a jalali month, and post it."
+
+    def add_arguments(self, parser):
+        parser.add_argument("year", type=int, help="Jalali year.")
+        parser.add_argument("month", type=int, help="Jalali month.")
+        parser.add_argument(
+            "--post",
+            action="store_true",
+            help="Post the settlement payments of the computed draft.",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            payroll.month_period(options["year"], options["month"])
+        except ValueError:
+            raise CommandError("Invalid jalali month.")
+
+        try:
+            batch = payroll.run(options["year"], options["month"])
+            items = list(batch.items.select_related("personnel"))
+            for item in items:
+                self.stdout.write(
+                    f"{item.personnel.full_name}: salary {item.salary}, "
+                    f"order fees {item.order_fees}, paid {item.paid}, "
+                    f"amount {item.amount}"
+                )
+
+            self.stdout.write(
+                f"{len(items)} people, total "
+                f"{sum(item.amount for item in items)}."
+            )
+
+            if options["post"]:
+                posted = payroll.post(batch)
+                self.stdout.write(
+                    self.style.SUCCESS(f"{posted} payments posted.")
+                )
+        except ValidationError as error:
+            raise CommandError(error.detail["error"][0])
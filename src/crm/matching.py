@@ -0,0 +1,265 @@
+import threading
+import time
+from collections import defaultdict
+from typing import Iterable
+
+from django.core.cache import cache
+
+from . import jalali, models, schedule, utils
+
+_CACHE_NAME = "matching"
+
+# changed people are kept in the cache under the version they made, so
+# indexes of other processes catch up with the changes alone
+CHANGES_TIMEOUT = 60 * 60
+# versions an index catches up with at most, older indexes are rebuilt
+MAX_CHANGES = 100
+# seconds an index is refreshed by changes alone, in case its version is
+# lost together with the cache
+INDEX_TIMEOUT = schedule.INDEX_TIMEOUT
+
+
+def invalidate(people_ids: Iterable[int] | None = None):
+    """
+    Marking people whose specifications, roles, service locations,
+    gender or types changed, so every index refreshes them. Indexes are
+    rebuilt when no people are given.
+    """
+
+    if people_ids is None:
+        utils.invalidate_cache_version(_CACHE_NAME)
+        return
+
+    people_ids = sorted({pk for pk in people_ids if pk is not None})
+    if not people_ids:
+        return
+
+    # concurrent invalidations make distinct versions, each one keeps its
+    # own changes
+    version = utils.invalidate_cache_version(_CACHE_NAME)
+    cache.add(f"{_CACHE_NAME}:{version}:changes", people_ids, CHANGES_TIMEOUT)
+
+
+class _Index:
+    """
+    Inverted index of personnel by their specifications, roles and
+    service locations, each posting set holding people ids.
+    """
+
+    def __init__(self) -> None:
+        self.version = 0
+        # monotonic time of the last full load
+        self.loaded_at = 0.0
+        self.genders: dict[int, str] = {}
+        # catalog id to people id to rate, tags have no rate
+        self.specifications: dict[int, dict[int, int | None]] = defaultdict(
+            dict
+        )
+        self.roles: dict[int, set[int]] = defaultdict(set)
+        self.locations: dict[int, set[int]] = defaultdict(set)
+        # people id to the catalogs they are posted under
+        self.postings: dict[int, tuple[list, list, list]] = {}
+
+    def _remove(self, people_id: int):
+        self.genders.pop(people_id, None)
+        specifications, roles, locations = self.postings.pop(
+            people_id, ([], [], [])
+        )
+        for catalog_id in specifications:
+            self.specifications[catalog_id].pop(people_id, None)
+        for catalog_id in roles:
+            self.roles[catalog_id].discard(people_id)
+        for catalog_id in locations:
+            self.locations[catalog_id].discard(people_id)
+
+    def load(self, people_ids: Iterable[int] | None = None):
+        """
+        Loading the given personnel with four queries, every personnel
+        when no ids are given.
+        """
+
+        personnel = models.People.personnels.order_by()
+        specifications = models.Specification.objects.all()
+        roles = models.PeopleRole.objects.all()
+        locations = models.ServiceLocation.objects.all()
+        if people_ids is not None:
+            people_ids = list(people_ids)
+            for people_id in people_ids:
+                self._remove(people_id)
+
+            personnel = personnel.filter(pk__in=people_ids)
+            specifications = specifications.filter(people_id__in=people_ids)
+            roles = roles.filter(people_id__in=people_ids)
+            locations = locations.filter(people_id__in=people_ids)
+
+        for people_id, gender in personnel.values_list("pk", "gender"):
+            self.genders[people_id] = gender
+            self.postings[people_id] = ([], [], [])
+
+        for people_id, catalog_id, rate in specifications.values_list(
+            "people_id", "catalog_id", "rate"
+        ):
+            if people_id in self.postings:
+                self.specifications[catalog_id][people_id] = rate
+                self.postings[people_id][0].append(catalog_id)
+
+        for index, postings, rows in (
+            (1, self.roles, roles),
+            (2, self.locations, locations),
+        ):
+            for people_id, catalog_id in rows.values_list(
+                "people_id", "catalog_id"
+            ):
+                if people_id in self.postings:
+                    postings[catalog_id].add(people_id)
+                    self.postings[people_id][index].append(catalog_id)
+
+    def candidates(
+        self,
+        skills: dict[int, int],
+        tags: Iterable[int],
+        role: int | None,
+        location: int | None,
+        gender: str | None,
+    ) -> list[tuple[int, int]]:
+        """
+        People holding every given requirement with their score, the sum
+        of their rates of the given skills, the best first.
+        """
+
+        sets = []
+        for catalog_id, min_rate in skills.items():
+            sets.append(
+                {
+                    people_id
+                    for people_id, rate in self.specifications[
+                        catalog_id
+                    ].items()
+                    if rate is not None and rate >= min_rate
+                }
+            )
+        for catalog_id in tags:
+            sets.append(self.specifications[catalog_id].keys())
+        if role is not None:
+            sets.append(self.roles[role])
+        if location is not None:
+            sets.append(self.locations[location])
+
+        if sets:
+            sets.sort(key=len)
+            people_ids = set(sets[0]).intersection(*sets[1:])
+        else:
+            people_ids = set(self.genders)
+
+        if gender is not None:
+            people_ids = {
+                people_id
+                for people_id in people_ids
+                if self.genders[people_id] == gender
+            }
+
+        scored = [
+            (
+                people_id,
+                sum(
+                    self.specifications[catalog_id][people_id]
+                    for catalog_id in skills
+                ),
+            )
+            for people_id in people_ids
+        ]
+        return sorted(scored, key=lambda item: (-item[1], item[0]))
+
+
+_index_lock = threading.RLock()
+_index = _Index()
+
+
+def get_index() -> _Index:
+    """
+    Index of every personnel, built once per process and then only
+    refreshed for the people changed since.
+    """
+
+    version = utils.get_cache_version(_CACHE_NAME)
+    now = time.monotonic()
+    with _index_lock:
+        fresh = now - _index.loaded_at < INDEX_TIMEOUT
+        if _index.version == version and fresh:
+            return _index
+
+        changes = None
+        if (
+            _index.version
+            and fresh
+            and 0 < version - _index.version <= MAX_CHANGES
+        ):
+            keys = [
+                f"{_CACHE_NAME}:{v}:changes"
+                for v in range(_index.version + 1, version + 1)
+            ]
+            found = cache.get_many(keys)
+            if len(found) == len(keys):
+                changes = {pk for ids in found.values() for pk in ids}
+
+        if changes is None:
+            # first use, some changes expired or the index is too old
+            _index.__init__()
+            _index.load()
+            _index.loaded_at = now
+        else:
+            _index.load(changes)
+
+        _index.version = version
+        return _index
+
+
+def match(
+    skills: dict[int, int] | None = None,
+    tags: Iterable[int] = (),
+    role: int | None = None,
+    location: int | None = None,
+    gender: str | None = None,
+    start: jalali.JDate | None = None,
+    end: jalali.JDate | None = None,
+    hours: int = schedule.WEEK_HOURS,
+    limit: int = 10,
+) -> list[tuple[int, int]]:
+    """
+    Ranking personnel for a new order or contract.
+
+    Args:
+        skills: Minimum rate of every required skill, keyed by catalog id.
+        tags: Catalog ids of the required tags.
+        role: Catalog id of the required role.
+        location: Catalog id of the required service location.
+        gender: Required gender.
+        start: First day of the work, personnel booked within the work
+            are skipped.
+        end: Last day of the work, the start by default.
+        hours: Hours of the week within the work, see
+            schedule.shift_hours.
+        limit: Maximum number of personnel.
+
+    Returns:
+        Id and score of the best available personnel, the score is the
+        sum of their rates of the required skills.
+    """
+
+    skills = skills or {}
+    with _index_lock:
+        candidates = get_index().candidates(
+            skills, tags, role, location, gender
+        )
+    if start is None:
+        return candidates[:limit]
+
+    # bookings are only looked up for as many people as needed
+    found = []
+    for people_id, score in candidates:
+        if schedule.is_free(people_id, start, end or start, hours):
+            found.append((people_id, score))
+            if len(found) == limit:
+                break
+
+    return found
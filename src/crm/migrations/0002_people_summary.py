@@ -0,0 +1,28 @@
+# Generated by Django 5.0.3 on 2026-10-18 16:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PeopleSummary',
+            fields=[
+                ('people', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='crm.people')),
+                ('display_roles', models.CharField(blank=True, default='', max_length=250)),
+                ('client_orders', models.PositiveIntegerField(default=0)),
+                ('client_contracts', models.PositiveIntegerField(default=0)),
+                ('client_debt', models.BigIntegerField(default=0)),
+                ('personnel_orders', models.PositiveIntegerField(default=0)),
+                ('personnel_contracts', models.PositiveIntegerField(default=0)),
+                ('personnel_debt', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.0.3 on 2026-10-18 16:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0002_people_summary'),
+    ]
+
+    operations = [
+        # the view used to be installed by hand from SQLs/order_payment.sql,
+        # run `manage.py rebuild_order_payment` to fill the new table.
+        migrations.RunSQL(
+            'DROP VIEW IF EXISTS order_payment',
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.DeleteModel(
+            name='OrderPayment',
+        ),
+        migrations.CreateModel(
+            name='OrderPayment',
+            fields=[
+                ('order', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='order_payment', serialize=False, to='crm.order')),
+                ('cost_without_discount', models.BigIntegerField(default=0)),
+                ('cost', models.BigIntegerField(default=0)),
+                ('healthcare_franchise', models.BigIntegerField(default=0)),
+                ('personnel_fee', models.BigIntegerField(default=0)),
+                ('personnel_paid', models.BigIntegerField(default=0)),
+                ('client_paid', models.BigIntegerField(default=0)),
+                ('personnel_debt', models.BigIntegerField(default=0)),
+                ('client_debt', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'order_payment',
+                'indexes': [models.Index(fields=['client_debt'], name='order_payme_client__f664ea_idx'), models.Index(fields=['personnel_debt'], name='order_payme_personn_5b3691_idx')],
+            },
+        ),
+    ]
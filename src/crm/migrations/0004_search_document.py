@@ -0,0 +1,97 @@
+# Generated by Django 5.0.3 on 2026-10-18 16:46
+
+from django.db import migrations, models
+
+_FTS_TABLE = "crm_searchdocument_fts"
+
+_POSTGRES_FORWARD = [
+    "CREATE INDEX crm_searchdocument_document_gin ON crm_searchdocument "
+    "USING gin (to_tsvector('simple', document))",
+]
+_POSTGRES_BACKWARD = [
+    "DROP INDEX IF EXISTS crm_searchdocument_document_gin",
+]
+
+# external content FTS5 table, kept in sync with crm_searchdocument by triggers
+_SQLITE_FORWARD = [
+    f"CREATE VIRTUAL TABLE {_FTS_TABLE} USING fts5(document, "
+    "content='crm_searchdocument', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    f"CREATE TRIGGER crm_searchdocument_ai AFTER INSERT ON crm_searchdocument BEGIN "
+    f"INSERT INTO {_FTS_TABLE}(rowid, document) VALUES (new.id, new.document); END",
+    f"CREATE TRIGGER crm_searchdocument_ad AFTER DELETE ON crm_searchdocument BEGIN "
+    f"INSERT INTO {_FTS_TABLE}({_FTS_TABLE}, rowid, document) "
+    "VALUES ('delete', old.id, old.document); END",
+    f"CREATE TRIGGER crm_searchdocument_au AFTER UPDATE ON crm_searchdocument BEGIN "
+    f"INSERT INTO {_FTS_TABLE}({_FTS_TABLE}, rowid, document) "
+    "VALUES ('delete', old.id, old.document); "
+    f"INSERT INTO {_FTS_TABLE}(rowid, document) VALUES (new.id, new.document); END",
+]
+_SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS crm_searchdocument_ai",
+    "DROP TRIGGER IF EXISTS crm_searchdocument_ad",
+    "DROP TRIGGER IF EXISTS crm_searchdocument_au",
+    f"DROP TABLE IF EXISTS {_FTS_TABLE}",
+]
+
+
+def _run(statements):
+    def run(apps, schema_editor):
+        vendor_statements = statements.get(schema_editor.connection.vendor, [])
+        for statement in vendor_statements:
+            schema_editor.execute(statement)
+
+    return run
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("crm", "0003_order_payment_table"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SearchDocument",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "entity",
+                    models.CharField(
+                        choices=[
+                            ("people", "اشخاص"),
+                            ("service", "سرویس\u200cها"),
+                            ("order", "خدمات موردی"),
+                            ("contract", "قراردادها"),
+                            ("payment", "پرداختی\u200cها"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("object_id", models.BigIntegerField()),
+                ("title", models.CharField(max_length=250)),
+                ("link", models.CharField(blank=True, max_length=250)),
+                ("document", models.TextField()),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="searchdocument",
+            constraint=models.UniqueConstraint(
+                fields=("entity", "object_id"), name="unique_search_document"
+            ),
+        ),
+        migrations.RunPython(
+            _run({"postgresql": _POSTGRES_FORWARD, "sqlite": _SQLITE_FORWARD}),
+            _run(
+                {"postgresql": _POSTGRES_BACKWARD, "sqlite": _SQLITE_BACKWARD}
+            ),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.0.3 on 2026-10-18 16:50
+
+import crm.models
+from crm.migrations._normalize import normalize_persian
+from django.db import migrations
+
+_NORMALIZED_FIELDS = {
+    'People': [('firstname', 'firstname_normalized'), ('lastname', 'lastname_normalized')],
+    'PeopleDetailedInfo': [('value', 'value_normalized')],
+    'Service': [('title', 'title_normalized')],
+}
+
+
+def backfill_normalized_fields(apps, schema_editor):
+    for model_name, fields in _NORMALIZED_FIELDS.items():
+        model = apps.get_model('crm', model_name)
+        objs = list(model.objects.only('pk', *(source for source, _ in fields)))
+        for obj in objs:
+            for source, normalized in fields:
+                setattr(obj, normalized, normalize_persian(getattr(obj, source)))
+
+        model.objects.bulk_update(
+            objs, [normalized for _, normalized in fields], batch_size=500
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0004_search_document'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='people',
+            name='firstname_normalized',
+            field=crm.models.NormalizedCharField(db_index=True, default='', editable=False, max_length=50, source='firstname'),
+        ),
+        migrations.AddField(
+            model_name='people',
+            name='lastname_normalized',
+            field=crm.models.NormalizedCharField(db_index=True, default='', editable=False, max_length=50, source='lastname'),
+        ),
+        migrations.AddField(
+            model_name='peopledetailedinfo',
+            name='value_normalized',
+            field=crm.models.NormalizedCharField(db_index=True, default='', editable=False, max_length=250, source='value'),
+        ),
+        migrations.AddField(
+            model_name='service',
+            name='title_normalized',
+            field=crm.models.NormalizedCharField(db_index=True, default='', editable=False, max_length=250, source='title'),
+        ),
+        migrations.RunPython(
+            backfill_normalized_fields, migrations.RunPython.noop
+        ),
+    ]
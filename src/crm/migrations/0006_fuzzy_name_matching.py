@@ -0,0 +1,64 @@
+# Generated by Django 5.0.3 on 2026-10-18 16:51
+
+import crm.models
+from crm.migrations._normalize import normalize_persian
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+# the expressions must match the ones queried by crm/fuzzy.py
+_POSTGRES_FORWARD = [
+    "CREATE INDEX crm_people_fullname_trgm ON crm_people USING gin "
+    "((firstname_normalized || ' ' || lastname_normalized) gin_trgm_ops)",
+    "CREATE INDEX crm_referral_title_trgm ON crm_referral USING gin "
+    "(title_normalized gin_trgm_ops)",
+]
+_POSTGRES_BACKWARD = [
+    "DROP INDEX IF EXISTS crm_people_fullname_trgm",
+    "DROP INDEX IF EXISTS crm_referral_title_trgm",
+]
+
+
+def _run_on_postgres(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+
+        for statement in statements:
+            schema_editor.execute(statement)
+
+    return run
+
+
+def backfill_referral_titles(apps, schema_editor):
+    Referral = apps.get_model('crm', 'Referral')
+    referrals = list(Referral.objects.only('pk', 'title'))
+    for referral in referrals:
+        referral.title_normalized = normalize_persian(referral.title)
+
+    Referral.objects.bulk_update(
+        referrals, ['title_normalized'], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0005_normalized_columns'),
+    ]
+
+    operations = [
+        # a no-op on other databases
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='referral',
+            name='title_normalized',
+            field=crm.models.NormalizedCharField(db_index=True, default='', editable=False, max_length=150, source='title'),
+        ),
+        migrations.RunPython(
+            backfill_referral_titles, migrations.RunPython.noop
+        ),
+        migrations.RunPython(
+            _run_on_postgres(_POSTGRES_FORWARD),
+            _run_on_postgres(_POSTGRES_BACKWARD),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.0.3 on 2026-10-18 16:52
+
+import crm.models
+from crm.migrations._normalize import normalize_persian
+from django.db import migrations
+
+
+def backfill_catalog_titles(apps, schema_editor):
+    Catalog = apps.get_model('crm', 'Catalog')
+    catalogs = list(Catalog.objects.only('pk', 'title'))
+    for catalog in catalogs:
+        catalog.title_normalized = normalize_persian(catalog.title)
+
+    Catalog.objects.bulk_update(catalogs, ['title_normalized'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0006_fuzzy_name_matching'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='catalog',
+            name='title_normalized',
+            field=crm.models.NormalizedCharField(db_index=True, default='', editable=False, max_length=150, source='title'),
+        ),
+        migrations.RunPython(
+            backfill_catalog_titles, migrations.RunPython.noop
+        ),
+    ]
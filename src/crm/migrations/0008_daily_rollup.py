@@ -0,0 +1,28 @@
+# Generated by Django 5.0.3 on 2026-10-18 16:55
+
+import crm.models
+import crm.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0007_catalog_title_normalized'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRollup',
+            fields=[
+                ('day', crm.models.JDateField(max_length=10, primary_key=True, serialize=False, validators=[crm.validators.jdate_string_validator])),
+                ('new_clients', models.PositiveIntegerField(default=0)),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('contracts', models.PositiveIntegerField(default=0)),
+                ('calls', models.PositiveIntegerField(default=0)),
+                ('income', models.BigIntegerField(default=0)),
+                ('outgo', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,123 @@
+# Generated by Django 5.0.3 on 2026-10-18 17:05
+
+import crm.models
+from crm.utils import parse_jdate
+from django.db import migrations, models
+
+# jalali date strings moved into native date columns, per model:
+# (field, nullable)
+_DATE_FIELDS = {
+    'People': [
+        ('joined_at', False),
+        ('birthdate', True),
+        ('contract_date', True),
+        ('end_contract_date', True),
+    ],
+    'Order': [('order_at', False)],
+    'Contract': [('contract_at', False), ('start', False), ('end', False)],
+    'Payment': [('paid_at', False)],
+    'Call': [('called_at', False)],
+}
+
+
+def _temporary(field):
+    return f'{field}_gregorian'
+
+
+def convert_jalali_strings(apps, schema_editor):
+    connection = schema_editor.connection
+    quote = schema_editor.quote_name
+
+    for model_name, fields in _DATE_FIELDS.items():
+        model = apps.get_model('crm', model_name)
+        table = quote(model._meta.db_table)
+
+        for field, nullable in fields:
+            # the old column is read raw, the model field is not a string
+            # field anymore
+            with connection.cursor() as cursor:
+                cursor.execute(f'SELECT id, {quote(field)} FROM {table}')
+                rows = cursor.fetchall()
+
+            objs = []
+            for pk, value in rows:
+                if value in (None, '') and nullable:
+                    date = None
+                else:
+                    try:
+                        date = parse_jdate(value).togregorian()
+                    except (TypeError, ValueError):
+                        raise ValueError(
+                            f'{model_name} {pk} has an invalid {field}: '
+                            f'{value!r}, fix it before migrating.'
+                        )
+
+                obj = model(pk=pk)
+                setattr(obj, _temporary(field), date)
+                objs.append(obj)
+
+            model.objects.bulk_update(
+                objs, [_temporary(field)], batch_size=500
+            )
+
+
+def clear_daily_rollups(apps, schema_editor):
+    # rollups are keyed by the old strings, run rebuild_daily_rollups
+    apps.get_model('crm', 'DailyRollup').objects.all().delete()
+
+
+def _operations():
+    operations = []
+    for model_name, fields in _DATE_FIELDS.items():
+        for field, _ in fields:
+            operations.append(
+                migrations.AddField(
+                    model_name=model_name.lower(),
+                    name=_temporary(field),
+                    field=models.DateField(null=True),
+                )
+            )
+
+    operations.append(migrations.RunPython(convert_jalali_strings))
+
+    for model_name, fields in _DATE_FIELDS.items():
+        for field, nullable in fields:
+            operations += [
+                migrations.RemoveField(
+                    model_name=model_name.lower(),
+                    name=field,
+                ),
+                migrations.RenameField(
+                    model_name=model_name.lower(),
+                    old_name=_temporary(field),
+                    new_name=field,
+                ),
+                migrations.AlterField(
+                    model_name=model_name.lower(),
+                    name=field,
+                    field=(
+                        crm.models.JDateField(blank=True, db_index=True, null=True)
+                        if nullable
+                        else crm.models.JDateField(db_index=True)
+                    ),
+                ),
+            ]
+
+    return operations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0008_daily_rollup'),
+    ]
+
+    operations = [
+        *_operations(),
+        migrations.RunPython(clear_daily_rollups),
+        migrations.AlterField(
+            model_name='dailyrollup',
+            name='day',
+            field=crm.models.JDateField(primary_key=True, serialize=False),
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.0.3 on 2026-10-18 17:08
+
+import crm.models
+from crm import jalali
+from django.db import migrations, models
+
+# fridays are the weekly holiday
+_FRIDAY = 6
+
+
+def build_calendar(apps, schema_editor):
+    JalaliDay = apps.get_model('crm', 'JalaliDay')
+    JalaliDay.objects.bulk_create(
+        [
+            JalaliDay(**attrs, is_holiday=attrs['weekday'] == _FRIDAY)
+            for attrs in jalali.calendar(jalali.FIRST_YEAR, jalali.LAST_YEAR)
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0009_native_date_columns'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JalaliDay',
+            fields=[
+                ('date', crm.models.JDateField(primary_key=True, serialize=False)),
+                ('year', models.PositiveSmallIntegerField()),
+                ('quarter', models.PositiveSmallIntegerField()),
+                ('month', models.PositiveSmallIntegerField()),
+                ('day', models.PositiveSmallIntegerField()),
+                ('week', models.PositiveSmallIntegerField()),
+                ('weekday', models.PositiveSmallIntegerField()),
+                ('month_start', crm.models.JDateField(db_index=False)),
+                ('month_end', crm.models.JDateField(db_index=False)),
+                ('is_holiday', models.BooleanField(default=False)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['year', 'month'], name='crm_jalalid_year_33b646_idx'), models.Index(fields=['year', 'quarter'], name='crm_jalalid_year_adcd91_idx'), models.Index(fields=['year', 'week'], name='crm_jalalid_year_ed1ae5_idx')],
+            },
+        ),
+        migrations.RunPython(build_calendar, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='call',
+            name='called_day',
+            field=crm.models.JalaliDayField(source='called_at'),
+        ),
+        migrations.AddField(
+            model_name='contract',
+            name='contract_day',
+            field=crm.models.JalaliDayField(source='contract_at'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='order_day',
+            field=crm.models.JalaliDayField(source='order_at'),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='paid_day',
+            field=crm.models.JalaliDayField(source='paid_at'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.0.3 on 2026-10-18 17:12
+
+import crm.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0010_jalali_day'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Holiday',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', crm.models.JDateField(unique=True)),
+                ('title', models.CharField(max_length=150)),
+            ],
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.0.3 on 2026-10-18 17:14
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0011_holiday'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PayrollBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('year', models.PositiveSmallIntegerField()),
+                ('month', models.PositiveSmallIntegerField(validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(12)])),
+                ('status', models.CharField(choices=[('D', 'پیش\u200cنویس'), ('P', 'پرداخت شده')], default='D', max_length=1)),
+                ('posted_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PayrollItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('contracts', models.PositiveIntegerField(default=0)),
+                ('shift_days', models.PositiveIntegerField(default=0)),
+                ('salary', models.BigIntegerField(default=0)),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('order_fees', models.BigIntegerField(default=0)),
+                ('paid', models.BigIntegerField(default=0)),
+                ('amount', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='payrollbatch',
+            constraint=models.UniqueConstraint(fields=('year', 'month'), name='unique_payroll_month'),
+        ),
+        migrations.AddField(
+            model_name='payrollitem',
+            name='batch',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='crm.payrollbatch'),
+        ),
+        migrations.AddField(
+            model_name='payrollitem',
+            name='payment',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='payroll_item', to='crm.payment'),
+        ),
+        migrations.AddField(
+            model_name='payrollitem',
+            name='personnel',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='payroll_items', to='crm.people'),
+        ),
+        migrations.AddConstraint(
+            model_name='payrollitem',
+            constraint=models.UniqueConstraint(fields=('batch', 'personnel'), name='unique_payroll_personnel'),
+        ),
+    ]
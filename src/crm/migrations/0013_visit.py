@@ -0,0 +1,36 @@
+# Generated by Django 5.0.3 on 2026-10-18 17:19
+
+import crm.models
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0012_payroll'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Visit',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', crm.models.JDateField(db_index=False)),
+                ('shift_start', models.PositiveSmallIntegerField()),
+                ('shift_end', models.PositiveSmallIntegerField()),
+                ('status', models.CharField(choices=[('S', 'برنامه\u200cریزی شده'), ('A', 'حاضر'), ('N', 'غایب')], default='S', max_length=1)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('contract', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='visits', to='crm.contract')),
+                ('personnel', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='personnel_visits', to='crm.people')),
+                ('visit_day', crm.models.JalaliDayField(source='date')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['personnel', 'date'], name='crm_visit_personn_07eeb7_idx'), models.Index(fields=['date', 'status'], name='crm_visit_date_f4b9f9_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='visit',
+            constraint=models.UniqueConstraint(fields=('contract', 'date'), name='unique_contract_visit'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.0.3 on 2026-10-18 17:24
+
+import crm.models
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0013_visit'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AgendaSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', crm.models.JDateField(db_index=False)),
+                ('items', models.JSONField(default=list)),
+                ('etag', models.CharField(max_length=32)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('personnel', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='agenda_snapshots', to='crm.people')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='agendasnapshot',
+            constraint=models.UniqueConstraint(fields=('personnel', 'date'), name='unique_personnel_agenda'),
+        ),
+    ]
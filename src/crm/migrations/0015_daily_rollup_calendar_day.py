@@ -0,0 +1,19 @@
+# Generated by Django 5.0.3 on 2026-10-18 18:15
+
+import crm.models
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0014_agenda_snapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dailyrollup',
+            name='calendar_day',
+            field=crm.models.JalaliDayField(source='day'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+import re
+
+# frozen copy of crm.utils.normalize_persian for the backfills of the
+# normalized columns, so later changes of the live normalizer do not
+# change what these migrations write. Never edit it, add a new
+# migration for renormalizing instead.
+
+_PERSIAN_TRANSLATION = str.maketrans(
+    {
+        # arabic letters typed by arabic keyboards and old systems
+        "ي": "ی",
+        "ى": "ی",
+        "ئ": "ی",
+        "ك": "ک",
+        "ة": "ه",
+        "ۀ": "ه",
+        "أ": "ا",
+        "إ": "ا",
+        "ٱ": "ا",
+        "ؤ": "و",
+        # zero width non-joiner and joiner
+        "\u200c": " ",
+        "\u200d": "",
+        # tatweel and diacritics
+        "ـ": "",
+        **{chr(code): "" for code in range(0x064B, 0x0653)},
+        # persian and arabic digits
+        **{chr(0x06F0 + digit): str(digit) for digit in range(10)},
+        **{chr(0x0660 + digit): str(digit) for digit in range(10)},
+    }
+)
+_SPACES_RE = re.compile(r"\s+")
+
+
+def normalize_persian(text: str) -> str:
+    if not text:
+        return ""
+
+    text = str(text).translate(_PERSIAN_TRANSLATION).lower()
+    return _SPACES_RE.sub(" ", text).strip()
@@ -1,31 +1,253 @@
-from typing import Any
+import datetime
+import hashlib
+import json
+from typing import Any, Iterable
 
+from django.core.exceptions import ValidationError
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
-from django.db.models import F, Q, Sum, Value
-from django.db.models.functions import Concat
+from django.db.models import (
+    Case,
+    Count,
+    Exists,
+    ExpressionWrapper,
+    F,
+    OuterRef,
+    Q,
+    Subquery,
+    Sum,
+    Value,
+    When,
+)
+from django.db.models.functions import Coalesce, ExtractYear
+from django.db.models.query_utils import DeferredAttribute
 from django.urls import reverse
 
-from . import utils, validators
+from . import jalali, utils, validators
 
 _WOMAN_PREFIX = "خانم"
 _MAN_PREFIX = "آقای"
 
 
-class JDateField(models.CharField):
-    def __init__(
-        self,
-        *args: Any,
-        max_length=10,
-        validators=[validators.jdate_string_validator],
-        **kwargs: Any,
-    ) -> None:
-        super().__init__(
-            *args,
-            max_length=max_length,
-            validators=validators,
-            **kwargs,
+class JDateDescriptor(DeferredAttribute):
+    """
+    Keeps JDateField attributes as jalali dates whatever is assigned to
+    them, invalid values are kept as is and rejected by validation.
+    """
+
+    def __set__(self, instance, value):
+        try:
+            value = self.field.to_python(value)
+        except ValidationError:
+            pass
+
+        instance.__dict__[self.field.attname] = value
+
+
+class JDateField(models.DateField):
+    """
+    Native indexed date column, read and written as jalali dates. Values
+    may also be assigned and looked up by strings like 1402/05/06.
+    """
+
+    descriptor_class = JDateDescriptor
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        kwargs.setdefault("db_index", not kwargs.get("primary_key"))
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        # only a different index choice than the default is recorded
+        kwargs.pop("db_index", None)
+        if self.db_index == bool(self.primary_key):
+            kwargs["db_index"] = self.db_index
+        return name, path, args, kwargs
+
+    def to_python(self, value):
+        if value is None or value == "":
+            return None
+
+        try:
+            return utils.parse_jdate(value)
+        except ValueError:
+            raise ValidationError(
+                self.error_messages["invalid"],
+                code="invalid",
+                params={"value": value},
+            )
+
+    def from_db_value(self, value, expression, connection):
+        return None if value is None else jalali.from_gregorian(value)
+
+    def get_prep_value(self, value):
+        value = models.Field.get_prep_value(self, value)
+        value = self.to_python(value)
+        return None if value is None else value.togregorian()
+
+    def value_to_string(self, obj) -> str:
+        value = self.value_from_object(obj)
+        return "" if value is None else str(value)
+
+    def formfield(self, **kwargs):
+        from .forms import JDateFormField
+
+        return super().formfield(**{"form_class": JDateFormField, **kwargs})
+
+
+def years_since(field: str) -> ExpressionWrapper:
+    """
+    Completed years since the date of the given field, computed by the
+    database, like the age of people by their birthdate.
+
+    Anniversaries are counted by the gregorian calendar, which may shift
+    the jalali anniversary by a day.
+    """
+
+    today = datetime.date.today()
+    before_anniversary = Q(**{f"{field}__month__gt": today.month}) | Q(
+        **{f"{field}__month": today.month, f"{field}__day__gt": today.day}
+    )
+
+    return ExpressionWrapper(
+        Value(today.year)
+        - ExtractYear(field)
+        - Case(When(before_anniversary, then=1), default=0),
+        output_field=models.IntegerField(),
+    )
+
+
+def duration_since(field: str) -> ExpressionWrapper:
+    """
+    Time passed since the date of the given field, computed by the
+    database, like the membership period of people.
+    """
+
+    return ExpressionWrapper(
+        Value(datetime.date.today(), output_field=models.DateField())
+        - F(field),
+        output_field=models.DurationField(),
+    )
+
+
+class NormalizedCharField(models.CharField):
+    """
+    Indexed shadow column holding the normalized form of another field,
+    filled on every insert (bulk creations included) and on saves which
+    update the source field.
+
+    Saves limited by `update_fields` write it along with its source (see
+    `Log.save`), and `NormalizedQuerySet` keeps it in sync on `update`
+    and `bulk_update`. Other raw writes of the source leave it stale.
+    """
+
+    def __init__(self, source: str, *args: Any, **kwargs: Any) -> None:
+        self.source = source
+        kwargs.setdefault("editable", False)
+        kwargs.setdefault("db_index", True)
+        kwargs.setdefault("default", "")
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs["source"] = self.source
+        return name, path, args, kwargs
+
+    def pre_save(self, model_instance, add):
+        value = utils.normalize_persian(getattr(model_instance, self.source))
+        setattr(model_instance, self.attname, value)
+        return value
+
+    @staticmethod
+    def of(model, sources: Iterable[str]) -> list["NormalizedCharField"]:
+        """
+        Normalized fields of the given model whose source is one of the
+        given field names.
+        """
+
+        sources = set(sources)
+        return [
+            field
+            for field in model._meta.concrete_fields
+            if isinstance(field, NormalizedCharField)
+            and field.source in sources
+        ]
+
+
+class NormalizedQuerySet(models.QuerySet):
+    """
+    Queryset of models with normalized columns, updating a source field
+    updates its normalized column too.
+    """
+
+    def update(self, **kwargs):
+        for field in NormalizedCharField.of(self.model, kwargs):
+            # given along with the source, e.g. by bulk_update
+            if field.attname in kwargs:
+                continue
+
+            value = kwargs[field.source]
+            if hasattr(value, "resolve_expression"):
+                raise TypeError(
+                    f"{field.source} can not be updated by an expression, "
+                    f"{field.attname} would be left stale."
+                )
+
+            kwargs[field.attname] = utils.normalize_persian(value)
+
+        return super().update(**kwargs)
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        normalized = NormalizedCharField.of(self.model, fields)
+        if normalized:
+            objs = list(objs)
+            for obj in objs:
+                for field in normalized:
+                    field.pre_save(obj, False)
+
+            fields = [*fields, *(field.name for field in normalized)]
+
+        return super().bulk_update(objs, fields, *args, **kwargs)
+
+
+class JalaliDayField(models.ForeignObject):
+    """
+    Join from a JDateField to its row of the JalaliDay calendar table,
+    for grouping by jalali periods in the database. It has no column of
+    its own.
+    """
+
+    def __init__(self, source: str, **kwargs: Any) -> None:
+        self.source = source
+        kwargs.update(
+            to="crm.JalaliDay",
+            on_delete=models.DO_NOTHING,
+            from_fields=[source],
+            to_fields=["date"],
+            related_name="+",
+            # keeps makemigrations from asking for a default
+            blank=True,
+            editable=False,
+            serialize=False,
         )
+        super().__init__(**kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        # everything else is derived from the source
+        for key in (
+            "to",
+            "on_delete",
+            "from_fields",
+            "to_fields",
+            "related_name",
+            "blank",
+            "editable",
+            "serialize",
+        ):
+            kwargs.pop(key, None)
+        kwargs["source"] = self.source
+        return name, path, args, kwargs
 
 
 class Log(models.Model):
@@ -37,6 +259,19 @@ class Log(models.Model):
     class Meta:
         abstract = True
 
+    def save(self, *args, **kwargs):
+        # normalized columns are written along with their source
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            normalized = NormalizedCharField.of(type(self), update_fields)
+            if normalized:
+                kwargs["update_fields"] = {
+                    *update_fields,
+                    *(field.name for field in normalized),
+                }
+
+        super().save(*args, **kwargs)
+
 
 class PeopleTypeChoices(models.TextChoices):
     PERSONNEL = "PERSONNEL", "پرسنل"
@@ -62,10 +297,13 @@ class Catalog(Log):
         "self", on_delete=models.CASCADE, null=True, blank=True
     )
     title = models.CharField(max_length=150)
+    title_normalized = NormalizedCharField("title", max_length=150)
 
     # must be in upper case
     code = models.CharField(max_length=50, unique=True)
 
+    objects = NormalizedQuerySet.as_manager()
+
     def __str__(self) -> str:
         return self.title
 
@@ -90,7 +328,7 @@ class Catalog(Log):
         return "TYP"
 
 
-class ClientManager(models.Manager):
+class ClientManager(models.Manager.from_queryset(NormalizedQuerySet)):
     def get_queryset(self) -> models.QuerySet:
         return (
             super()
@@ -101,7 +339,7 @@ class ClientManager(models.Manager):
         )
 
 
-class PersonnelManager(models.Manager):
+class PersonnelManager(models.Manager.from_queryset(NormalizedQuerySet)):
     def get_queryset(self) -> models.QuerySet:
         return (
             super()
@@ -112,7 +350,7 @@ class PersonnelManager(models.Manager):
         )
 
 
-class PatientManager(models.Manager):
+class PatientManager(models.Manager.from_queryset(NormalizedQuerySet)):
     def get_queryset(self) -> models.QuerySet:
         return (
             super()
@@ -168,20 +406,22 @@ class People(Log):
         max_length=50,
         validators=[validators.trim_string],
     )
+    firstname_normalized = NormalizedCharField("firstname", max_length=50)
+    lastname_normalized = NormalizedCharField("lastname", max_length=50)
 
     gender = models.CharField(
         max_length=1,
         choices=GenderChoices.choices,
     )
-    birthdate = models.CharField(max_length=10)
+    birthdate = JDateField(null=True, blank=True)
 
     types = models.ManyToManyField(
         Catalog, related_name="people_types", through=PeopleType
     )
 
     # specific to personnel
-    contract_date = models.CharField(max_length=10, null=True, blank=True)
-    end_contract_date = models.CharField(max_length=10, null=True, blank=True)
+    contract_date = JDateField(null=True, blank=True)
+    end_contract_date = JDateField(null=True, blank=True)
     specifications = models.ManyToManyField(
         Catalog, related_name="people_specifications", through=Specification
     )
@@ -211,6 +451,9 @@ class People(Log):
 
     @property
     def age(self):
+        if self.birthdate is None:
+            return None
+
         return utils.calculate_age(self.birthdate)
 
     @property
@@ -218,20 +461,28 @@ class People(Log):
         roles = self.roles.all().values_list("title", flat=True)
         return ", ".join(roles)
 
+    @property
+    def totals(self) -> "PeopleSummary":
+        """
+        Order, contract and debt totals of the people, kept by their
+        summary row. Load it with `select_related("summary")`.
+        """
+
+        # people created before the summary backfill have no summary row
+        # yet, nor do the ones of a transaction which is not committed
+        return getattr(self, "summary", None) or PeopleSummary()
+
     @property
     def total_personnel_orders(self):
-        return self.personnel_orders.count()
+        return self.totals.personnel_orders
 
     @property
     def total_personnel_contracts(self):
-        return self.personnel_contracts.count()
+        return self.totals.personnel_contracts
 
     @property
     def total_healthcare_debt_to_personnel(self):
-        debt = OrderPayment.objects.filter(
-            order__assigned_personnel=self
-        ).aggregate(debt=Sum("personnel_debt"))["debt"]
-        return debt if debt and debt >= 0 else 0
+        return self.totals.personnel_debt
 
     @property
     def total_personnel_additional_payment(self):
@@ -255,40 +506,15 @@ class People(Log):
 
     @property
     def total_client_debt(self):
-        total_order_costs = (
-            OrderPayment.objects.filter(order__client=self).aggregate(
-                debt=Sum("client_debt")
-            )["debt"]
-            or 0
-        )
-
-        total_contract_costs = (
-            self.client_contracts.aggregate(
-                total_amount=Sum("healthcare_franchise_amount")
-            )["total_amount"]
-            or 0
-        )
-
-        contract_paid_amount = (
-            self.source_payments.filter(order__isnull=True).aggregate(
-                total=Sum("amount")
-            )["total"]
-            or 0
-        )
-
-        debt = (
-            total_order_costs + total_contract_costs
-        ) - contract_paid_amount
-
-        return debt if debt >= 0 else 0
+        return self.totals.client_debt
 
     @property
     def total_client_orders(self):
-        return Order.objects.filter(client=self).count()
+        return self.totals.client_orders
 
     @property
     def total_client_contracts(self):
-        return Contract.objects.filter(client=self).count()
+        return self.totals.client_contracts
 
     @property
     def addresses(self):
@@ -371,7 +597,8 @@ class People(Log):
     #     return reverse(path_name, kwargs={"id": self.id})
 
     def get_absolute_url_api(self):
-        types = self.get_types_title
+        # iterating types.all() lets callers prefetch "types"
+        types = [type.title for type in self.types.all()]
         types_lookup = {
             "پرسنل": "personnel",
             "کارفرما": "client",
@@ -402,7 +629,7 @@ class People(Log):
 
         return f"{self.fullname_with_prefix} ({', '.join(types)})"
 
-    objects = models.Manager()
+    objects = NormalizedQuerySet.as_manager()
     clients = ClientManager()
     personnels = PersonnelManager()
     patients = PatientManager()
@@ -414,7 +641,7 @@ class PeopleDetailTypeChoices(models.TextChoices):
     CARD_NUMBER = "C", "کارت بانکی"
 
 
-class ActiveInfosManager(models.Manager):
+class ActiveInfosManager(models.Manager.from_queryset(NormalizedQuerySet)):
     def get_queryset(self) -> models.QuerySet:
         return super().get_queryset().filter(is_active=True)
 
@@ -430,10 +657,11 @@ class PeopleDetailedInfo(Log):
         related_name="details",
     )
     value = models.CharField(max_length=250)
+    value_normalized = NormalizedCharField("value", max_length=250)
     is_active = models.BooleanField(default=True)
     note = models.TextField(null=True, blank=True)
 
-    objects = models.Manager()
+    objects = NormalizedQuerySet.as_manager()
     actives = ActiveInfosManager()
 
     def __str__(self) -> str:
@@ -456,6 +684,7 @@ class PeopleDetailedInfo(Log):
 
 class Service(Log):
     title = models.CharField(max_length=250)
+    title_normalized = NormalizedCharField("title", max_length=250)
     base_price = models.BigIntegerField()
     healthcare_franchise = models.PositiveSmallIntegerField(
         default=70,
@@ -465,6 +694,8 @@ class Service(Log):
         "self", on_delete=models.CASCADE, null=True, blank=True
     )
 
+    objects = NormalizedQuerySet.as_manager()
+
     @property
     def healthcare_franchise_in_tooman(self):
         return int(self.base_price / 100 * self.healthcare_franchise)
@@ -499,13 +730,92 @@ class Service(Log):
 
 class Referral(Log):
     title = models.CharField(max_length=150)
+    title_normalized = NormalizedCharField("title", max_length=150)
+
+    objects = NormalizedQuerySet.as_manager()
 
     def __str__(self) -> str:
         return f"{self.title}"
 
 
+class OrderQuerySet(models.QuerySet):
+    payment_prefix = "payment_"
+
+    def with_payment(self) -> models.QuerySet:
+        """
+        Annotating the order payment numbers of each order, computed by
+        the database with the same arithmetic as `SQLs/order_payment.sql`,
+        so it works on any backend and within a single query.
+
+        Each `OrderPayment` value field is annotated with the
+        `payment_` prefix, e.g. `payment_client_debt`.
+        """
+
+        def order_sum(qs: models.QuerySet, expression, **extra):
+            return Subquery(
+                qs.filter(order=OuterRef("pk"))
+                .order_by()
+                .values("order")
+                .annotate(total=Sum(expression, **extra))
+                .values("total"),
+                output_field=models.BigIntegerField(),
+            )
+
+        healthcare_cost = ExpressionWrapper(
+            F("cost") / Value(100) * F("service__healthcare_franchise"),
+            output_field=models.BigIntegerField(),
+        )
+        services = OrderServices.objects.all()
+        cost = order_sum(services, "cost")
+        healthcare = order_sum(services, healthcare_cost)
+        personnel = order_sum(
+            services,
+            ExpressionWrapper(
+                F("cost") - healthcare_cost,
+                output_field=models.BigIntegerField(),
+            ),
+        )
+        client_paid = Coalesce(
+            order_sum(
+                Payment.objects.all(),
+                "amount",
+                filter=Q(destination__isnull=True),
+            ),
+            0,
+        )
+        personnel_paid = Coalesce(
+            order_sum(
+                Payment.objects.all(),
+                "amount",
+                filter=Q(source__isnull=True),
+            ),
+            0,
+        )
+
+        # subtracting from a missing services cost gives null, then zero,
+        # orders without any service cost nothing, like the view.
+        values = {
+            "cost_without_discount": Coalesce(cost, 0),
+            "cost": Coalesce(cost - F("discount"), 0),
+            "healthcare_franchise": Coalesce(healthcare - F("discount"), 0),
+            "personnel_fee": Coalesce(personnel, 0),
+            "personnel_paid": personnel_paid,
+            "client_paid": client_paid,
+            "personnel_debt": Coalesce(personnel - personnel_paid, 0),
+            "client_debt": Coalesce(cost - F("discount") - client_paid, 0),
+        }
+
+        return self.annotate(
+            **{
+                f"{self.payment_prefix}{name}": value
+                for name, value in values.items()
+            }
+        )
+
+
 class Order(Log):
     order_at = JDateField()
+    order_day = JalaliDayField("order_at")
     client = models.ForeignKey(
         People, on_delete=models.CASCADE, related_name="client_orders"
     )
@@ -530,9 +840,20 @@ class Order(Log):
     )
     discount = models.BigIntegerField(default=0, blank=True)
 
+    objects = OrderQuerySet.as_manager()
+
+    @property
+    def payment(self) -> "OrderPayment":
+        try:
+            return self.order_payment
+        except OrderPayment.DoesNotExist:
+            # orders stored before the order payment backfill
+            OrderPayment.refresh([self.pk])
+            return OrderPayment.objects.get(pk=self.pk)
+
     @property
     def total_franchise(self):
-        return OrderPayment.objects.get(order=self).healthcare_franchise
+        return self.payment.healthcare_franchise
 
     @property
     def client_payment_status(self):
@@ -554,19 +875,35 @@ class Order(Log):
 
     @property
     def total_cost(self):
-        return OrderPayment.objects.get(order=self).cost
+        return self.payment.cost
 
     @property
     def client_debt(self):
-        return OrderPayment.objects.get(order=self).client_debt
+        return self.payment.client_debt
 
     @property
     def debt_to_personnel(self):
-        return OrderPayment.objects.get(order=self).personnel_debt
+        return self.payment.personnel_debt
 
     @property
     def services_list(self) -> str:
-        return ", ".join(self.services.all().values_list("title", flat=True))
+        # iterating services.all() lets callers prefetch "services"
+        return ", ".join(service.title for service in self.services.all())
+
+    def clean(self):
+        from .schedule import order_conflicts
+
+        if self.assigned_personnel_id is None or self.order_at is None:
+            return
+
+        conflicts = order_conflicts(self)
+        if conflicts:
+            raise ValidationError(
+                {
+                    "assigned_personnel": "پرسنل در این روز شیفت قرارداد "
+                    f"{', '.join(str(c.id) for c in conflicts)} را دارد."
+                }
+            )
 
     def get_orders_in_month_ago(month_count: int = 1) -> models.QuerySet:
         start, end = utils.get_month_start_end(month_count)
@@ -607,8 +944,34 @@ class PaymentTimeChoices(models.TextChoices):
     OTHER = "O", "سایر"
 
 
+class ContractQuerySet(models.QuerySet):
+    def with_client_debt(self) -> models.QuerySet:
+        """
+        Annotating what the client of each contract paid to the center
+        for it as `client_paid_amount`, read by `Contract.client_debt`
+        instead of a query per contract.
+        """
+
+        healthcare = People.objects.filter(firstname="مرکز").first()
+        return self.annotate(
+            client_paid_amount=Subquery(
+                Payment.objects.filter(
+                    contract=OuterRef("pk"),
+                    source=OuterRef("client"),
+                    destination=healthcare,
+                )
+                .order_by()
+                .values("contract")
+                .annotate(total=Sum("amount"))
+                .values("total"),
+                output_field=models.BigIntegerField(),
+            )
+        )
+
+
 class Contract(Log):
     contract_at = JDateField()
+    contract_day = JalaliDayField("contract_at")
 
     class CareContractTypeChoices(models.TextChoices):
         ELDER = "E", "سالمند"
@@ -671,13 +1034,18 @@ class Contract(Log):
         Referral, on_delete=models.CASCADE, null=True, blank=True
     )
 
+    objects = ContractQuerySet.as_manager()
+
     @property
     def client_debt(self):
-        healthcare = People.objects.filter(firstname="مرکز").first()
+        try:
+            total_paid_amount = self.client_paid_amount
+        except AttributeError:
+            healthcare = People.objects.filter(firstname="مرکز").first()
+            total_paid_amount = self.payment_set.filter(
+                source=self.client_id, destination=healthcare
+            ).aggregate(total_paid_amount=Sum("amount"))["total_paid_amount"]
 
-        total_paid_amount = self.payment_set.filter(
-            source=self.client, destination=healthcare
-        ).aggregate(total_paid_amount=Sum("amount"))["total_paid_amount"]
         if not total_paid_amount:
             return self.healthcare_franchise_amount
 
@@ -695,14 +1063,23 @@ class Contract(Log):
 
     @property
     def all_patients(self):
-        patients = (
-            self.patients.all()
-            .annotate(
-                fullname=Concat(F("firstname"), Value(" "), F("lastname"))
+        # iterating patients.all() lets callers prefetch "patients"
+        return ", ".join(patient.full_name for patient in self.patients.all())
+
+    def clean(self):
+        from .schedule import contract_conflicts
+
+        if None in (self.personnel_id, self.start, self.end):
+            return
+
+        conflicts = contract_conflicts(self)
+        if conflicts:
+            raise ValidationError(
+                {
+                    "personnel": "پرسنل در این بازه رزرو شده است: "
+                    + ", ".join(f"{c.kind} {c.id}" for c in conflicts)
+                }
             )
-            .values_list("fullname", flat=True)
-        )
-        return ", ".join(patients) if patients else ""
 
     def get_contracts_in_month_ago(month_count: int = 1) -> models.QuerySet:
         start, end = utils.get_month_start_end(month_count)
@@ -734,6 +1111,7 @@ class OutgoPaymentManager(models.Manager):
 
 class Payment(Log):
     paid_at = JDateField()
+    paid_day = JalaliDayField("paid_at")
     source = models.ForeignKey(
         People,
         on_delete=models.CASCADE,
@@ -797,6 +1175,7 @@ class StatusChoices(models.TextChoices):
 
 class Call(Log):
     called_at = JDateField()
+    called_day = JalaliDayField("called_at")
     from_people = models.ForeignKey(
         People,
         on_delete=models.CASCADE,
@@ -847,7 +1226,7 @@ class Call(Log):
         )
 
     def __str__(self) -> str:
-        return self.called_at
+        return str(self.called_at)
 
 
 class BlackList(models.Model):
@@ -865,21 +1244,1030 @@ class BlackList(models.Model):
 
 
 class OrderPayment(models.Model):
-    order = models.ForeignKey(
-        Order, on_delete=models.CASCADE, related_name="order_payment"
+    """
+    Costs, franchises, payments and debts of an order, one row per order.
+
+    Rows are refreshed by the receivers in `signals.py` whenever the
+    services, discount or payments of an order change, use the
+    `rebuild_order_payment` command for backfills and verification.
+    """
+
+    order = models.OneToOneField(
+        Order,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="order_payment",
     )
-    cost_without_discount = models.BigIntegerField()
-    cost = models.BigIntegerField()
-    healthcare_franchise = models.BigIntegerField()
-    personnel_fee = models.BigIntegerField()
-    personnel_paid = models.BigIntegerField()
-    client_paid = models.BigIntegerField()
-    personnel_debt = models.BigIntegerField()
-    client_debt = models.BigIntegerField()
+    cost_without_discount = models.BigIntegerField(default=0)
+    cost = models.BigIntegerField(default=0)
+    healthcare_franchise = models.BigIntegerField(default=0)
+    personnel_fee = models.BigIntegerField(default=0)
+    personnel_paid = models.BigIntegerField(default=0)
+    client_paid = models.BigIntegerField(default=0)
+    personnel_debt = models.BigIntegerField(default=0)
+    client_debt = models.BigIntegerField(default=0)
 
     class Meta:
-        managed = False
         db_table = "order_payment"
+        indexes = [
+            models.Index(fields=["client_debt"]),
+            models.Index(fields=["personnel_debt"]),
+        ]
+
+    value_fields = [
+        "cost_without_discount",
+        "cost",
+        "healthcare_franchise",
+        "personnel_fee",
+        "personnel_paid",
+        "client_paid",
+        "personnel_debt",
+        "client_debt",
+    ]
+
+    @staticmethod
+    def compute(order_ids) -> list["OrderPayment"]:
+        """
+        Computing order payments of the given orders in a single query,
+        see `OrderQuerySet.with_payment`.
+
+        Args:
+            order_ids: Primary keys of the orders.
+
+        Returns:
+            Unsaved order payments, one per existing order.
+        """
+
+        prefix = OrderQuerySet.payment_prefix
+        rows = (
+            Order.objects.filter(pk__in=order_ids)
+            .with_payment()
+            .values(
+                "pk",
+                *(f"{prefix}{field}" for field in OrderPayment.value_fields),
+            )
+        )
+
+        return [
+            OrderPayment(
+                order_id=row["pk"],
+                **{
+                    field: row[f"{prefix}{field}"]
+                    for field in OrderPayment.value_fields
+                },
+            )
+            for row in rows
+        ]
+
+    @staticmethod
+    def refresh(order_ids) -> int:
+        """
+        Recomputing and storing order payments of the given orders.
+
+        Returns:
+            Number of refreshed order payments.
+        """
+
+        order_payments = OrderPayment.compute(
+            {pk for pk in order_ids if pk is not None}
+        )
+        OrderPayment.objects.bulk_create(
+            order_payments,
+            update_conflicts=True,
+            unique_fields=["order"],
+            update_fields=OrderPayment.value_fields,
+        )
+        return len(order_payments)
+
+    @staticmethod
+    def verify(order_ids) -> list[int]:
+        """
+        Comparing stored order payments with freshly computed ones.
+
+        Returns:
+            Primary keys of the orders whose stored row is missing or stale.
+        """
+
+        stored = {
+            row["order_id"]: row
+            for row in OrderPayment.objects.filter(
+                order_id__in=order_ids
+            ).values("order_id", *OrderPayment.value_fields)
+        }
+
+        mismatches = []
+        for order_payment in OrderPayment.compute(order_ids):
+            row = stored.get(order_payment.order_id)
+            if row is None or any(
+                row[field] != getattr(order_payment, field)
+                for field in OrderPayment.value_fields
+            ):
+                mismatches.append(order_payment.order_id)
+
+        return mismatches
+
+    def __str__(self) -> str:
+        return f"payment of order {self.order_id}"
+
+
+class PeopleSummary(models.Model):
+    """
+    Denormalized counters and balances of a person, read by the people
+    section tables instead of computing them per row.
+
+    Rows are kept up to date by the receivers in `signals.py`, use the
+    `rebuild_people_summary` command for backfills.
+    """
+
+    people = models.OneToOneField(
+        People,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="summary",
+    )
+    display_roles = models.CharField(max_length=250, blank=True, default="")
+    client_orders = models.PositiveIntegerField(default=0)
+    client_contracts = models.PositiveIntegerField(default=0)
+    client_debt = models.BigIntegerField(default=0)
+    personnel_orders = models.PositiveIntegerField(default=0)
+    personnel_contracts = models.PositiveIntegerField(default=0)
+    personnel_debt = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @staticmethod
+    def refresh(people_ids) -> int:
+        """
+        Recomputing summaries of the given people with a fixed number
+        of grouped queries, no matter how many people are given.
+
+        Args:
+            people_ids: Primary keys of the people to refresh.
+
+        Returns:
+            Number of refreshed summaries.
+        """
+
+        people_ids = {pk for pk in people_ids if pk is not None}
+        people_ids = list(
+            People.objects.filter(pk__in=people_ids).values_list(
+                "pk", flat=True
+            )
+        )
+        if not people_ids:
+            return 0
+
+        def grouped(qs: models.QuerySet, key: str, value) -> dict:
+            return dict(
+                qs.values(key)
+                .annotate(value=value)
+                .order_by()
+                .values_list(key, "value")
+            )
+
+        client_orders = grouped(
+            Order.objects.filter(client_id__in=people_ids),
+            "client_id",
+            Count("pk"),
+        )
+        client_contracts = grouped(
+            Contract.objects.filter(client_id__in=people_ids),
+            "client_id",
+            Count("pk"),
+        )
+        personnel_orders = grouped(
+            Order.objects.filter(assigned_personnel_id__in=people_ids),
+            "assigned_personnel_id",
+            Count("pk"),
+        )
+        personnel_contracts = grouped(
+            Contract.objects.filter(personnel_id__in=people_ids),
+            "personnel_id",
+            Count("pk"),
+        )
+        order_debts = grouped(
+            OrderPayment.objects.filter(order__client_id__in=people_ids),
+            "order__client_id",
+            Sum("client_debt"),
+        )
+        contract_costs = grouped(
+            Contract.objects.filter(client_id__in=people_ids),
+            "client_id",
+            Sum("healthcare_franchise_amount"),
+        )
+        contract_paid = grouped(
+            Payment.objects.filter(
+                source_id__in=people_ids, order__isnull=True
+            ),
+            "source_id",
+            Sum("amount"),
+        )
+        personnel_debts = grouped(
+            OrderPayment.objects.filter(
+                order__assigned_personnel_id__in=people_ids
+            ),
+            "order__assigned_personnel_id",
+            Sum("personnel_debt"),
+        )
+
+        roles = dict()
+        for people_id, title in PeopleRole.objects.filter(
+            people_id__in=people_ids
+        ).values_list("people_id", "catalog__title"):
+            roles.setdefault(people_id, []).append(title)
+
+        summaries = []
+        for pk in people_ids:
+            client_debt = (
+                (order_debts.get(pk) or 0)
+                + (contract_costs.get(pk) or 0)
+                - (contract_paid.get(pk) or 0)
+            )
+            personnel_debt = personnel_debts.get(pk) or 0
+            summaries.append(
+                PeopleSummary(
+                    people_id=pk,
+                    display_roles=", ".join(roles.get(pk, []))[:250],
+                    client_orders=client_orders.get(pk, 0),
+                    client_contracts=client_contracts.get(pk, 0),
+                    client_debt=client_debt if client_debt >= 0 else 0,
+                    personnel_orders=personnel_orders.get(pk, 0),
+                    personnel_contracts=personnel_contracts.get(pk, 0),
+                    personnel_debt=(
+                        personnel_debt if personnel_debt >= 0 else 0
+                    ),
+                )
+            )
+
+        PeopleSummary.objects.bulk_create(
+            summaries,
+            update_conflicts=True,
+            unique_fields=["people"],
+            update_fields=[
+                "display_roles",
+                "client_orders",
+                "client_contracts",
+                "client_debt",
+                "personnel_orders",
+                "personnel_contracts",
+                "personnel_debt",
+                "updated_at",
+            ],
+        )
+        return len(summaries)
+
+    def __str__(self) -> str:
+        return f"summary of {self.people_id}"
+
+
+class SearchEntityChoices(models.TextChoices):
+    PEOPLE = "people", "اشخاص"
+    SERVICE = "service", "سرویس‌ها"
+    ORDER = "order", "خدمات موردی"
+    CONTRACT = "contract", "قراردادها"
+    PAYMENT = "payment", "پرداختی‌ها"
+
+
+class SearchDocument(models.Model):
+    """
+    Searchable text of an entity, looked up by the global search through
+    a full-text index, PostgreSQL GIN over `to_tsvector` or a SQLite FTS5
+    table, both created by the migration of this model.
+
+    Documents are kept in sync by the receivers in `signals.py`, use the
+    `rebuild_search_index` command for backfills.
+    """
+
+    entity = models.CharField(max_length=10, choices=SearchEntityChoices)
+    object_id = models.BigIntegerField()
+    title = models.CharField(max_length=250)
+    link = models.CharField(max_length=250, blank=True)
+    document = models.TextField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["entity", "object_id"],
+                name="unique_search_document",
+            )
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.entity} {self.object_id}"
+
+
+class RollupGranularityChoices(models.TextChoices):
+    DAY = "day", "روزانه"
+    WEEK = "week", "هفتگی"
+    MONTH = "month", "ماهانه"
+    YEAR = "year", "سالانه"
+
+
+class DailyRollup(models.Model):
+    """
+    Daily totals of the dashboard metrics keyed by jalali date, charts
+    read these instead of the raw orders, calls and payments. Days
+    without any activity have no row.
+
+    Rows are kept up to date by the receivers in `signals.py`, use the
+    `rebuild_daily_rollups` command for backfills.
+    """
+
+    day = JDateField(primary_key=True)
+    calendar_day = JalaliDayField("day")
+    new_clients = models.PositiveIntegerField(default=0)
+    orders = models.PositiveIntegerField(default=0)
+    contracts = models.PositiveIntegerField(default=0)
+    calls = models.PositiveIntegerField(default=0)
+    income = models.BigIntegerField(default=0)
+    outgo = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    metrics = [
+        "new_clients",
+        "orders",
+        "contracts",
+        "calls",
+        "income",
+        "outgo",
+    ]
+
+    @staticmethod
+    def compute(days) -> list["DailyRollup"]:
+        """
+        Computing the totals of the given days with one grouped query
+        per metric, no matter how many days are given.
+
+        Args:
+            days: Jalali dates in the format of the date fields.
+
+        Returns:
+            Unsaved rollups of the given days which had any activity.
+        """
+
+        days = {utils.parse_jdate(day) for day in days if day}
+
+        def grouped(qs: models.QuerySet, key: str, value) -> dict:
+            return dict(
+                qs.filter(**{f"{key}__in": days})
+                .values(key)
+                .annotate(value=value)
+                .order_by()
+                .values_list(key, "value")
+            )
+
+        values = {
+            "new_clients": grouped(People.clients, "joined_at", Count("pk")),
+            "orders": grouped(Order.objects, "order_at", Count("pk")),
+            "contracts": grouped(Contract.objects, "contract_at", Count("pk")),
+            "calls": grouped(Call.objects, "called_at", Count("pk")),
+            "income": grouped(Payment.incomes, "paid_at", Sum("amount")),
+            "outgo": grouped(Payment.outgoes, "paid_at", Sum("amount")),
+        }
+
+        rollups = []
+        for day in sorted(days):
+            rollup = DailyRollup(
+                day=day,
+                **{
+                    metric: values[metric].get(day) or 0
+                    for metric in DailyRollup.metrics
+                },
+            )
+            if any(getattr(rollup, metric) for metric in DailyRollup.metrics):
+                rollups.append(rollup)
+
+        return rollups
+
+    @staticmethod
+    def refresh(days) -> int:
+        """
+        Recomputing rollups of the given days, rows of days which have
+        no activity anymore are removed.
+
+        Returns:
+            Number of stored rollups.
+        """
+
+        days = {utils.parse_jdate(day) for day in days if day}
+        if not days:
+            return 0
+
+        rollups = DailyRollup.compute(days)
+        DailyRollup.objects.bulk_create(
+            rollups,
+            update_conflicts=True,
+            unique_fields=["day"],
+            update_fields=[*DailyRollup.metrics, "updated_at"],
+        )
+        DailyRollup.objects.filter(
+            day__in=days - {rollup.day for rollup in rollups}
+        ).delete()
+
+        return len(rollups)
+
+    @staticmethod
+    def _periods(
+        start: jalali.JDate, end: jalali.JDate, granularity: str
+    ) -> list[tuple[str, jalali.JDate, jalali.JDate]]:
+        # label, first and last day of every period between the dates,
+        # periods at both ends are cut by them
+        labels = {
+            RollupGranularityChoices.DAY: lambda d: str(d),
+            RollupGranularityChoices.WEEK: lambda d: str(
+                d - datetime.timedelta(days=d.weekday())
+            ),
+            RollupGranularityChoices.MONTH: lambda d: str(d)[:7],
+            RollupGranularityChoices.YEAR: lambda d: str(d)[:4],
+        }
+        lengths = {
+            RollupGranularityChoices.DAY: lambda d: 1,
+            RollupGranularityChoices.WEEK: lambda d: 7 - d.weekday(),
+            RollupGranularityChoices.MONTH: lambda d: (
+                jalali.days_in_month(d.year, d.month) - d.day + 1
+            ),
+            RollupGranularityChoices.YEAR: lambda d: (
+                jalali.to_ordinal(jalali.from_parts(d.year + 1, 1, 1))
+                - jalali.to_ordinal(d)
+            ),
+        }
+        label_of, length_of = labels[granularity], lengths[granularity]
+
+        periods = []
+        ordinal, last = jalali.to_ordinal(start), jalali.to_ordinal(end)
+        while ordinal <= last:
+            first = jalali.from_ordinal(ordinal)
+            ordinal = min(ordinal + length_of(first), last + 1)
+            periods.append(
+                (label_of(first), first, jalali.from_ordinal(ordinal - 1))
+            )
+
+        return periods
+
+    @staticmethod
+    def series(
+        start: jalali.JDate,
+        end: jalali.JDate,
+        granularity: str = RollupGranularityChoices.DAY,
+    ) -> list[dict]:
+        """
+        Totals of every period between the given dates, read from the
+        rollups only and grouped by the calendar table in the database.
+        Periods without activity are included with zeros.
+
+        Args:
+            start: First day of the series.
+            end: Last day of the series.
+            granularity: Length of each period, weeks start on saturday.
+
+        Returns:
+            Period label, first and last day and the metric totals of
+            each period, oldest first.
+        """
+
+        rollups = DailyRollup.objects.filter(day__gte=start, day__lte=end)
+        if granularity == RollupGranularityChoices.DAY:
+            totals = {
+                str(row["day"]): row
+                for row in rollups.values("day", *DailyRollup.metrics)
+            }
+        else:
+            totals = {}
+            for row in JalaliDay.report(
+                rollups,
+                "calendar_day",
+                granularity,
+                **{metric: Sum(metric) for metric in DailyRollup.metrics},
+            ):
+                if granularity == RollupGranularityChoices.WEEK:
+                    # the week of new year is split between two years
+                    first_day = jalali.from_parts(row["year"], 1, 1)
+                    label = str(
+                        first_day
+                        + datetime.timedelta(
+                            days=(row["week"] - 1) * 7 - first_day.weekday()
+                        )
+                    )
+                else:
+                    label = row["period"]
+
+                period = totals.setdefault(
+                    label, dict.fromkeys(DailyRollup.metrics, 0)
+                )
+                for metric in DailyRollup.metrics:
+                    period[metric] += row[metric]
+
+        return [
+            dict(
+                period=label,
+                start=str(first),
+                **{
+                    metric: totals[label][metric] if label in totals else 0
+                    for metric in DailyRollup.metrics
+                },
+                end=str(last),
+            )
+            for label, first, last in DailyRollup._periods(
+                start, end, granularity
+            )
+        ]
+
+    def __str__(self) -> str:
+        return f"rollup of {self.day}"
+
+
+class ReportPeriodChoices(models.TextChoices):
+    WEEK = "week", "هفتگی"
+    MONTH = "month", "ماهانه"
+    QUARTER = "quarter", "فصلی"
+    YEAR = "year", "سالانه"
+
+
+class JalaliDay(models.Model):
+    """
+    Calendar table with one row per jalali day. Dated models join it by
+    their JalaliDayField, so reports group by real jalali weeks, months,
+    quarters and years in the database. Fridays and the days of the
+    Holiday table are holidays.
+
+    Use the `build_jalali_days` command for covering more years.
+    """
+
+    date = JDateField(primary_key=True)
+    year = models.PositiveSmallIntegerField()
+    quarter = models.PositiveSmallIntegerField()
+    month = models.PositiveSmallIntegerField()
+    day = models.PositiveSmallIntegerField()
+    # weeks start on saturday, the first one holds 1 farvardin
+    week = models.PositiveSmallIntegerField()
+    # saturday is 0
+    weekday = models.PositiveSmallIntegerField()
+    month_start = JDateField(db_index=False)
+    month_end = JDateField(db_index=False)
+    is_holiday = models.BooleanField(default=False)
+
+    FRIDAY = 6
+
+    periods = {
+        ReportPeriodChoices.WEEK: ["year", "week"],
+        ReportPeriodChoices.MONTH: ["year", "month"],
+        ReportPeriodChoices.QUARTER: ["year", "quarter"],
+        ReportPeriodChoices.YEAR: ["year"],
+    }
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["year", "month"]),
+            models.Index(fields=["year", "quarter"]),
+            models.Index(fields=["year", "week"]),
+        ]
+
+    @staticmethod
+    def build(first_year: int, last_year: int, batch_size: int = 1000) -> int:
+        """
+        Creating or updating the rows of every day of the given years.
+
+        Returns:
+            Number of stored days.
+        """
+
+        holidays = set(
+            Holiday.objects.filter(
+                date__gte=jalali.from_parts(first_year, 1, 1),
+                date__lt=jalali.from_parts(last_year + 1, 1, 1),
+            ).values_list("date", flat=True)
+        )
+        days = [
+            JalaliDay(
+                **attrs,
+                is_holiday=attrs["weekday"] == JalaliDay.FRIDAY
+                or attrs["date"] in holidays,
+            )
+            for attrs in jalali.calendar(first_year, last_year)
+        ]
+        JalaliDay.objects.bulk_create(
+            days,
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=["date"],
+            update_fields=[
+                field.name
+                for field in JalaliDay._meta.concrete_fields
+                if not field.primary_key
+            ],
+        )
+
+        return len(days)
+
+    @staticmethod
+    def report(
+        qs: models.QuerySet, day: str, period: str, **aggregates
+    ) -> list[dict]:
+        """
+        Aggregating the rows per jalali period with a join to the
+        calendar table and a GROUP BY, nothing is regrouped in python.
+
+        Args:
+            qs: Rows of the report, like Order.objects.
+            day: Name of the JalaliDayField of the rows, like order_day.
+            period: Length of each period, one of ReportPeriodChoices.
+            aggregates: Values computed for each period, like
+                orders=Count("pk").
+
+        Returns:
+            Label, parts and aggregated values of every period which has
+            any row, oldest first.
+        """
+
+        parts = JalaliDay.periods[period]
+        rows = (
+            qs.order_by()
+            .values(**{part: F(f"{day}__{part}") for part in parts})
+            .annotate(**aggregates)
+            .order_by(*parts)
+        )
+
+        labels = {
+            ReportPeriodChoices.WEEK: "{year}/W{week:02d}",
+            ReportPeriodChoices.MONTH: "{year}/{month:02d}",
+            ReportPeriodChoices.QUARTER: "{year}/Q{quarter}",
+            ReportPeriodChoices.YEAR: "{year}",
+        }
+        return [
+            dict(period=labels[period].format(**row), **row) for row in rows
+        ]
+
+    @staticmethod
+    def refresh_holidays(days) -> None:
+        """
+        Recomputing the holiday flag of the given days after holidays
+        were added, moved or removed.
+        """
+
+        days = {utils.parse_jdate(day) for day in days if day}
+        if not days:
+            return
+
+        JalaliDay.objects.filter(date__in=days).update(
+            is_holiday=Case(
+                When(
+                    Q(weekday=JalaliDay.FRIDAY)
+                    | Exists(Holiday.objects.filter(date=OuterRef("date"))),
+                    then=Value(True),
+                ),
+                default=Value(False),
+            )
+        )
+
+    def __str__(self) -> str:
+        return str(self.date)
+
+
+class Holiday(models.Model):
+    """
+    Official holidays besides fridays. Contracts which do not include
+    holidays have no shift on them.
+    """
+
+    date = JDateField(unique=True)
+    title = models.CharField(max_length=150)
+
+    def __str__(self) -> str:
+        return f"{self.date} {self.title}"
+
+
+class PayrollStatusChoices(models.TextChoices):
+    DRAFT = "D", "پیش‌نویس"
+    POSTED = "P", "پرداخت شده"
+
+
+class PayrollBatch(Log):
+    """
+    Monthly payroll of the personnel, reviewed as a draft and posted as
+    settlement payments at once. Drafts may be recomputed until posted.
+
+    Batches are computed and posted by `payroll.py`, use the
+    `run_payroll` command or the payroll api.
+    """
+
+    year = models.PositiveSmallIntegerField()
+    month = models.PositiveSmallIntegerField(
+        validators=[MinValueValidator(1), MaxValueValidator(12)]
+    )
+    status = models.CharField(
+        choices=PayrollStatusChoices.choices,
+        max_length=1,
+        default=PayrollStatusChoices.DRAFT,
+    )
+    posted_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["year", "month"], name="unique_payroll_month"
+            )
+        ]
+
+    @property
+    def period(self) -> str:
+        return f"{self.year}/{self.month:02d}"
+
+    def __str__(self) -> str:
+        return f"payroll of {self.period}"
+
+
+class PayrollItem(models.Model):
+    """
+    What a personnel earned in the month of the batch: prorated contract
+    salaries plus the unpaid fees of the month's orders, less what was
+    already paid to them within the month apart from orders.
+    """
+
+    batch = models.ForeignKey(
+        PayrollBatch, on_delete=models.CASCADE, related_name="items"
+    )
+    personnel = models.ForeignKey(
+        People, on_delete=models.CASCADE, related_name="payroll_items"
+    )
+    contracts = models.PositiveIntegerField(default=0)
+    shift_days = models.PositiveIntegerField(default=0)
+    salary = models.BigIntegerField(default=0)
+    orders = models.PositiveIntegerField(default=0)
+    order_fees = models.BigIntegerField(default=0)
+    paid = models.BigIntegerField(default=0)
+    amount = models.BigIntegerField(default=0)
+    payment = models.OneToOneField(
+        Payment,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="payroll_item",
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["batch", "personnel"], name="unique_payroll_personnel"
+            )
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.batch} of {self.personnel_id}"
+
+
+class VisitStatusChoices(models.TextChoices):
+    SCHEDULED = "S", "برنامه‌ریزی شده"
+    ATTENDED = "A", "حاضر"
+    ABSENT = "N", "غایب"
+
+
+class Visit(models.Model):
+    """
+    A shift day of a contract, for attendance and billing per visit.
+
+    Visits are generated a few weeks ahead from the calendar of their
+    contract by `visits.py`, use the `generate_visits` command. Scheduled
+    visits follow their contract when it changes, attended and absent
+    ones are kept as they are. Holiday changes are applied by the same
+    command run with --pending.
+    """
+
+    contract = models.ForeignKey(
+        Contract, on_delete=models.CASCADE, related_name="visits"
+    )
+    personnel = models.ForeignKey(
+        People, on_delete=models.CASCADE, related_name="personnel_visits"
+    )
+    # leading the date and status index
+    date = JDateField(db_index=False)
+    visit_day = JalaliDayField("date")
+    shift_start = models.PositiveSmallIntegerField()
+    shift_end = models.PositiveSmallIntegerField()
+    status = models.CharField(
+        choices=VisitStatusChoices.choices,
+        max_length=1,
+        default=VisitStatusChoices.SCHEDULED,
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["contract", "date"], name="unique_contract_visit"
+            )
+        ]
+        indexes = [
+            models.Index(fields=["personnel", "date"]),
+            models.Index(fields=["date", "status"]),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.date} of contract {self.contract_id}"
+
+
+class AgendaSnapshot(models.Model):
+    """
+    Visits and orders of a personnel in a day, with the names, addresses
+    and phone numbers of their clients, served as they are to the phones
+    of the field staff. Days without any visit or order have no row.
+
+    Snapshots of the coming days are built nightly by the `build_agenda`
+    command, after `generate_visits`, and patched by the receivers in
+    `signals.py`.
+    """
+
+    personnel = models.ForeignKey(
+        People, on_delete=models.CASCADE, related_name="agenda_snapshots"
+    )
+    # leading the personnel and date constraint instead
+    date = JDateField(db_index=False)
+    items = models.JSONField(default=list)
+    etag = models.CharField(max_length=32)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # number of days agendas are kept for, from today
+    DAYS = 2
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["personnel", "date"], name="unique_personnel_agenda"
+            )
+        ]
+
+    def __str__(self) -> str:
+        return f"agenda of {self.personnel_id} on {self.date}"
+
+    @staticmethod
+    def days() -> list[jalali.JDate]:
+        today = jalali.to_ordinal(jalali.today())
+        return [
+            jalali.from_ordinal(today + day)
+            for day in range(AgendaSnapshot.DAYS)
+        ]
+
+    @staticmethod
+    def etag_of(date, items: list[dict]) -> str:
+        payload = json.dumps(
+            {"date": str(date), "items": items}, ensure_ascii=False
+        )
+        return hashlib.md5(payload.encode()).hexdigest()
+
+    @staticmethod
+    def pairs(visits: Q = Q(), orders: Q = Q()) -> set[tuple]:
+        """
+        Personnel and days of the kept agendas which hold the visits and
+        orders matching the given lookups.
+        """
+
+        days = AgendaSnapshot.days()
+        return {
+            *Visit.objects.filter(visits, date__in=days).values_list(
+                "personnel_id", "date"
+            ),
+            *Order.objects.filter(orders, order_at__in=days).values_list(
+                "assigned_personnel_id", "order_at"
+            ),
+        }
+
+    @staticmethod
+    def compute(pairs) -> list["AgendaSnapshot"]:
+        """
+        Computing the agendas of the given personnel and days with three
+        queries, no matter how many are given.
+
+        Args:
+            pairs: Personnel ids and jalali dates of the agendas.
+
+        Returns:
+            Unsaved snapshots of the given agendas which are not empty.
+        """
+
+        pairs = {
+            (personnel_id, utils.parse_jdate(date))
+            for personnel_id, date in pairs
+            if personnel_id is not None and date
+        }
+        people_ids = {personnel_id for personnel_id, _ in pairs}
+        days = {date for _, date in pairs}
+
+        visits = Visit.objects.filter(
+            personnel_id__in=people_ids, date__in=days
+        ).select_related("contract__client", "contract__service_location")
+        orders = Order.objects.filter(
+            assigned_personnel_id__in=people_ids, order_at__in=days
+        ).select_related("client", "service_location")
+
+        entries = [
+            (visit.personnel_id, visit.date, "visit", visit, visit.contract)
+            for visit in visits
+        ]
+        entries += [
+            (
+                order.assigned_personnel_id,
+                order.order_at,
+                "order",
+                order,
+                order,
+            )
+            for order in orders
+        ]
+        entries = [entry for entry in entries if entry[:2] in pairs]
+
+        phone_numbers = {}
+        for people_id, value in PeopleDetailedInfo.actives.filter(
+            people_id__in={entry[4].client_id for entry in entries},
+            detail_type=PeopleDetailTypeChoices.PHONE_NUMBER,
+        ).values_list("people_id", "value"):
+            phone_numbers.setdefault(people_id, []).append(value)
+
+        agendas = {}
+        for personnel_id, date, type, booking, source in entries:
+            agendas.setdefault((personnel_id, date), []).append(
+                dict(
+                    type=type,
+                    id=booking.pk,
+                    client=source.client.fullname_with_prefix,
+                    address=source.service_location.value,
+                    phone_numbers=phone_numbers.get(source.client_id, []),
+                    shift_start=getattr(booking, "shift_start", None),
+                    shift_end=getattr(booking, "shift_end", None),
+                    status=getattr(booking, "status", None),
+                )
+            )
+
+        snapshots = []
+        for (personnel_id, date), items in sorted(agendas.items()):
+            # orders have no hours and come first
+            items.sort(key=lambda item: (item["shift_start"] or 0, item["id"]))
+            snapshots.append(
+                AgendaSnapshot(
+                    personnel_id=personnel_id,
+                    date=date,
+                    items=items,
+                    etag=AgendaSnapshot.etag_of(date, items),
+                )
+            )
+
+        return snapshots
+
+    @staticmethod
+    def refresh(pairs) -> int:
+        """
+        Recomputing the agendas of the given personnel and days, those
+        outside of the kept days are skipped and the ones which became
+        empty are removed.
+
+        Returns:
+            Number of stored snapshots.
+        """
+
+        days = set(AgendaSnapshot.days())
+        pairs = {
+            (personnel_id, utils.parse_jdate(date))
+            for personnel_id, date in pairs
+            if personnel_id is not None and date
+        }
+        pairs = {pair for pair in pairs if pair[1] in days}
+        if not pairs:
+            return 0
+
+        snapshots = AgendaSnapshot.compute(pairs)
+        AgendaSnapshot.objects.bulk_create(
+            snapshots,
+            update_conflicts=True,
+            unique_fields=["personnel", "date"],
+            update_fields=["items", "etag", "updated_at"],
+        )
+
+        empty = pairs - {
+            (snapshot.personnel_id, snapshot.date) for snapshot in snapshots
+        }
+        for date in {date for _, date in empty}:
+            AgendaSnapshot.objects.filter(
+                date=date,
+                personnel_id__in=[pk for pk, day in empty if day == date],
+            ).delete()
+
+        return len(snapshots)
+
+    @staticmethod
+    def build() -> int:
+        """
+        Rebuilding the agendas of every personnel for the kept days, the
+        ones of earlier days are removed.
+
+        Returns:
+            Number of stored snapshots.
+        """
+
+        days = AgendaSnapshot.days()
+        AgendaSnapshot.objects.exclude(date__in=days).delete()
+
+        return AgendaSnapshot.refresh(
+            AgendaSnapshot.pairs()
+            | set(AgendaSnapshot.objects.values_list("personnel_id", "date"))
+        )
 
 
 # class DebtorClient(models.Model):
@@ -0,0 +1,211 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+from rest_framework.serializers import ValidationError
+
+from . import dashboard, jalali, models, previews, search, workdays
+from .models import PayrollStatusChoices as psc
+from .models import SearchEntityChoices as sec
+
+
+def month_period(year: int, month: int) -> tuple[jalali.JDate, jalali.JDate]:
+    """
+    First and last day of the given jalali month.
+
+    Raises:
+        ValueError: The month is not valid.
+    """
+
+    return (
+        jalali.from_parts(year, month, 1),
+        jalali.from_parts(year, month, jalali.days_in_month(year, month)),
+    )
+
+
+def _salaries(start, end) -> dict[int, dict]:
+    # contract salaries are prorated by the shift days of the contract
+    # within the month, out of its shift days in the whole month
+    contracts = models.Contract.objects.filter(start__lte=end, end__gte=start)
+    worked = workdays.count_contracts_shift_days(contracts, start, end)
+
+    scheduled = {}
+    salaries = defaultdict(lambda: dict(contracts=0, shift_days=0, salary=0))
+    for (
+        pk,
+        personnel_id,
+        salary,
+        *weekdays,
+        include_holidays,
+    ) in contracts.order_by().values_list(
+        "pk",
+        "personnel_id",
+        "personnel_monthly_salary",
+        *workdays.WEEKDAYS,
+        "include_holidays",
+    ):
+        mask = sum(1 << weekday for weekday, on in enumerate(weekdays) if on)
+        if (mask, include_holidays) not in scheduled:
+            scheduled[(mask, include_holidays)] = workdays.count_shift_days(
+                mask, include_holidays, start, end
+            )
+
+        total = scheduled[(mask, include_holidays)]
+        item = salaries[personnel_id]
+        item["contracts"] += 1
+        item["shift_days"] += worked[pk]
+        if total:
+            item["salary"] += salary * worked[pk] // total
+
+    return salaries
+
+
+def compute(year: int, month: int) -> list[models.PayrollItem]:
+    """
+    Computing what every personnel earned in the given month, with a
+    fixed number of grouped queries however many people are paid.
+
+    Args:
+        year: Jalali year of the payroll.
+        month: Jalali month of the payroll.
+
+    Returns:
+        Unsaved payroll items of the personnel who had an active
+        contract, an order or a payment within the month.
+    """
+
+    start, end = month_period(year, month)
+    salaries = _salaries(start, end)
+
+    # fees of the month's orders less whatever was paid for them, before
+    # or after the month, so a fee paid directly is never paid twice
+    fee_rows = (
+        models.OrderPayment.objects.filter(order__order_at__range=(start, end))
+        .values("order__assigned_personnel")
+        .annotate(orders=Count("pk"), order_fees=Sum("personnel_debt"))
+        .order_by()
+        .values_list("order__assigned_personnel", "orders", "order_fees")
+    )
+    fees = {
+        personnel_id: (orders, total)
+        for personnel_id, orders, total in fee_rows
+    }
+
+    # payments of orders are already netted from their fees and payments
+    # of earlier payrolls are settlements, neither is a prepayment
+    paid = dict(
+        models.Payment.outgoes.filter(
+            paid_at__range=(start, end),
+            destination__isnull=False,
+            order__isnull=True,
+            payroll_item__isnull=True,
+        )
+        .values("destination")
+        .annotate(paid=Sum("amount"))
+        .order_by()
+        .values_list("destination", "paid")
+    )
+
+    items = []
+    for personnel_id in sorted({*salaries, *fees, *paid}):
+        salary = salaries.get(personnel_id, {})
+        orders, order_fees = fees.get(personnel_id, (0, 0))
+        item = models.PayrollItem(
+            personnel_id=personnel_id,
+            contracts=salary.get("contracts", 0),
+            shift_days=salary.get("shift_days", 0),
+            salary=salary.get("salary", 0),
+            orders=orders,
+            order_fees=order_fees or 0,
+            paid=paid.get(personnel_id) or 0,
+        )
+        item.amount = max(item.salary + item.order_fees - item.paid, 0)
+        items.append(item)
+
+    return items
+
+
+@transaction.atomic
+def run(year: int, month: int) -> models.PayrollBatch:
+    """
+    Creating the draft payroll of the given month for review, a draft
+    which already exists is recomputed.
+
+    Raises:
+        ValidationError: The payroll of the month is already posted.
+    """
+
+    batch, _ = models.PayrollBatch.objects.select_for_update().get_or_create(
+        year=year, month=month
+    )
+    if batch.status == psc.POSTED:
+        raise ValidationError(
+            {"error": [f"حقوق ماه {batch.period} قبلا پرداخت شده است."]}
+        )
+
+    items = compute(year, month)
+    for item in items:
+        item.batch = batch
+
+    batch.items.all().delete()
+    models.PayrollItem.objects.bulk_create(items)
+    batch.save(update_fields=["updated_at"])
+
+    return batch
+
+
+@transaction.atomic
+def post(batch: models.PayrollBatch) -> int:
+    """
+    Paying every item of the draft batch with one settlement payment per
+    personnel, all stored together or none at all.
+
+    Returns:
+        Number of stored payments.
+
+    Raises:
+        ValidationError: The batch is already posted.
+    """
+
+    batch = models.PayrollBatch.objects.select_for_update().get(pk=batch.pk)
+    if batch.status == psc.POSTED:
+        raise ValidationError(
+            {"error": [f"حقوق ماه {batch.period} قبلا پرداخت شده است."]}
+        )
+
+    today = jalali.today()
+    items = list(batch.items.filter(amount__gt=0))
+    payments = models.Payment.objects.bulk_create(
+        [
+            models.Payment(
+                paid_at=today,
+                destination_id=item.personnel_id,
+                amount=item.amount,
+                note=f"حقوق ماه {batch.period}",
+            )
+            for item in items
+        ]
+    )
+    for item, payment in zip(items, payments):
+        item.payment = payment
+    models.PayrollItem.objects.bulk_update(items, ["payment"])
+
+    batch.status = psc.POSTED
+    batch.posted_at = timezone.now()
+    batch.save(update_fields=["status", "posted_at", "updated_at"])
+
+    # bulk creations do not send the signals which keep these up to date
+    people_ids = {item.personnel_id for item in items}
+    payment_ids = [payment.pk for payment in payments]
+    transaction.on_commit(lambda: models.PeopleSummary.refresh(people_ids))
+    transaction.on_commit(lambda: models.DailyRollup.refresh([today]))
+    transaction.on_commit(lambda: search.index(sec.PAYMENT, payment_ids))
+    transaction.on_commit(dashboard.invalidate)
+    transaction.on_commit(
+        lambda: previews.invalidate(
+            previews.dependents(models.Payment, {"destination_id": people_ids})
+        )
+    )
+
+    return len(payments)
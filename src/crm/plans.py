@@ -0,0 +1,90 @@
+from django.db.models import OuterRef, Prefetch, QuerySet, Subquery, Sum
+
+from . import models
+
+# query plans of the preview tables, each one loads what the serializers
+# of its table read, so a table costs the same number of queries however
+# many rows it has
+
+
+def _people() -> QuerySet:
+    # what PeopleMinimalSerializer and get_absolute_url_api read
+    return models.People.objects.only(
+        "pk", "firstname", "lastname", "gender"
+    ).prefetch_related(
+        Prefetch("types", models.Catalog.objects.only("pk", "title"))
+    )
+
+
+def orders(qs: QuerySet) -> QuerySet:
+    return qs.select_related("order_payment").prefetch_related(
+        Prefetch("client", _people()),
+        Prefetch("services", models.Service.objects.only("pk", "title")),
+    )
+
+
+def contracts(qs: QuerySet) -> QuerySet:
+    return qs.with_client_debt().prefetch_related(
+        Prefetch("client", _people()),
+        Prefetch(
+            "patients",
+            models.People.objects.only("pk", "firstname", "lastname"),
+        ),
+    )
+
+
+def service_orders(qs: QuerySet, service: models.Service) -> QuerySet:
+    # what the orders cost for the service, annotated as service_cost
+    return orders(qs).annotate(
+        service_cost=Subquery(
+            models.OrderServices.objects.filter(
+                order=OuterRef("pk"), service=service
+            )
+            .order_by()
+            .values("order")
+            .annotate(total=Sum("cost"))
+            .values("total")
+        )
+    )
+
+
+def payments(qs: QuerySet) -> QuerySet:
+    return qs.select_related("source", "order", "contract")
+
+
+def calls(qs: QuerySet) -> QuerySet:
+    return qs.select_related("from_people", "to_people", "order", "contract")
+
+
+def order_services(qs: QuerySet) -> QuerySet:
+    return qs.select_related("service")
+
+
+# query plans of the preview headers, shared by every previewed object
+
+
+def order_headers(qs: QuerySet) -> QuerySet:
+    return (
+        orders(qs)
+        .select_related("service_location", "referral_other")
+        .prefetch_related(
+            Prefetch("assigned_personnel", _people()),
+            Prefetch("referral_people", _people()),
+        )
+    )
+
+
+def contract_headers(qs: QuerySet) -> QuerySet:
+    return (
+        contracts(qs)
+        .select_related("service_location", "referral_other")
+        .prefetch_related(
+            Prefetch("personnel", _people()),
+            Prefetch("referral_people", _people()),
+        )
+    )
+
+
+def people_headers(qs: QuerySet) -> QuerySet:
+    # totals are read from the summary rows
+    return qs.select_related("summary")
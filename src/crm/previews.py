@@ -0,0 +1,560 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Iterable, NamedTuple
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.db.models import F, Func, IntegerField, OuterRef, Q, QuerySet
+from django.db.models import Subquery
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.response import Response
+
+from . import jalali, models, utils
+
+CLIENT = "client"
+PERSONNEL = "personnel"
+PATIENT = "patient"
+ORDER = "order"
+CONTRACT = "contract"
+PREVIEWS = [CLIENT, PERSONNEL, PATIENT, ORDER, CONTRACT]
+
+CACHE_TIMEOUT = 60 * 60
+_CACHE_NAME = "preview"
+_COUNTERS = ["hits", "misses", "invalidations"]
+
+# rows of a section page
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+# query parameters of a section page, see page
+_PAGE_PARAMS = ["section", "after", "limit"]
+# previews of a batch, see get_many
+MAX_BATCH = 100
+
+# workers of the queries async views run at the same time, see run
+_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="preview")
+
+
+def _people(ids) -> set[tuple[str, int]]:
+    return {
+        (entity, pk) for pk in ids for entity in (CLIENT, PERSONNEL, PATIENT)
+    }
+
+
+def _orders(ids) -> set[tuple[str, int]]:
+    # orders and the people showing them
+    keys = {(ORDER, pk) for pk in ids}
+    for people in models.Order.objects.filter(pk__in=ids).values_list(
+        "client_id", "assigned_personnel_id", "referral_people_id"
+    ):
+        keys |= _people(people)
+
+    return keys
+
+
+def _contracts(ids) -> set[tuple[str, int]]:
+    # contracts and the people showing them
+    keys = {(CONTRACT, pk) for pk in ids}
+    for people in models.Contract.objects.filter(pk__in=ids).values_list(
+        "client_id", "personnel_id", "referral_people_id"
+    ):
+        keys |= _people(people)
+
+    keys |= _people(
+        models.Contract.patients.through.objects.filter(
+            contract_id__in=ids
+        ).values_list("people_id", flat=True)
+    )
+    return keys
+
+
+def _locations(ids) -> set[tuple[str, int]]:
+    # orders and contracts showing the addresses
+    return {
+        (ORDER, pk)
+        for pk in models.Order.objects.filter(
+            service_location__in=ids
+        ).values_list("pk", flat=True)
+    } | {
+        (CONTRACT, pk)
+        for pk in models.Contract.objects.filter(
+            service_location__in=ids
+        ).values_list("pk", flat=True)
+    }
+
+
+def _persons(ids) -> set[tuple[str, int]]:
+    # people and every preview showing their names
+    return (
+        _people(ids)
+        | _orders(
+            models.Order.objects.filter(
+                Q(client__in=ids)
+                | Q(assigned_personnel__in=ids)
+                | Q(referral_people__in=ids)
+            ).values_list("pk", flat=True)
+        )
+        | _contracts(
+            models.Contract.objects.filter(
+                Q(client__in=ids)
+                | Q(personnel__in=ids)
+                | Q(referral_people__in=ids)
+                | Q(patients__in=ids)
+            ).values_list("pk", flat=True)
+        )
+    )
+
+
+def _services(ids) -> set[tuple[str, int]]:
+    # orders listing the services, and their people
+    return _orders(
+        set(
+            models.OrderServices.objects.filter(
+                service_id__in=ids
+            ).values_list("order_id", flat=True)
+        )
+    )
+
+
+def _catalogs(ids) -> set[tuple[str, int]]:
+    # people showing the titles as their types, tags, roles, skills or
+    # service locations
+    people = set()
+    for through in (
+        models.PeopleType,
+        models.Specification,
+        models.PeopleRole,
+        models.ServiceLocation,
+    ):
+        people.update(
+            through.objects.filter(catalog_id__in=ids).values_list(
+                "people_id", flat=True
+            )
+        )
+
+    return _people(people)
+
+
+def _referrals(ids) -> set[tuple[str, int]]:
+    # orders and contracts showing the titles, and their people
+    return _orders(
+        set(
+            models.Order.objects.filter(referral_other__in=ids).values_list(
+                "pk", flat=True
+            )
+        )
+    ) | _contracts(
+        set(
+            models.Contract.objects.filter(referral_other__in=ids).values_list(
+                "pk", flat=True
+            )
+        )
+    )
+
+
+def _entity(entity: str) -> Callable:
+    return lambda ids: {(entity, pk) for pk in ids}
+
+
+# previews depending on the rows of each model, by the field pointing to
+# them. Rows of an order or a contract change the numbers of their
+# people too.
+DEPENDENCIES = {
+    models.People: {"pk": _persons},
+    models.PeopleDetailedInfo: {"people_id": _people, "pk": _locations},
+    models.Order: {
+        "pk": _entity(ORDER),
+        "client_id": _people,
+        "assigned_personnel_id": _people,
+        "referral_people_id": _people,
+    },
+    models.OrderServices: {"order_id": _orders},
+    models.Service: {"pk": _services},
+    models.Catalog: {"pk": _catalogs},
+    models.PeopleType: {"people_id": _people},
+    models.Specification: {"people_id": _people},
+    models.PeopleRole: {"people_id": _people},
+    models.ServiceLocation: {"people_id": _people},
+    models.Referral: {"pk": _referrals},
+    models.Contract: {
+        "pk": _contracts,
+        "client_id": _people,
+        "personnel_id": _people,
+        "referral_people_id": _people,
+        # not a field, patients given by the receiver of contract patients
+        "patient_ids": _people,
+    },
+    models.Payment: {
+        "source_id": _people,
+        "destination_id": _people,
+        "order_id": _orders,
+        "contract_id": _contracts,
+    },
+    models.Call: {
+        "from_people_id": _people,
+        "to_people_id": _people,
+        "order_id": _entity(ORDER),
+        "contract_id": _entity(CONTRACT),
+    },
+}
+
+
+def dependents(model, values: dict[str, Iterable]) -> set[tuple[str, int]]:
+    """
+    Previews showing the rows of the model with the given values.
+
+    Args:
+        model: Model of the changed rows, a key of DEPENDENCIES.
+        values: Values of the fields of DEPENDENCIES, current and
+            previous ones, keyed by field name.
+
+    Returns:
+        Entity and id of the dependent previews.
+    """
+
+    keys = set()
+    for field, expand in DEPENDENCIES[model].items():
+        ids = {pk for pk in values.get(field, ()) if pk is not None}
+        if ids:
+            keys |= expand(ids)
+
+    return keys
+
+
+def _version_name(entity: str, id: int) -> str:
+    return f"{_CACHE_NAME}:{entity}:{id}"
+
+
+def _count(counter: str, delta: int = 1):
+    key = f"{_CACHE_NAME}:{counter}"
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        # evicted or never counted
+        cache.add(key, 0, None)
+        cache.incr(key, delta)
+
+
+def invalidate(keys: Iterable[tuple[str, int]]):
+    """
+    Dropping the cached previews of the given entities and ids.
+    """
+
+    keys = set(keys)
+    for entity, id in keys:
+        utils.invalidate_cache_version(_version_name(entity, id))
+
+    if keys:
+        _count("invalidations", len(keys))
+
+
+def _key(entity: str, id: int, version: int, part: str = "") -> str:
+    # ages and contract ends are relative to today
+    return (
+        f"{_version_name(entity, id)}:{version}:{str(jalali.today())}:{part}"
+    )
+
+
+def get(
+    entity: str, id: int, build: Callable[[], dict], part: str = ""
+) -> dict:
+    """
+    Cached payload of a preview, built on a miss.
+
+    Args:
+        entity: Type of the preview, one of PREVIEWS.
+        id: Id of the previewed object.
+        build: Builds the payload on a miss.
+        part: Part of the preview, such as a page of a section, the
+            header by default. Every part shares the preview version.
+    """
+
+    # the version is read before building, so a payload built while its
+    # rows change is stored under the stale version and never read
+    version = utils.get_cache_version(_version_name(entity, id))
+    key = _key(entity, id, version, part)
+    payload = cache.get(key)
+    if payload is not None:
+        _count("hits")
+        return payload
+
+    _count("misses")
+    payload = build()
+    cache.set(key, payload, CACHE_TIMEOUT)
+    return payload
+
+
+async def aget(
+    entity: str, id: int, build: Callable[[], Awaitable[dict]], part: str = ""
+) -> dict:
+    """
+    Cached payload of a preview for async views, see get.
+    """
+
+    version = await sync_to_async(utils.get_cache_version)(
+        _version_name(entity, id)
+    )
+    key = _key(entity, id, version, part)
+    payload = await cache.aget(key)
+    if payload is not None:
+        await sync_to_async(_count)("hits")
+        return payload
+
+    await sync_to_async(_count)("misses")
+    payload = await build()
+    await cache.aset(key, payload, CACHE_TIMEOUT)
+    return payload
+
+
+def page_part(params) -> str:
+    """
+    Part of a preview asked by the given query parameters, see get.
+    """
+
+    return ":".join(params.get(param, "") for param in _PAGE_PARAMS)
+
+
+def get_many(
+    entity: str,
+    ids: Iterable[int],
+    build: Callable[[list[int]], dict[int, dict]],
+) -> dict[int, dict | None]:
+    """
+    Cached payloads of the previews of many objects, with two round
+    trips to the cache and a single build of every missed one.
+
+    Args:
+        entity: Type of the previews, one of PREVIEWS.
+        ids: Ids of the previewed objects.
+        build: Builds the payloads of the given ids on a miss, keyed by
+            id, objects which do not exist are left out.
+
+    Returns:
+        Payloads keyed by id, None for objects which do not exist.
+    """
+
+    ids = list(dict.fromkeys(ids))
+    versions = utils.get_cache_versions(
+        _version_name(entity, id) for id in ids
+    )
+    keys = {
+        id: _key(entity, id, versions[_version_name(entity, id)]) for id in ids
+    }
+
+    found = cache.get_many(keys.values())
+    payloads = {id: found.get(key) for id, key in keys.items()}
+    missed = [id for id, payload in payloads.items() if payload is None]
+    if len(ids) > len(missed):
+        _count("hits", len(ids) - len(missed))
+
+    if missed:
+        _count("misses", len(missed))
+        built = build(missed)
+        cache.set_many(
+            {keys[id]: payload for id, payload in built.items()},
+            CACHE_TIMEOUT,
+        )
+        payloads.update(built)
+
+    return payloads
+
+
+def cached(entity: str) -> Callable:
+    """
+    Serving the payloads of a preview view from the cache, it has to be
+    applied below api_view.
+    """
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, id):
+            return Response(
+                get(
+                    entity,
+                    id,
+                    lambda: view(request, id).data,
+                    page_part(request.query_params),
+                )
+            )
+
+        return wrapper
+
+    return decorator
+
+
+class Section(NamedTuple):
+    """
+    Table of a preview, described along the preview with its number of
+    rows and fetched apart from it a page at a time.
+    """
+
+    name: str
+    title: str
+    icon: str
+    # rows of the previewed object given its id, or a reference to it
+    rows: Callable[[Any], QuerySet]
+    # serializer class of the rows with its other arguments bound
+    serializer: Callable
+    # query plan of the serialized rows, see plans
+    plan: Callable[[QuerySet], QuerySet] | None = None
+
+
+def _count_name(section: Section) -> str:
+    return f"{section.name}_count"
+
+
+def with_counts(objects: QuerySet, sections: list[Section]) -> QuerySet:
+    """
+    Annotating the previewed objects with the number of rows of each of
+    their sections, counted within the query of the objects.
+    """
+
+    return objects.annotate(
+        **{
+            _count_name(section): Subquery(
+                section.rows(OuterRef("pk"))
+                .order_by()
+                # not an aggregate, so the rows are not grouped
+                .values(count=Func(F("pk"), function="COUNT")),
+                output_field=IntegerField(),
+            )
+            for section in sections
+        }
+    )
+
+
+def counts(obj, sections: list[Section]) -> dict[str, int]:
+    """
+    Number of rows of the sections of an object annotated by with_counts,
+    keyed by section name.
+    """
+
+    return {
+        section.name: getattr(obj, _count_name(section))
+        for section in sections
+    }
+
+
+def _in_worker(function: Callable, *args):
+    try:
+        return function(*args)
+    finally:
+        # worker threads hold their own connections
+        close_old_connections()
+
+
+async def run(function: Callable, *args):
+    """
+    Calling a blocking function from an async view on a worker thread,
+    with its own database connection. The async methods of the ORM run
+    every query of a request on one thread, so the queries given to run
+    are the ones which run at the same time.
+    """
+
+    return await asyncio.wrap_future(
+        _executor.submit(_in_worker, function, *args)
+    )
+
+
+async def acounts(sections: list[Section], id: int) -> dict[str, int]:
+    """
+    Number of rows of the sections of the given object keyed by section
+    name, every section counted at the same time.
+    """
+
+    found = await asyncio.gather(
+        *(run(section.rows(id).count) for section in sections)
+    )
+    return {section.name: count for section, count in zip(sections, found)}
+
+
+def describe(
+    sections: list[Section], counts: dict[str, int], link: str
+) -> list[dict]:
+    """
+    Descriptors of the sections of a preview.
+
+    Args:
+        sections: Sections of the preview.
+        counts: Number of rows of each section keyed by name, see counts.
+        link: Link of the preview.
+    """
+
+    return [
+        {
+            "name": section.name,
+            "title": section.title,
+            "icon": section.icon,
+            "count": counts[section.name],
+            "link": f"{link}?section={section.name}",
+        }
+        for section in sections
+    ]
+
+
+def page(params, sections: list[Section], id: int) -> dict | None:
+    """
+    Page of the section asked by the given query parameters, `section`,
+    `after` and `limit`. Rows are ordered by id and a page
+    holds the rows after the given id, so the pages of long histories
+    cost the same as the first one.
+
+    Returns:
+        Name, title, icon, serializer of the rows and the id to fetch
+        the next page after, None when there are no more rows. None when
+        no section is asked.
+
+    Raises:
+        NotFound: The section does not exist.
+        ValidationError: The id or the limit is not a number.
+    """
+
+    name = params.get("section")
+    if name is None:
+        return None
+
+    section = next((s for s in sections if s.name == name), None)
+    if section is None:
+        raise NotFound(f"section {name} not found.")
+
+    try:
+        after = int(params.get("after", 0))
+        limit = int(params.get("limit", PAGE_SIZE))
+    except ValueError:
+        raise ValidationError("after and limit have to be numbers.")
+    limit = min(max(limit, 1), MAX_PAGE_SIZE)
+
+    # ids are looked up first as some rows are values of other models
+    rows = section.rows(id)
+    ids = list(
+        rows.filter(pk__gt=after)
+        .order_by("pk")
+        .values_list("pk", flat=True)[: limit + 1]
+    )
+    rows = rows.filter(pk__in=ids[:limit]).order_by("pk")
+    if section.plan is not None:
+        rows = section.plan(rows)
+
+    return {
+        "name": section.name,
+        "title": section.title,
+        "icon": section.icon,
+        "data": section.serializer(rows, many=True),
+        "next": ids[limit - 1] if len(ids) > limit else None,
+    }
+
+
+def stats() -> dict[str, int]:
+    """
+    Hits, misses and invalidations of the cached previews since the
+    counters were last evicted.
+    """
+
+    counts = cache.get_many([f"{_CACHE_NAME}:{name}" for name in _COUNTERS])
+    stats = {
+        name: counts.get(f"{_CACHE_NAME}:{name}", 0) for name in _COUNTERS
+    }
+    requests = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = stats["hits"] / requests if requests else None
+    return stats
@@ -0,0 +1,60 @@
+from django.db.models import Count, Sum
+
+from . import jalali, models
+
+# rows, calendar join and values of each period report
+_REPORTS = {
+    "orders": (
+        models.Order.objects,
+        "order_day",
+        dict(orders=Count("pk"), cost=Sum("order_payment__cost")),
+    ),
+    "contracts": (
+        models.Contract.objects,
+        "contract_day",
+        dict(contracts=Count("pk")),
+    ),
+    "incomes": (
+        models.Payment.incomes,
+        "paid_day",
+        dict(payments=Count("pk"), amount=Sum("amount")),
+    ),
+    "outgoes": (
+        models.Payment.outgoes,
+        "paid_day",
+        dict(payments=Count("pk"), amount=Sum("amount")),
+    ),
+    "calls": (
+        models.Call.objects,
+        "called_day",
+        dict(calls=Count("pk")),
+    ),
+}
+REPORTS = list(_REPORTS)
+
+
+def period_report(
+    name: str, period: str, start: jalali.JDate, end: jalali.JDate
+) -> list[dict]:
+    """
+    Totals of a report per jalali week, month, quarter or year, grouped
+    by the database over the calendar table.
+
+    Args:
+        name: Name of the report, one of REPORTS.
+        period: Length of each period, one of ReportPeriodChoices.
+        start: First day of the report.
+        end: Last day of the report.
+
+    Returns:
+        Label, parts and totals of every period with any row, oldest
+        first.
+    """
+
+    qs, day, aggregates = _REPORTS[name]
+
+    # filtering the indexed date column, not the joined calendar
+    date_field = qs.model._meta.get_field(day).source
+    qs = qs.filter(**{f"{date_field}__range": (start, end)})
+
+    return models.JalaliDay.report(qs, day, period, **aggregates)
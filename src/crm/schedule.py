@@ -0,0 +1,302 @@
+import threading
+import time
+from typing import Iterable, NamedTuple
+
+from . import jalali, models, utils, workdays
+
+CONTRACT = "contract"
+ORDER = "order"
+
+# a week of hours is a bitset, hour h of weekday w is bit 24 * w + h and
+# saturday is weekday 0
+DAY_HOURS = (1 << 24) - 1
+WEEK_HOURS = (1 << 24 * 7) - 1
+
+
+class Booking(NamedTuple):
+    kind: str
+    id: int
+    # day numbers of jalali.to_ordinal
+    first: int
+    last: int
+    hours: int
+
+
+def shift_hours(weekdays: int, shift_start: int, shift_end: int) -> int:
+    """
+    Hours of the week taken by a shift on the given weekdays.
+
+    Args:
+        weekdays: Weekday mask, see workdays.weekday_mask.
+        shift_start: Hour the shift starts at.
+        shift_end: Hour the shift ends at, an earlier hour than the
+            start ends on the next day and the same hour lasts all day.
+    """
+
+    spill = 0
+    if shift_start < shift_end:
+        day = (1 << shift_end) - (1 << shift_start)
+    elif shift_start > shift_end:
+        day = DAY_HOURS - (1 << shift_start) + 1
+        spill = (1 << shift_end) - 1
+    else:
+        day = DAY_HOURS
+
+    hours = 0
+    for weekday in range(7):
+        if weekdays >> weekday & 1:
+            hours |= day << 24 * weekday
+            hours |= spill << 24 * ((weekday + 1) % 7)
+
+    return hours
+
+
+def day_hours(date: jalali.JDate) -> int:
+    return DAY_HOURS << 24 * date.weekday()
+
+
+def _days_hours(first: int, last: int) -> int:
+    # hours of the weekdays between the given days
+    if last - first >= 6:
+        return WEEK_HOURS
+
+    hours = 0
+    for ordinal in range(first, last + 1):
+        hours |= day_hours(jalali.from_ordinal(ordinal))
+
+    return hours
+
+
+class _Node:
+    __slots__ = ("center", "by_first", "by_last", "left", "right")
+
+
+class IntervalTree:
+    """
+    Static centered interval tree over bookings, finding the bookings
+    which overlap a period in O(log n + m) time.
+    """
+
+    def __init__(self, bookings: Iterable[Booking]) -> None:
+        self.root = self._build(list(bookings))
+
+    def _build(self, bookings: list[Booking]) -> _Node | None:
+        if not bookings:
+            return None
+
+        points = sorted(point for b in bookings for point in (b.first, b.last))
+        node = _Node()
+        node.center = points[len(points) // 2]
+
+        left, right, here = [], [], []
+        for booking in bookings:
+            if booking.last < node.center:
+                left.append(booking)
+            elif booking.first > node.center:
+                right.append(booking)
+            else:
+                here.append(booking)
+
+        node.by_first = sorted(here, key=lambda b: b.first)
+        node.by_last = sorted(here, key=lambda b: b.last, reverse=True)
+        node.left = self._build(left)
+        node.right = self._build(right)
+        return node
+
+    def overlapping(self, first: int, last: int) -> list[Booking]:
+        found = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if node is None:
+                continue
+
+            # every booking of the node holds the center
+            if last < node.center:
+                for booking in node.by_first:
+                    if booking.first > last:
+                        break
+                    found.append(booking)
+                stack.append(node.left)
+            elif first > node.center:
+                for booking in node.by_last:
+                    if booking.last < first:
+                        break
+                    found.append(booking)
+                stack.append(node.right)
+            else:
+                found.extend(node.by_first)
+                stack.extend((node.left, node.right))
+
+        return found
+
+
+def _cache_name(personnel_id: int) -> str:
+    return f"schedule:{personnel_id}"
+
+
+def invalidate(personnel_ids: Iterable[int]):
+    """
+    Dropping the indexes of the given personnel, called whenever their
+    contracts or orders change.
+    """
+
+    for personnel_id in set(personnel_ids):
+        if personnel_id is not None:
+            utils.invalidate_cache_version(_cache_name(personnel_id))
+
+
+def _bookings(personnel_id: int) -> list[Booking]:
+    bookings = []
+    for pk, start, end, *weekdays, shift_start, shift_end in (
+        models.Contract.objects.filter(personnel_id=personnel_id)
+        .order_by()
+        .values_list(
+            "pk",
+            "start",
+            "end",
+            *workdays.WEEKDAYS,
+            "shift_start",
+            "shift_end",
+        )
+    ):
+        mask = sum(1 << weekday for weekday, on in enumerate(weekdays) if on)
+        bookings.append(
+            Booking(
+                CONTRACT,
+                pk,
+                jalali.to_ordinal(start),
+                jalali.to_ordinal(end),
+                shift_hours(mask, shift_start, shift_end),
+            )
+        )
+
+    for pk, order_at in (
+        models.Order.objects.filter(assigned_personnel_id=personnel_id)
+        .order_by()
+        .values_list("pk", "order_at")
+    ):
+        day = jalali.to_ordinal(order_at)
+        bookings.append(Booking(ORDER, pk, day, day, day_hours(order_at)))
+
+    return bookings
+
+
+_indexes_lock = threading.Lock()
+# version in the shared cache, build time and index keyed by personnel
+_indexes: dict[int, tuple[int, float, IntervalTree]] = {}
+# seconds an index is used for at most, in case its version is lost
+# together with the cache
+INDEX_TIMEOUT = workdays.MEMO_TIMEOUT
+
+
+def get_index(personnel_id: int) -> IntervalTree:
+    """
+    Interval tree of the contracts and orders of the given personnel,
+    rebuilt with two queries whenever they change in any process.
+    """
+
+    version = utils.get_cache_version(_cache_name(personnel_id))
+    now = time.monotonic()
+    with _indexes_lock:
+        cached = _indexes.get(personnel_id)
+        if (
+            cached is not None
+            and cached[0] == version
+            and now - cached[1] < INDEX_TIMEOUT
+        ):
+            return cached[2]
+
+    index = IntervalTree(_bookings(personnel_id))
+    with _indexes_lock:
+        _indexes[personnel_id] = (version, now, index)
+
+    return index
+
+
+def conflicts(
+    personnel_id: int,
+    start: jalali.JDate,
+    end: jalali.JDate,
+    hours: int = WEEK_HOURS,
+    kinds: Iterable[str] = (CONTRACT, ORDER),
+    exclude: tuple[str, int] | None = None,
+) -> list[Booking]:
+    """
+    Bookings of the personnel which take some of the given hours within
+    the given period.
+
+    Args:
+        personnel_id: The personnel to look up.
+        start: First day of the period.
+        end: Last day of the period.
+        hours: Hours of the week within the period, see shift_hours.
+        kinds: Kinds of bookings to look up.
+        exclude: Kind and id of a booking to skip, the one being edited.
+
+    Returns:
+        Conflicting bookings ordered by their first day.
+    """
+
+    first, last = jalali.to_ordinal(start), jalali.to_ordinal(end)
+    found = []
+    for booking in get_index(personnel_id).overlapping(first, last):
+        if booking.kind not in kinds or (booking.kind, booking.id) == exclude:
+            continue
+
+        # only weekdays of the days both periods share can collide
+        shared = _days_hours(
+            max(first, booking.first), min(last, booking.last)
+        )
+        if booking.hours & hours & shared:
+            found.append(booking)
+
+    return sorted(found, key=lambda booking: (booking.first, booking.id))
+
+
+def is_free(
+    personnel_id: int,
+    start: jalali.JDate,
+    end: jalali.JDate,
+    hours: int = WEEK_HOURS,
+) -> bool:
+    """
+    Whether the personnel has no booking within the given hours of the
+    period, see conflicts.
+    """
+
+    return not conflicts(personnel_id, start, end, hours)
+
+
+def contract_conflicts(contract: models.Contract) -> list[Booking]:
+    """
+    Contracts and orders of the contract personnel colliding with its
+    shifts.
+    """
+
+    return conflicts(
+        contract.personnel_id,
+        contract.start,
+        contract.end,
+        shift_hours(
+            workdays.weekday_mask(contract),
+            contract.shift_start,
+            contract.shift_end,
+        ),
+        exclude=(CONTRACT, contract.pk),
+    )
+
+
+def order_conflicts(order: models.Order) -> list[Booking]:
+    """
+    Contracts of the order personnel with a shift on the order day. Orders
+    have no hours, so orders of the same day do not collide.
+    """
+
+    return conflicts(
+        order.assigned_personnel_id,
+        order.order_at,
+        order.order_at,
+        day_hours(order.order_at),
+        kinds=(CONTRACT,),
+    )
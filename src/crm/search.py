@@ -0,0 +1,462 @@
+import asyncio
+import re
+import time
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ThreadPoolExecutor,
+    wait,
+)
+from typing import Iterable, NamedTuple, Optional
+
+from django.db import OperationalError, close_old_connections, connection
+from django.db.models import QuerySet
+
+from . import models, utils
+from .models import SearchEntityChoices as sec
+
+_TOKEN_RE = re.compile(r"\w+")
+_SQLITE_FTS_TABLE = "crm_searchdocument_fts"
+
+SECTION_BUDGET = 0.5
+# searches whose sections all run at once, each worker holds a database
+# connection. Sections of later searches wait for a worker, see _Sections.
+CONCURRENT_SEARCHES = 4
+_executor = ThreadPoolExecutor(
+    max_workers=len(sec.values) * CONCURRENT_SEARCHES,
+    thread_name_prefix="search",
+)
+
+
+def tokenize(*texts) -> list[str]:
+    """
+    Splitting normalized texts into the word tokens stored in search
+    documents, both full-text backends then index exactly the same terms
+    and queries match whatever spelling of persian letters was used.
+    """
+
+    return _TOKEN_RE.findall(
+        utils.normalize_persian(" ".join(str(text) for text in texts if text))
+    )
+
+
+class Indexer:
+    """
+    Builds the search documents of an entity, subclasses declare the
+    queryset and how to turn an object into its title, link and texts.
+    """
+
+    entity = ""
+
+    def get_queryset(self) -> QuerySet:
+        raise NotImplementedError
+
+    def get_title(self, obj) -> str:
+        return obj.__str__()
+
+    def get_link(self, obj) -> str:
+        return obj.get_absolute_url_api()
+
+    def get_texts(self, obj) -> list:
+        raise NotImplementedError
+
+    def build(self, obj) -> models.SearchDocument:
+        title = self.get_title(obj)[:250]
+        return models.SearchDocument(
+            entity=self.entity,
+            object_id=obj.pk,
+            title=title,
+            link=self.get_link(obj) or "",
+            document=" ".join(tokenize(title, *self.get_texts(obj))),
+        )
+
+
+def _names(*people: Optional[models.People]) -> list[str]:
+    return [person.full_name for person in people if person is not None]
+
+
+class PeopleIndexer(Indexer):
+    entity = sec.PEOPLE
+
+    def get_queryset(self) -> QuerySet:
+        return models.People.objects.prefetch_related("types", "details")
+
+    def get_title(self, obj: models.People) -> str:
+        return obj.fullname_with_prefix
+
+    def get_link(self, obj: models.People) -> str:
+        try:
+            return obj.get_absolute_url_api()
+        except IndexError:
+            # people without any type do not have a preview
+            return ""
+
+    def get_texts(self, obj: models.People) -> list:
+        details = [
+            detail.value
+            for detail in obj.details.all()
+            if detail.is_active
+            and detail.detail_type
+            != models.PeopleDetailTypeChoices.CARD_NUMBER
+        ]
+        return [obj.national_code, *details, obj.note]
+
+
+class ServiceIndexer(Indexer):
+    entity = sec.SERVICE
+
+    def get_queryset(self) -> QuerySet:
+        return models.Service.objects.all()
+
+    def get_texts(self, obj: models.Service) -> list:
+        return []
+
+
+class OrderIndexer(Indexer):
+    entity = sec.ORDER
+
+    def get_queryset(self) -> QuerySet:
+        return models.Order.objects.select_related(
+            "client",
+            "assigned_personnel",
+            "referral_people",
+            "referral_other",
+        ).prefetch_related("services")
+
+    def get_title(self, obj: models.Order) -> str:
+        return f"{obj} {obj.client.full_name}"
+
+    def get_texts(self, obj: models.Order) -> list:
+        return [
+            obj.pk,
+            obj.order_at,
+            *_names(obj.assigned_personnel, obj.referral_people),
+            obj.referral_other,
+            *(service.title for service in obj.services.all()),
+        ]
+
+
+class ContractIndexer(Indexer):
+    entity = sec.CONTRACT
+
+    def get_queryset(self) -> QuerySet:
+        return models.Contract.objects.select_related(
+            "client",
+            "personnel",
+            "referral_people",
+            "referral_other",
+        ).prefetch_related("patients")
+
+    def get_title(self, obj: models.Contract) -> str:
+        return f"{obj} {obj.client.full_name}"
+
+    def get_texts(self, obj: models.Contract) -> list:
+        return [
+            obj.pk,
+            obj.contract_at,
+            *_names(obj.personnel, obj.referral_people),
+            *_names(*obj.patients.all()),
+            obj.referral_other,
+        ]
+
+
+class PaymentIndexer(Indexer):
+    entity = sec.PAYMENT
+
+    def get_queryset(self) -> QuerySet:
+        return models.Payment.objects.select_related(
+            "source", "destination", "order", "contract"
+        )
+
+    def get_title(self, obj: models.Payment) -> str:
+        people = obj.source or obj.destination
+        title = f"پرداختی {obj.amount}"
+        return f"{title} {people.full_name}" if people else title
+
+    def get_link(self, obj: models.Payment) -> str:
+        reason = obj.payment_for
+        return reason.get_absolute_url_api() if reason else ""
+
+    def get_texts(self, obj: models.Payment) -> list:
+        return [
+            obj.paid_at,
+            *_names(obj.source, obj.destination),
+            obj.payment_for,
+            obj.note,
+        ]
+
+
+INDEXERS: dict[str, Indexer] = {
+    indexer.entity: indexer
+    for indexer in (
+        PeopleIndexer(),
+        ServiceIndexer(),
+        OrderIndexer(),
+        ContractIndexer(),
+        PaymentIndexer(),
+    )
+}
+
+
+def index(entity: str, ids: Iterable[int]) -> int:
+    """
+    Rebuilding the search documents of the given objects, documents of
+    objects which do not exist anymore are removed.
+
+    Returns:
+        Number of indexed objects.
+    """
+
+    ids = {pk for pk in ids if pk is not None}
+    if not ids:
+        return 0
+
+    indexer = INDEXERS[entity]
+    documents = [
+        indexer.build(obj) for obj in indexer.get_queryset().filter(pk__in=ids)
+    ]
+    models.SearchDocument.objects.bulk_create(
+        documents,
+        update_conflicts=True,
+        unique_fields=["entity", "object_id"],
+        update_fields=["title", "link", "document", "updated_at"],
+    )
+
+    indexed = {document.object_id for document in documents}
+    models.SearchDocument.objects.filter(
+        entity=entity, object_id__in=ids - indexed
+    ).delete()
+
+    return len(documents)
+
+
+def remove(entity: str, ids: Iterable[int]):
+    models.SearchDocument.objects.filter(
+        entity=entity, object_id__in=list(ids)
+    ).delete()
+
+
+def query(
+    q: str,
+    entity: Optional[str] = None,
+    limit: int = 20,
+    offset: int = 0,
+) -> list[models.SearchDocument]:
+    """
+    Looking the given text up in the search index, every word of the
+    query has to prefix a word of the document.
+
+    Args:
+        q: Text typed by the user.
+        entity: Only return documents of this entity.
+        limit: Maximum number of returned documents.
+        offset: Number of best ranked documents to skip.
+
+    Returns:
+        Search documents ordered by their rank, best first.
+    """
+
+    terms = tokenize(q)
+    if not terms:
+        return []
+
+    vendor = connection.vendor
+    if vendor == "postgresql":
+        return _postgres_query(terms, entity, limit, offset)
+    if vendor == "sqlite":
+        return _sqlite_query(terms, entity, limit, offset)
+
+    # backends without a full-text index, every term still has to match
+    documents = models.SearchDocument.objects.all()
+    for term in terms:
+        documents = documents.filter(document__icontains=term)
+    if entity:
+        documents = documents.filter(entity=entity)
+
+    return list(documents.order_by("-updated_at")[offset : offset + limit])
+
+
+def _postgres_query(terms, entity, limit, offset):
+    # the expression must match the GIN index of the migration
+    vector = "to_tsvector('simple', document)"
+    entity_filter = "AND entity = %s" if entity else ""
+    params = [" & ".join(f"{term}:*" for term in terms)]
+    params += [entity] if entity else []
+
+    return list(
+        models.SearchDocument.objects.raw(
+            f"SELECT id, entity, object_id, title, link, "
+            f"ts_rank({vector}, query) AS rank "
+            f"FROM crm_searchdocument, to_tsquery('simple', %s) query "
+            f"WHERE {vector} @@ query {entity_filter} "
+            "ORDER BY rank DESC, id DESC LIMIT %s OFFSET %s",
+            [*params, limit, offset],
+        )
+    )
+
+
+def _sqlite_query(terms, entity, limit, offset):
+    entity_filter = "AND document.entity = %s" if entity else ""
+    params = [" ".join(f'"{term}"*' for term in terms)]
+    params += [entity] if entity else []
+
+    return list(
+        models.SearchDocument.objects.raw(
+            "SELECT document.id, document.entity, document.object_id, "
+            "document.title, document.link, "
+            f"bm25({_SQLITE_FTS_TABLE}) AS rank "
+            f"FROM {_SQLITE_FTS_TABLE} JOIN crm_searchdocument document "
+            f"ON document.id = {_SQLITE_FTS_TABLE}.rowid "
+            f"WHERE {_SQLITE_FTS_TABLE} MATCH %s {entity_filter} "
+            "ORDER BY rank, document.id DESC LIMIT %s OFFSET %s",
+            [*params, limit, offset],
+        )
+    )
+
+
+class Section(NamedTuple):
+    entity: str
+    documents: list[models.SearchDocument]
+    has_next: bool
+    elapsed: float
+    timed_out: bool
+
+
+def _query_section(q: str, entity: str, limit: int, budget: float) -> Section:
+    start = time.perf_counter()
+    try:
+        with utils.statement_timeout(budget):
+            documents = query(q, entity, limit=limit + 1)
+        timed_out = False
+    except OperationalError:
+        documents, timed_out = [], True
+    finally:
+        # worker threads hold their own connections
+        close_old_connections()
+
+    return Section(
+        entity,
+        documents[:limit],
+        len(documents) > limit,
+        time.perf_counter() - start,
+        timed_out,
+    )
+
+
+class _Sections:
+    """
+    Sections of a search submitted to the workers. The budget of each
+    section starts when a worker picks it up, sections still waiting for
+    a worker after a whole budget are given up.
+    """
+
+    def __init__(
+        self, q: str, entities: Iterable[str], limit: int, budget: float
+    ) -> None:
+        self.budget = budget
+        self.submitted = time.monotonic()
+        self.started: dict[str, float] = {}
+        self.futures: dict[str, Future] = {
+            entity: _executor.submit(self._run, q, entity, limit)
+            for entity in entities
+        }
+
+    def _run(self, q: str, entity: str, limit: int) -> Section:
+        self.started[entity] = time.monotonic()
+        return _query_section(q, entity, limit, self.budget)
+
+    def pending(self) -> list[Future]:
+        return [
+            future for future in self.futures.values() if not future.done()
+        ]
+
+    def timeout(self) -> float | None:
+        """
+        Seconds until the next pending section runs out of time, None
+        when no section is worth waiting for anymore.
+        """
+
+        now = time.monotonic()
+        deadlines = []
+        for entity, future in self.futures.items():
+            if future.done():
+                continue
+
+            started = self.started.get(entity)
+            if started is None:
+                if now < self.submitted + self.budget:
+                    deadlines.append(self.submitted + self.budget)
+                    continue
+
+                if future.cancel():
+                    continue
+
+                # picked up by a worker in the meantime
+                started = self.started.get(entity, now)
+
+            if now < started + self.budget:
+                deadlines.append(started + self.budget)
+
+        return min(deadlines) - now if deadlines else None
+
+    def sections(self) -> list[Section]:
+        return [
+            future.result()
+            if future.done() and not future.cancelled()
+            else Section(entity, [], False, self.budget, True)
+            for entity, future in self.futures.items()
+        ]
+
+
+def query_sections(
+    q: str,
+    entities: Iterable[str] = sec.values,
+    limit: int = 5,
+    budget: float = SECTION_BUDGET,
+) -> list[Section]:
+    """
+    Looking the given text up in every entity at the same time, each
+    entity on its own worker thread and database connection.
+
+    Args:
+        q: Text typed by the user.
+        entities: Entities to look into, in the order of the sections.
+        limit: Maximum number of documents of each entity.
+        budget: Seconds every section may take from when a worker picks
+            it up, sections which are not done by then or wait for a
+            worker longer than that are returned empty and marked as
+            timed out.
+
+    Returns:
+        One section per entity.
+    """
+
+    sections = _Sections(q, entities, limit, budget)
+    while (timeout := sections.timeout()) is not None:
+        wait(sections.pending(), timeout, FIRST_COMPLETED)
+
+    return sections.sections()
+
+
+async def aquery_sections(
+    q: str,
+    entities: Iterable[str] = sec.values,
+    limit: int = 5,
+    budget: float = SECTION_BUDGET,
+) -> list[Section]:
+    """
+    query_sections for async views, waiting for the sections without
+    blocking the event loop.
+    """
+
+    sections = _Sections(q, entities, limit, budget)
+    while (timeout := sections.timeout()) is not None:
+        pending = sections.pending()
+        if pending:
+            await asyncio.wait(
+                [asyncio.wrap_future(future) for future in pending],
+                timeout=timeout,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+
+    return sections.sections()
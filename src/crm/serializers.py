@@ -1,8 +1,8 @@
-import jdatetime
 from django.db import transaction
 from django.db.utils import IntegrityError
 from rest_framework import serializers
 
+from . import jalali
 from . import models as m
 from . import serializer_validators as sv
 from . import utils
@@ -84,6 +84,23 @@ class SeperatedCharField(serializers.CharField):
         return utils.seperate_numbers(self.threshold, value)
 
 
+class JDateSerializerField(serializers.Field):
+    """
+    Jalali date exchanged as a string like 1402/05/06.
+    """
+
+    default_error_messages = {"invalid": "invalid date."}
+
+    def to_representation(self, value):
+        return str(utils.parse_jdate(value))
+
+    def to_internal_value(self, data):
+        try:
+            return utils.parse_jdate(data)
+        except (TypeError, ValueError):
+            self.fail("invalid")
+
+
 class IntListField(serializers.ListField):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -137,17 +154,17 @@ class PeopleSerializer(DynamicFieldSerializer):
 
         super().__init__(*args, **kwargs, fields=common_fields)
 
-    joined_at = serializers.CharField()
+    joined_at = JDateSerializerField()
     national_code = serializers.CharField()
     membership_period = serializers.SerializerMethodField()
     fullname_with_prefix = serializers.CharField()
     people_type = serializers.CharField(source="get_people_type_display")
     gender_type = serializers.CharField(source="get_gender_display")
-    birthdate = serializers.CharField()
+    birthdate = JDateSerializerField()
     age = serializers.IntegerField()
     specifications = SpecificationSerializer(many=True)
-    contract_date = serializers.CharField()
-    end_contract_date = serializers.CharField()
+    contract_date = JDateSerializerField()
+    end_contract_date = JDateSerializerField()
     total_client_orders = serializers.IntegerField()
     total_client_contracts = serializers.IntegerField()
     total_client_debt = SeperatedCharField(threshold=3)
@@ -179,8 +196,7 @@ class PeopleSerializer(DynamicFieldSerializer):
     }
 
     def get_membership_period(self, obj):
-        date_obj = utils.create_jdate_from_str(obj.joined_at)
-        return utils.membership_from_verbose(date_obj, jdatetime.date.today())
+        return utils.membership_from_verbose(obj.joined_at, jalali.today())
 
 
 class PeopleMinimalSerializer(serializers.Serializer):
@@ -195,7 +211,7 @@ class ReferralOtherSerializer(TranslatedSerializer):
 
 
 class OrderSerializer(DynamicFieldSerializer):
-    order_at = serializers.CharField()
+    order_at = JDateSerializerField()
     title = serializers.CharField(source="__str__")
     client = PeopleMinimalSerializer()
     services = serializers.CharField(source="services_list")
@@ -210,7 +226,8 @@ class OrderSerializer(DynamicFieldSerializer):
     total_cost = SeperatedCharField(threshold=3)
     total_franchise = SeperatedCharField(threshold=3)
     discount = SeperatedCharField(threshold=3)
-    service_cost = serializers.SerializerMethodField()
+    # annotated by plans.service_orders
+    service_cost = SeperatedCharField(threshold=3)
     link = serializers.CharField(source="get_absolute_url_api")
 
     translated_fields = {
@@ -235,19 +252,9 @@ class OrderSerializer(DynamicFieldSerializer):
     def to_representation(self, instance):
         return super().to_representation(instance, exclude=["link"])
 
-    def get_service_cost(self, obj: m.Order):
-        assert self.context.get(
-            "service"
-        ), "you forget to pass the service in context."
-
-        service = self.context["service"]
-        obj_service = obj.orderservices_set.get(service=service)
-
-        return utils.seperate_numbers(3, str(obj_service.cost))
-
 
 class ContractSerializer(DynamicFieldSerializer):
-    contract_at = serializers.CharField()
+    contract_at = JDateSerializerField()
     client = PeopleMinimalSerializer()
     care_for = serializers.CharField(source="get_care_for_display")
     patients = serializers.CharField(source="all_patients")
@@ -260,9 +267,9 @@ class ContractSerializer(DynamicFieldSerializer):
     shift_days = serializers.SerializerMethodField()
     shift_start = serializers.IntegerField()
     shift_end = serializers.IntegerField()
-    start = serializers.CharField()
+    start = JDateSerializerField()
     start_hour = serializers.CharField()
-    end = serializers.CharField()
+    end = JDateSerializerField()
     end_hour = serializers.CharField()
     end_verbose = serializers.SerializerMethodField()
     include_holidays = PersianBooleanField()
@@ -327,12 +334,11 @@ class ContractSerializer(DynamicFieldSerializer):
         return ", ".join(shift_days)
 
     def get_end_verbose(self, obj):
-        date_obj = utils.create_jdate_from_str(obj.end)
-        return utils.contract_end_verbose(jdatetime.date.today(), date_obj)
+        return utils.contract_end_verbose(jalali.today(), obj.end)
 
 
 class PaymentSerializer(DynamicFieldSerializer):
-    paid_at = serializers.CharField()
+    paid_at = JDateSerializerField()
     source = PeopleSerializer()
     destination = PeopleSerializer()
     payment_type = serializers.SerializerMethodField()
@@ -372,21 +378,31 @@ class ButtonSerializer(serializers.Serializer):
 
 
 class DataTableSerializer(serializers.Serializer):
+    name = serializers.CharField(max_length=250)
     title = serializers.CharField(max_length=250)
     icon = serializers.CharField(max_length=250)
     data = serializers.SerializerMethodField()
+    next = serializers.IntegerField(allow_null=True)
 
     def get_data(self, obj):
         return obj["data"].data
 
 
+class SectionSerializer(serializers.Serializer):
+    name = serializers.CharField(max_length=250)
+    title = serializers.CharField(max_length=250)
+    icon = serializers.CharField(max_length=250)
+    count = serializers.IntegerField()
+    link = serializers.CharField(max_length=250)
+
+
 class PreviewSerializer(serializers.Serializer):
     title = serializers.CharField(max_length=250)
     icon = serializers.CharField(max_length=250)
     description = serializers.CharField(max_length=250)
     buttons = ButtonSerializer(many=True, required=False)
     table = serializers.SerializerMethodField()
-    data_tables = DataTableSerializer(many=True)
+    sections = SectionSerializer(many=True)
 
     def get_table(self, obj):
         return obj["table"].data
@@ -404,7 +420,7 @@ class OrderServiceSerializer(DynamicFieldSerializer):
 
 
 class CallSerializer(DynamicFieldSerializer):
-    called_at = serializers.CharField()
+    called_at = JDateSerializerField()
     reason = serializers.SerializerMethodField()
     call_direction = serializers.CharField(source="get_call_direction_display")
     from_number = serializers.CharField()
@@ -585,6 +601,11 @@ class FormSerializer(serializers.ModelSerializer):
     numbers = PhoneNumberSerializer(many=True)
     skills = CatalogSerializer(many=True)
 
+    serializer_field_mapping = {
+        **serializers.ModelSerializer.serializer_field_mapping,
+        m.JDateField: JDateSerializerField,
+    }
+
     class Meta:
         model = m.People
         fields = [
@@ -609,19 +630,17 @@ class FormSerializer(serializers.ModelSerializer):
 
 class CreatePersonSerializer(serializers.Serializer):
     person_id = serializers.CharField(required=False)
-    joined_at = serializers.CharField(validators=[sv.date])
+    joined_at = JDateSerializerField()
     national_code = serializers.CharField(validators=[sv.national_code])
     firstname = serializers.CharField()
     lastname = serializers.CharField()
     gender = serializers.CharField(validators=[sv.gender])
-    birthdate = serializers.CharField(validators=[sv.date])
+    birthdate = JDateSerializerField()
     note = serializers.CharField(max_length=255, required=False)
     types = serializers.ListField()
 
-    contract_date = serializers.CharField(validators=[sv.date], required=False)
-    end_contract_date = serializers.CharField(
-        validators=[sv.date], required=False
-    )
+    contract_date = JDateSerializerField(required=False)
+    end_contract_date = JDateSerializerField(required=False)
     numbers = PhoneNumberSerializer(many=True)
     card_number = CardNumberSerializer(required=False)
     addresses = AddressSerializer(many=True, required=False)
@@ -775,3 +794,37 @@ class CreatePersonSerializer(serializers.Serializer):
             pass
 
         return person
+
+
+class PayrollItemSerializer(serializers.ModelSerializer):
+    personnel_name = serializers.CharField(
+        source="personnel.fullname_with_prefix"
+    )
+
+    class Meta:
+        model = m.PayrollItem
+        fields = [
+            "personnel",
+            "personnel_name",
+            "contracts",
+            "shift_days",
+            "salary",
+            "orders",
+            "order_fees",
+            "paid",
+            "amount",
+            "payment",
+        ]
+
+
+class PayrollBatchSerializer(serializers.ModelSerializer):
+    status = serializers.CharField(source="get_status_display")
+    items = PayrollItemSerializer(many=True)
+    total = serializers.SerializerMethodField()
+
+    class Meta:
+        model = m.PayrollBatch
+        fields = ["year", "month", "status", "posted_at", "total", "items"]
+
+    def get_total(self, obj):
+        return sum(item.amount for item in obj.items.all())
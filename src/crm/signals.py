@@ -0,0 +1,710 @@
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_save,
+)
+from django.dispatch import receiver
+
+from . import models as m
+from . import dashboard, fuzzy, matching, previews, schedule, search
+from . import typeahead, visits, workdays
+from .models import SearchEntityChoices as sec
+
+# fields whose stored values are remembered before saving, so receivers
+# can also refresh the rows an instance pointed to before being changed.
+_REMEMBERED_FIELDS = {
+    m.Order: [
+        "client_id",
+        "assigned_personnel_id",
+        "referral_people_id",
+        "order_at",
+    ],
+    m.OrderServices: ["order_id"],
+    m.Contract: [
+        "client_id",
+        "personnel_id",
+        "referral_people_id",
+        "contract_at",
+    ],
+    m.Payment: [
+        "source_id",
+        "destination_id",
+        "order_id",
+        "contract_id",
+        "paid_at",
+    ],
+    m.PeopleRole: ["people_id"],
+    m.Specification: ["people_id"],
+    m.ServiceLocation: ["people_id"],
+    m.PeopleType: ["people_id"],
+    m.Service: ["healthcare_franchise"],
+    m.People: ["firstname", "lastname", "gender", "joined_at"],
+    m.Call: [
+        "from_people_id",
+        "to_people_id",
+        "order_id",
+        "contract_id",
+        "called_at",
+    ],
+    m.PeopleDetailedInfo: ["people_id"],
+    m.Holiday: ["date"],
+    m.Visit: ["personnel_id", "date"],
+}
+
+
+def _previous(instance, field: str):
+    return getattr(instance, "_previous_values", {}).get(field)
+
+
+def _order_people(order_ids) -> set:
+    people = set()
+    for client_id, personnel_id in m.Order.objects.filter(
+        pk__in=order_ids
+    ).values_list("client_id", "assigned_personnel_id"):
+        people.update((client_id, personnel_id))
+
+    return people
+
+
+@receiver(pre_save)
+def remember_previous_values(sender, instance, raw=False, **kwargs):
+    fields = _REMEMBERED_FIELDS.get(sender)
+    if fields is None or raw or instance.pk is None:
+        return
+
+    instance._previous_values = (
+        sender.objects.filter(pk=instance.pk).values(*fields).first() or {}
+    )
+
+
+# order payments
+
+
+def _refresh_order_payments(order_ids):
+    """
+    Refreshing order payments once the current transaction is committed,
+    then the summaries of the people of those orders, since their
+    balances are read from order payments.
+    """
+
+    order_ids = {pk for pk in order_ids if pk is not None}
+
+    def refresh():
+        m.OrderPayment.refresh(order_ids)
+        m.PeopleSummary.refresh(_order_people(order_ids))
+
+    transaction.on_commit(refresh)
+
+
+@receiver(post_save, sender=m.Order)
+def refresh_order_payment(sender, instance: m.Order, **kwargs):
+    # new orders get their row here, existing ones may have a new discount
+    _refresh_order_payments([instance.pk])
+
+
+@receiver(post_save, sender=m.OrderServices)
+@receiver(post_delete, sender=m.OrderServices)
+def refresh_order_services_payment(
+    sender, instance: m.OrderServices, **kwargs
+):
+    _refresh_order_payments(
+        [instance.order_id, _previous(instance, "order_id")]
+    )
+
+
+@receiver(post_save, sender=m.Payment)
+@receiver(post_delete, sender=m.Payment)
+def refresh_payment_order_payment(sender, instance: m.Payment, **kwargs):
+    _refresh_order_payments(
+        [instance.order_id, _previous(instance, "order_id")]
+    )
+
+
+@receiver(post_save, sender=m.Service)
+def refresh_service_order_payments(sender, instance: m.Service, **kwargs):
+    previous = getattr(instance, "_previous_values", None)
+    if not previous or (
+        previous["healthcare_franchise"] == instance.healthcare_franchise
+    ):
+        return
+
+    _refresh_order_payments(
+        m.OrderServices.objects.filter(service=instance).values_list(
+            "order_id", flat=True
+        )
+    )
+
+
+# people summary
+
+
+def _refresh_summaries(people_ids):
+    """
+    Refreshing summaries once the current transaction is committed, so
+    cascading deletes do not write summaries of people being removed.
+    """
+
+    people_ids = set(people_ids)
+    transaction.on_commit(lambda: m.PeopleSummary.refresh(people_ids))
+
+
+@receiver(post_save, sender=m.People)
+def create_people_summary(sender, instance, created, **kwargs):
+    if created:
+        _refresh_summaries([instance.pk])
+
+
+@receiver(post_save, sender=m.Order)
+@receiver(post_delete, sender=m.Order)
+def refresh_order_people_summary(sender, instance: m.Order, **kwargs):
+    _refresh_summaries(
+        [
+            instance.client_id,
+            instance.assigned_personnel_id,
+            _previous(instance, "client_id"),
+            _previous(instance, "assigned_personnel_id"),
+        ]
+    )
+
+
+@receiver(post_save, sender=m.Contract)
+@receiver(post_delete, sender=m.Contract)
+def refresh_contract_people_summary(sender, instance: m.Contract, **kwargs):
+    _refresh_summaries(
+        [
+            instance.client_id,
+            instance.personnel_id,
+            _previous(instance, "client_id"),
+            _previous(instance, "personnel_id"),
+        ]
+    )
+
+
+@receiver(post_save, sender=m.Payment)
+@receiver(post_delete, sender=m.Payment)
+def refresh_payment_people_summary(sender, instance: m.Payment, **kwargs):
+    # people of the paid orders are refreshed along with order payments
+    _refresh_summaries(
+        [
+            instance.source_id,
+            instance.destination_id,
+            _previous(instance, "source_id"),
+            _previous(instance, "destination_id"),
+        ]
+    )
+
+
+@receiver(post_save, sender=m.PeopleRole)
+@receiver(post_delete, sender=m.PeopleRole)
+def refresh_role_people_summary(sender, instance: m.PeopleRole, **kwargs):
+    _refresh_summaries([instance.people_id, _previous(instance, "people_id")])
+
+
+@receiver(m2m_changed, sender=m.People.roles.through)
+def refresh_roles_people_summary(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+
+    if not reverse:
+        _refresh_summaries([instance.pk])
+    elif pk_set:
+        _refresh_summaries(pk_set)
+    else:
+        # reverse clear, the removed people are not known anymore.
+        _refresh_summaries(
+            m.PeopleSummary.objects.exclude(display_roles="").values_list(
+                "pk", flat=True
+            )
+        )
+
+
+@receiver(post_save, sender=m.Catalog)
+def refresh_catalog_people_summary(sender, instance: m.Catalog, **kwargs):
+    _refresh_summaries(
+        m.PeopleRole.objects.filter(catalog=instance).values_list(
+            "people_id", flat=True
+        )
+    )
+
+
+# search index
+
+
+def _reindex(entity: str, ids):
+    ids = {pk for pk in ids if pk is not None}
+    if ids:
+        transaction.on_commit(lambda: search.index(entity, ids))
+
+
+def _reindex_people_relations(people_id):
+    orders = m.Order.objects.filter(
+        Q(client_id=people_id)
+        | Q(assigned_personnel_id=people_id)
+        | Q(referral_people_id=people_id)
+    )
+    contracts = m.Contract.objects.filter(
+        Q(client_id=people_id)
+        | Q(personnel_id=people_id)
+        | Q(referral_people_id=people_id)
+        | Q(patients=people_id)
+    )
+    payments = m.Payment.objects.filter(
+        Q(source_id=people_id) | Q(destination_id=people_id)
+    )
+
+    _reindex(sec.ORDER, orders.values_list("pk", flat=True))
+    _reindex(sec.CONTRACT, contracts.values_list("pk", flat=True))
+    _reindex(sec.PAYMENT, payments.values_list("pk", flat=True))
+
+
+@receiver(post_save, sender=m.People)
+def index_people(sender, instance: m.People, created, **kwargs):
+    _reindex(sec.PEOPLE, [instance.pk])
+
+    previous = getattr(instance, "_previous_values", None)
+    if created or not previous:
+        return
+
+    # orders, contracts and payments are found by the names of their people
+    if any(
+        previous[field] != getattr(instance, field)
+        for field in ("firstname", "lastname", "gender")
+    ):
+        _reindex_people_relations(instance.pk)
+
+
+@receiver(post_save, sender=m.PeopleDetailedInfo)
+@receiver(post_delete, sender=m.PeopleDetailedInfo)
+def index_people_details(sender, instance: m.PeopleDetailedInfo, **kwargs):
+    _reindex(sec.PEOPLE, [instance.people_id])
+
+
+@receiver(m2m_changed, sender=m.People.types.through)
+def index_people_types(sender, instance, action, reverse, pk_set, **kwargs):
+    # the preview link of a person depends on their types
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+
+    if not reverse:
+        _reindex(sec.PEOPLE, [instance.pk])
+    else:
+        _reindex(sec.PEOPLE, pk_set or [])
+
+
+@receiver(post_save, sender=m.Service)
+def index_service(sender, instance: m.Service, **kwargs):
+    _reindex(sec.SERVICE, [instance.pk])
+    _reindex(
+        sec.ORDER,
+        m.OrderServices.objects.filter(service=instance).values_list(
+            "order_id", flat=True
+        ),
+    )
+
+
+@receiver(post_save, sender=m.Referral)
+def index_referral(sender, instance: m.Referral, **kwargs):
+    _reindex(
+        sec.ORDER,
+        m.Order.objects.filter(referral_other=instance).values_list(
+            "pk", flat=True
+        ),
+    )
+    _reindex(
+        sec.CONTRACT,
+        m.Contract.objects.filter(referral_other=instance).values_list(
+            "pk", flat=True
+        ),
+    )
+
+
+@receiver(post_save, sender=m.Order)
+def index_order(sender, instance: m.Order, **kwargs):
+    _reindex(sec.ORDER, [instance.pk])
+
+
+@receiver(post_save, sender=m.OrderServices)
+@receiver(post_delete, sender=m.OrderServices)
+def index_order_services(sender, instance: m.OrderServices, **kwargs):
+    _reindex(sec.ORDER, [instance.order_id])
+
+
+@receiver(post_save, sender=m.Contract)
+def index_contract(sender, instance: m.Contract, **kwargs):
+    _reindex(sec.CONTRACT, [instance.pk])
+
+
+@receiver(m2m_changed, sender=m.Contract.patients.through)
+def index_contract_patients(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+
+    if not reverse:
+        _reindex(sec.CONTRACT, [instance.pk])
+    else:
+        _reindex(sec.CONTRACT, pk_set or [])
+
+
+@receiver(post_save, sender=m.Payment)
+def index_payment(sender, instance: m.Payment, **kwargs):
+    _reindex(sec.PAYMENT, [instance.pk])
+
+
+@receiver(post_delete, sender=m.People)
+@receiver(post_delete, sender=m.Service)
+@receiver(post_delete, sender=m.Order)
+@receiver(post_delete, sender=m.Contract)
+@receiver(post_delete, sender=m.Payment)
+def remove_search_document(sender, instance, **kwargs):
+    entity = {
+        m.People: sec.PEOPLE,
+        m.Service: sec.SERVICE,
+        m.Order: sec.ORDER,
+        m.Contract: sec.CONTRACT,
+        m.Payment: sec.PAYMENT,
+    }[sender]
+    search.remove(entity, [instance.pk])
+
+
+# typeahead
+
+
+@receiver(post_save, sender=m.People)
+@receiver(post_delete, sender=m.People)
+@receiver(post_save, sender=m.Service)
+@receiver(post_delete, sender=m.Service)
+@receiver(post_save, sender=m.Catalog)
+@receiver(post_delete, sender=m.Catalog)
+def invalidate_typeahead(sender, **kwargs):
+    transaction.on_commit(typeahead.invalidate)
+
+
+@receiver(m2m_changed, sender=m.People.types.through)
+def invalidate_typeahead_links(sender, action, **kwargs):
+    # the preview link of a person depends on their types
+    if action in ("post_add", "post_remove", "post_clear"):
+        transaction.on_commit(typeahead.invalidate)
+
+
+# similar names
+
+
+@receiver(post_save, sender=m.People)
+@receiver(post_delete, sender=m.People)
+@receiver(post_save, sender=m.Referral)
+@receiver(post_delete, sender=m.Referral)
+def invalidate_similar_names(sender, **kwargs):
+    transaction.on_commit(fuzzy.invalidate)
+
+
+# dashboard
+
+
+@receiver(post_save, sender=m.People)
+@receiver(post_delete, sender=m.People)
+@receiver(post_save, sender=m.Call)
+@receiver(post_delete, sender=m.Call)
+@receiver(post_save, sender=m.Order)
+@receiver(post_delete, sender=m.Order)
+@receiver(post_save, sender=m.Contract)
+@receiver(post_delete, sender=m.Contract)
+@receiver(post_save, sender=m.Payment)
+@receiver(post_delete, sender=m.Payment)
+def invalidate_dashboard(sender, **kwargs):
+    transaction.on_commit(dashboard.invalidate)
+
+
+@receiver(m2m_changed, sender=m.People.types.through)
+def invalidate_dashboard_clients(sender, action, **kwargs):
+    # new clients are counted by their type
+    if action in ("post_add", "post_remove", "post_clear"):
+        transaction.on_commit(dashboard.invalidate)
+
+
+# daily rollups
+
+
+def _refresh_rollups(days):
+    days = set(days)
+    transaction.on_commit(lambda: m.DailyRollup.refresh(days))
+
+
+@receiver(post_save, sender=m.People)
+@receiver(post_delete, sender=m.People)
+def refresh_people_rollup(sender, instance: m.People, **kwargs):
+    _refresh_rollups([instance.joined_at, _previous(instance, "joined_at")])
+
+
+@receiver(m2m_changed, sender=m.People.types.through)
+def refresh_people_types_rollup(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
+    # new clients are counted by their type
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+
+    if not reverse:
+        _refresh_rollups([instance.joined_at])
+    elif pk_set:
+        _refresh_rollups(
+            m.People.objects.filter(pk__in=pk_set).values_list(
+                "joined_at", flat=True
+            )
+        )
+
+
+@receiver(post_save, sender=m.Order)
+@receiver(post_delete, sender=m.Order)
+def refresh_order_rollup(sender, instance: m.Order, **kwargs):
+    _refresh_rollups([instance.order_at, _previous(instance, "order_at")])
+
+
+@receiver(post_save, sender=m.Contract)
+@receiver(post_delete, sender=m.Contract)
+def refresh_contract_rollup(sender, instance: m.Contract, **kwargs):
+    _refresh_rollups(
+        [instance.contract_at, _previous(instance, "contract_at")]
+    )
+
+
+@receiver(post_save, sender=m.Call)
+@receiver(post_delete, sender=m.Call)
+def refresh_call_rollup(sender, instance: m.Call, **kwargs):
+    _refresh_rollups([instance.called_at, _previous(instance, "called_at")])
+
+
+@receiver(post_save, sender=m.Payment)
+@receiver(post_delete, sender=m.Payment)
+def refresh_payment_rollup(sender, instance: m.Payment, **kwargs):
+    _refresh_rollups([instance.paid_at, _previous(instance, "paid_at")])
+
+
+# holidays
+
+
+@receiver(post_save, sender=m.Holiday)
+@receiver(post_delete, sender=m.Holiday)
+def refresh_holidays(sender, instance: m.Holiday, **kwargs):
+    days = {instance.date, _previous(instance, "date")}
+    transaction.on_commit(lambda: m.JalaliDay.refresh_holidays(days))
+    transaction.on_commit(workdays.invalidate)
+
+
+# personnel schedules
+
+
+@receiver(post_save, sender=m.Contract)
+@receiver(post_delete, sender=m.Contract)
+def invalidate_contract_schedule(sender, instance: m.Contract, **kwargs):
+    people = [instance.personnel_id, _previous(instance, "personnel_id")]
+    transaction.on_commit(lambda: schedule.invalidate(people))
+
+
+@receiver(post_save, sender=m.Order)
+@receiver(post_delete, sender=m.Order)
+def invalidate_order_schedule(sender, instance: m.Order, **kwargs):
+    people = [
+        instance.assigned_personnel_id,
+        _previous(instance, "assigned_personnel_id"),
+    ]
+    transaction.on_commit(lambda: schedule.invalidate(people))
+
+
+# personnel matching
+
+
+def _invalidate_matching(people_ids):
+    people_ids = set(people_ids)
+    transaction.on_commit(lambda: matching.invalidate(people_ids))
+
+
+@receiver(post_save, sender=m.Specification)
+@receiver(post_delete, sender=m.Specification)
+@receiver(post_save, sender=m.PeopleRole)
+@receiver(post_delete, sender=m.PeopleRole)
+@receiver(post_save, sender=m.ServiceLocation)
+@receiver(post_delete, sender=m.ServiceLocation)
+def invalidate_catalog_matching(sender, instance, **kwargs):
+    _invalidate_matching(
+        [instance.people_id, _previous(instance, "people_id")]
+    )
+
+
+@receiver(post_save, sender=m.People)
+@receiver(post_delete, sender=m.People)
+def invalidate_people_matching(sender, instance: m.People, **kwargs):
+    # gender is a filter of the index
+    _invalidate_matching([instance.pk])
+
+
+@receiver(m2m_changed, sender=m.People.types.through)
+@receiver(m2m_changed, sender=m.People.specifications.through)
+@receiver(m2m_changed, sender=m.People.roles.through)
+@receiver(m2m_changed, sender=m.People.service_locations.through)
+def invalidate_catalogs_matching(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+
+    if not reverse:
+        _invalidate_matching([instance.pk])
+    elif pk_set:
+        _invalidate_matching(pk_set)
+    else:
+        # reverse clear, the removed people are not known anymore.
+        transaction.on_commit(matching.invalidate)
+
+
+# visits
+
+
+@receiver(post_save, sender=m.Contract)
+def regenerate_contract_visits(sender, instance: m.Contract, **kwargs):
+    transaction.on_commit(lambda: visits.generate([instance.pk]))
+
+
+@receiver(post_save, sender=m.Holiday)
+@receiver(post_delete, sender=m.Holiday)
+def regenerate_holiday_visits(sender, **kwargs):
+    # every contract is regenerated, too slow for a request, so it is
+    # left to the generate_visits job
+    transaction.on_commit(visits.holidays_changed)
+
+
+# agendas
+
+
+def _refresh_agendas(pairs):
+    pairs = set(pairs)
+    transaction.on_commit(lambda: m.AgendaSnapshot.refresh(pairs))
+
+
+def _refresh_matching_agendas(visits: Q, orders: Q):
+    transaction.on_commit(
+        lambda: m.AgendaSnapshot.refresh(
+            m.AgendaSnapshot.pairs(visits, orders)
+        )
+    )
+
+
+@receiver(post_save, sender=m.Visit)
+@receiver(post_delete, sender=m.Visit)
+def refresh_visit_agendas(sender, instance: m.Visit, **kwargs):
+    _refresh_agendas(
+        [
+            (instance.personnel_id, instance.date),
+            (_previous(instance, "personnel_id"), _previous(instance, "date")),
+        ]
+    )
+
+
+@receiver(post_save, sender=m.Order)
+@receiver(post_delete, sender=m.Order)
+def refresh_order_agendas(sender, instance: m.Order, **kwargs):
+    _refresh_agendas(
+        [
+            (instance.assigned_personnel_id, instance.order_at),
+            (
+                _previous(instance, "assigned_personnel_id"),
+                _previous(instance, "order_at"),
+            ),
+        ]
+    )
+
+
+@receiver(post_save, sender=m.Contract)
+def refresh_contract_agendas(sender, instance: m.Contract, created, **kwargs):
+    # the client or address of the visits may have changed
+    if not created:
+        _refresh_matching_agendas(Q(contract=instance), Q(pk__in=[]))
+
+
+@receiver(post_save, sender=m.People)
+def refresh_client_agendas(sender, instance: m.People, created, **kwargs):
+    if not created:
+        _refresh_matching_agendas(
+            Q(contract__client=instance), Q(client=instance)
+        )
+
+
+@receiver(post_save, sender=m.PeopleDetailedInfo)
+@receiver(post_delete, sender=m.PeopleDetailedInfo)
+def refresh_details_agendas(sender, instance: m.PeopleDetailedInfo, **kwargs):
+    # phone numbers of the client or the address of the visit
+    _refresh_matching_agendas(
+        Q(contract__client_id=instance.people_id)
+        | Q(contract__service_location_id=instance.pk),
+        Q(client_id=instance.people_id) | Q(service_location_id=instance.pk),
+    )
+
+
+# previews
+
+
+def _invalidate_previews(model, values: dict):
+    transaction.on_commit(
+        lambda: previews.invalidate(previews.dependents(model, values))
+    )
+
+
+def invalidate_dependent_previews(sender, instance, **kwargs):
+    _invalidate_previews(
+        sender,
+        {
+            field: [getattr(instance, field, None), _previous(instance, field)]
+            for field in previews.DEPENDENCIES[sender]
+        },
+    )
+
+
+# connected per model, deletion receivers of every model would keep
+# django from fast deleting cascades
+for model in previews.DEPENDENCIES:
+    post_save.connect(invalidate_dependent_previews, sender=model)
+    post_delete.connect(invalidate_dependent_previews, sender=model)
+
+
+@receiver(m2m_changed, sender=m.Contract.patients.through)
+def invalidate_patients_previews(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+
+    # cleared patients or contracts are not known anymore
+    if not reverse:
+        _invalidate_previews(
+            m.Contract, {"pk": [instance.pk], "patient_ids": pk_set or []}
+        )
+    else:
+        _invalidate_previews(
+            m.Contract, {"pk": pk_set or [], "patient_ids": [instance.pk]}
+        )
+
+
+@receiver(m2m_changed, sender=m.People.types.through)
+@receiver(m2m_changed, sender=m.People.specifications.through)
+@receiver(m2m_changed, sender=m.People.roles.through)
+@receiver(m2m_changed, sender=m.People.service_locations.through)
+def invalidate_catalogs_previews(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
+    # the description of a person lists their types, personnel show
+    # their tags, roles and skills
+    if not reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            _invalidate_previews(sender, {"people_id": [instance.pk]})
+    elif action in ("post_add", "post_remove"):
+        _invalidate_previews(sender, {"people_id": pk_set or []})
+    elif action == "pre_clear":
+        # the people of the catalog are not known after clearing
+        keys = previews.dependents(m.Catalog, {"pk": [instance.pk]})
+        transaction.on_commit(lambda: previews.invalidate(keys))
@@ -1,7 +1,25 @@
 function findTabTabels() {
     tables = $("[id^='tab-table-']")
     tables.each(function () {
-        $(this).DataTable({...tabTable,  order:[]})
+        let source = $(this).attr("data-source")
+        if (!source) {
+            $(this).DataTable({...tabTable,  order:[]})
+            return
+        }
+
+        // rows are fetched page by page from the section table endpoint
+        $(this).DataTable({
+            ...tabTable,
+            order: [],
+            serverSide: true,
+            processing: true,
+            searchDelay: 400,
+            ajax: source,
+            createdRow: function (row) {
+                $(row).addClass("cursor-pointer")
+                $(row).find("td").css("text-align", "right")
+            },
+        })
     })
 }
 
@@ -2,6 +2,9 @@
 // import { ajax } from "jquery"
 
 let previewUrlStack = Array()
+// sections of the shown preview, responses of an older one are dropped
+let previewGeneration = 0
+const sectionPageSize = 50
 
 function persianize(value) {
     if (value === null || value === undefined) return
@@ -26,11 +29,11 @@ function persianize(value) {
 function makePreview(data) {
     let buttonsData = data.buttons
     let tableData = data.table
-    let dataTablesData = data.data_tables
+    let sectionsData = data.sections
 
     let buttonsHTML = makeButtonSet(buttonsData)
     let tableHTML = makeInfoTable(tableData)
-    let dataTablesHTML = makeDataTable(dataTablesData)
+    let sectionsHTML = makeSectionPanes(sectionsData)
 
     previewContainer = `
     <div class="flex flex-row-reverse gap-2 ">
@@ -56,10 +59,10 @@ function makePreview(data) {
             </div>
         </div>
         <div class="flex flex-col gap-2">
-            ${dataTablesHTML.html}
+            ${sectionsHTML}
         </div>
     `
-    return { previewContainer: previewContainer, dataTableIds: dataTablesHTML.dataTableIds }
+    return previewContainer
 }
 
 function makeButton(title, icon, link) {
@@ -174,46 +177,78 @@ function previewPane(header, icon, content) {
     </div>`
 }
 
-function makeDataTable(tablesData) {
+function makeSectionPanes(sectionsData) {
     let HTML = ""
-    let dataTableIds = Array()
-
-    let counter = 0
-    tablesData.forEach(function (obj) {
-        if (obj.data.length === 0) {
-            // HTML += previewPane(
-            //     obj.title,
-            //     undefined,
-            //     `<span class="align-middle text-failed">داده یافت نشد</span>`
-            // )
-        } else {
-            let headersHTML = makeDataTableHeaders(obj)
-            let body = makeDataTableRows(obj)
-            HTML += previewPane(
-                obj.title,
+    sectionsData.forEach(function (section) {
+        if (section.count === 0) return
+        HTML += `<div id="section-${section.name}">
+            ${previewPane(
+                `${section.title} (${persianize(section.count)})`,
                 undefined,
-                `<table class="display  compact text-black text-sm" id="dt-${counter}">${headersHTML + body}</table>`
-            )
-            dataTableIds.push(counter)
-            counter++
-        }
+                `<div class="section-table"></div>
+                <button class="section-more hidden p-2 text-sm bg-successbg text-successtext rounded-md w-fit">بیشتر</button>`
+            )}
+        </div>`
     })
-    return { html: HTML, dataTableIds: dataTableIds }
+    return HTML
 }
 
-function loadDataTables(ids) {
-    ids.forEach(function (id) {
-        $(`#dt-${id}`).DataTable(informTable)
+function styleDataTables() {
+    // persianize
+    $('.dataTable').find('td, th').css('text-align', 'right');
+
+    // make table flexible (remove static width)
+    $('.dataTable').each(function () {
+        $(this).removeAttr("style", "width")
+    })
+
+    $("table.dataTable tr[data-link]").addClass("cursor-pointer")
+}
 
-        // persianize
-        $('.dataTable').find('td, th').css('text-align', 'right');
+function loadSection(section, after) {
+    let generation = previewGeneration
+    let url = `${section.link}&limit=${sectionPageSize}`
+    if (after !== undefined) url += `&after=${after}`
 
-        // make table flexible (remove static width)
-        $('.dataTable').each(function () {
-            $(this).removeAttr("style", "width")
-        })
+    $.ajax(
+        {
+            url: url,
+        }
+    ).done(function (page) {
+        if (generation !== previewGeneration) return
+
+        let pane = $(`#section-${section.name}`)
+        let tableId = `dt-${section.name}`
+        if (after === undefined) {
+            pane.find(".section-table").html(
+                `<table class="display  compact text-black text-sm" id="${tableId}">${makeDataTableHeaders(page) + makeDataTableRows(page)}</table>`
+            )
+            $(`#${tableId}`).DataTable(informTable)
+        } else {
+            let rows = ""
+            page.data.forEach(function (row) {
+                rows += makeDataTableRow(row)
+            })
+            $(`#${tableId}`).DataTable().rows.add($(rows)).draw(false)
+        }
+        styleDataTables()
+
+        let more = pane.find(".section-more")
+        more.off("click")
+        if (page.next === null) {
+            more.addClass("hidden")
+        } else {
+            more.removeClass("hidden")
+            more.on("click", function () {
+                loadSection(section, page.next)
+            })
+        }
+    })
+}
 
-        $("table.dataTable tr[data-link]").addClass("cursor-pointer")
+function loadSections(sectionsData) {
+    sectionsData.forEach(function (section) {
+        if (section.count > 0) loadSection(section)
     })
 }
 
@@ -234,10 +269,10 @@ function loadNewPreview(url) {
         }
     ).done(function (data) {
         previewUrlStack.push(url)
-        new_preview = makePreview(data)
+        previewGeneration++
         flushCurrentPreview()
-        replaceNewPreview(new_preview.previewContainer)
-        loadDataTables(new_preview.dataTableIds)
+        replaceNewPreview(makePreview(data))
+        loadSections(data.sections)
     })
 }
 
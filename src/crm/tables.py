@@ -0,0 +1,377 @@
+from typing import Callable, Optional
+
+from django.db.models import Q, QuerySet
+from django.http import QueryDict
+from django.urls import reverse
+from django.utils.html import escape
+
+from . import models, utils
+from .templatetags.crm_extras import persianize, tooman_separator
+
+
+class Column:
+    def __init__(
+        self,
+        header: str,
+        render: Callable[[object], object],
+        order_by: Optional[str] = None,
+    ) -> None:
+        self.header = header
+        self.render = render
+        self.order_by = order_by
+
+    @property
+    def orderable(self) -> bool:
+        return self.order_by is not None
+
+
+class SectionTable:
+    """
+    Server side source of a section tab data table, following the
+    DataTables server-side processing protocol.
+
+    Subclasses declare the columns, the fields the search box looks into
+    and the queryset, only the requested page is fetched and rendered.
+    """
+
+    name = ""
+    title = ""
+    columns: list[Column] = []
+    # every word of the search box has to match one of these lookups
+    search_lookups: list[str] = []
+    default_ordering: tuple[str] = ("-pk",)
+    max_page_length = 100
+
+    def get_queryset(self) -> QuerySet:
+        raise NotImplementedError
+
+    def get_link(self, obj) -> str:
+        return obj.get_absolute_url_api()
+
+    def search(self, qs: QuerySet, value: str) -> QuerySet:
+        for word in utils.normalize_persian(value).split():
+            lookups = Q()
+            for lookup in self.search_lookups:
+                lookups |= Q(**{lookup: word})
+            qs = qs.filter(lookups)
+
+        return qs
+
+    def get_ordering(self, params: QueryDict) -> list[str]:
+        ordering = []
+        index = 0
+        while f"order[{index}][column]" in params:
+            column = utils.to_int(params.get(f"order[{index}][column]"), -1)
+            direction = params.get(f"order[{index}][dir]")
+            index += 1
+
+            if not 0 <= column < len(self.columns):
+                continue
+
+            order_by = self.columns[column].order_by
+            if order_by is None:
+                continue
+
+            prefix = "-" if direction == "desc" else ""
+            ordering.append(f"{prefix}{order_by}")
+
+        # a unique field at the end keeps pages stable between requests
+        return [*ordering, *self.default_ordering, "-pk"]
+
+    def render_row(self, obj) -> dict:
+        row = {
+            str(index): escape(column.render(obj))
+            for index, column in enumerate(self.columns)
+        }
+        row["DT_RowAttr"] = {"data-link": self.get_link(obj)}
+        return row
+
+    def serve(self, params: QueryDict) -> dict:
+        """
+        Answering a DataTables server-side request.
+
+        Args:
+            params: Query parameters sent by DataTables.
+
+        Returns:
+            Page of rendered rows along with the counters DataTables needs.
+        """
+
+        start = max(utils.to_int(params.get("start"), 0), 0)
+        length = utils.to_int(params.get("length"), 10)
+        if not 0 < length <= self.max_page_length:
+            length = self.max_page_length
+
+        qs = self.get_queryset()
+        total = qs.count()
+
+        search_value = (params.get("search[value]") or "").strip()
+        if search_value:
+            qs = self.search(qs, search_value)
+            filtered = qs.count()
+        else:
+            filtered = total
+
+        qs = qs.order_by(*self.get_ordering(params))
+
+        return {
+            "draw": utils.to_int(params.get("draw"), 0),
+            "recordsTotal": total,
+            "recordsFiltered": filtered,
+            "data": [
+                self.render_row(obj) for obj in qs[start : start + length]
+            ],
+        }
+
+    def tab(self, section: str) -> dict:
+        return utils.make_section_tab(
+            self.name,
+            self.title,
+            [(column.header, column.orderable) for column in self.columns],
+            reverse(
+                "crm:section_table",
+                kwargs={"section": section, "tab": self.name},
+            ),
+        )
+
+
+def _tooman(value) -> str:
+    return persianize(tooman_separator(value or 0))
+
+
+def _people_title(people: Optional[models.People]) -> str:
+    return people.__str__() if people else ""
+
+
+class ClientTable(SectionTable):
+    name = "client"
+    title = "کارفرما"
+    columns = [
+        Column(
+            "نام و نام خانوادگی", lambda p: p.fullname_with_prefix, "lastname"
+        ),
+        Column(
+            "خدمات دریافتی",
+            lambda p: persianize(p.totals.client_orders),
+            "summary__client_orders",
+        ),
+        Column(
+            "قرارداد ها",
+            lambda p: persianize(p.totals.client_contracts),
+            "summary__client_contracts",
+        ),
+        Column(
+            "بدهکاری",
+            lambda p: _tooman(p.totals.client_debt),
+            "summary__client_debt",
+        ),
+    ]
+    search_lookups = [
+        "firstname_normalized__startswith",
+        "lastname_normalized__startswith",
+        "national_code__startswith",
+    ]
+    default_ordering = ("-updated_at",)
+
+    def get_queryset(self) -> QuerySet:
+        return models.People.clients.select_related("summary")
+
+    def get_link(self, obj) -> str:
+        return reverse("crm:client_preview", kwargs={"id": obj.pk})
+
+
+class PersonnelTable(SectionTable):
+    name = "personnel"
+    title = "پرسنل"
+    columns = [
+        Column(
+            "نام و نام خانوادگی", lambda p: p.fullname_with_prefix, "lastname"
+        ),
+        Column(
+            "نقش در مرکز",
+            lambda p: p.totals.display_roles,
+            "summary__display_roles",
+        ),
+        Column(
+            "خدمت دهی",
+            lambda p: persianize(p.totals.personnel_orders),
+            "summary__personnel_orders",
+        ),
+        Column(
+            "قرارداد ها",
+            lambda p: persianize(p.totals.personnel_contracts),
+            "summary__personnel_contracts",
+        ),
+        Column(
+            "قابل تسویه",
+            lambda p: _tooman(p.totals.personnel_debt),
+            "summary__personnel_debt",
+        ),
+    ]
+    search_lookups = [
+        "firstname_normalized__startswith",
+        "lastname_normalized__startswith",
+        "national_code__startswith",
+    ]
+    default_ordering = ("-updated_at",)
+
+    def get_queryset(self) -> QuerySet:
+        return models.People.personnels.select_related("summary")
+
+    def get_link(self, obj) -> str:
+        return reverse("crm:personnel_preview", kwargs={"id": obj.pk})
+
+
+class OrderTable(SectionTable):
+    name = "orders"
+    title = "خدمات موردی"
+    columns = [
+        Column("تاریخ", lambda o: persianize(o.order_at), "order_at"),
+        Column(
+            "کارفرما",
+            lambda o: o.client.fullname_with_prefix,
+            "client__lastname",
+        ),
+        Column(
+            "کار های انجام شده",
+            lambda o: ", ".join(s.title for s in o.services.all()),
+        ),
+    ]
+    search_lookups = [
+        "client__firstname_normalized__startswith",
+        "client__lastname_normalized__startswith",
+    ]
+    default_ordering = ("-order_at",)
+
+    def get_queryset(self) -> QuerySet:
+        return models.Order.objects.select_related("client").prefetch_related(
+            "services"
+        )
+
+
+class ContractTable(SectionTable):
+    name = "contracts"
+    title = "قراردادها"
+    columns = [
+        Column("تاریخ عقد قرارداد", lambda c: persianize(c.start), "start"),
+        Column(
+            "کارفرما",
+            lambda c: c.client.fullname_with_prefix,
+            "client__lastname",
+        ),
+        Column("سررسید", lambda c: persianize(c.end), "end"),
+        Column(
+            "فرانشیز مرکز",
+            lambda c: _tooman(c.healthcare_franchise_amount),
+            "healthcare_franchise_amount",
+        ),
+    ]
+    search_lookups = [
+        "client__firstname_normalized__startswith",
+        "client__lastname_normalized__startswith",
+    ]
+    default_ordering = ("-start",)
+
+    def get_queryset(self) -> QuerySet:
+        return models.Contract.objects.select_related("client")
+
+
+class ServiceTable(SectionTable):
+    name = "services"
+    title = "سرویس ها"
+    columns = [
+        Column("عنوان سرویس", lambda s: s.title, "title"),
+        Column(
+            "فرانشیز مرکز",
+            lambda s: persianize(s.healthcare_franchise),
+            "healthcare_franchise",
+        ),
+        Column(
+            "قیمت پیشنهادی پایه",
+            lambda s: _tooman(s.base_price),
+            "base_price",
+        ),
+    ]
+    search_lookups = ["title_normalized__contains"]
+
+    def get_queryset(self) -> QuerySet:
+        return models.Service.objects.all()
+
+
+class PaymentTable(SectionTable):
+    def get_link(self, obj) -> str:
+        reason = obj.payment_for
+        return reason.get_absolute_url_api() if reason else ""
+
+
+class IncomeTable(PaymentTable):
+    name = "incomes"
+    title = "پرداختی کارفرما"
+    columns = [
+        Column("تاریخ واریز", lambda p: persianize(p.paid_at), "paid_at"),
+        Column(
+            "کارفرما",
+            lambda p: _people_title(p.source),
+            "source__lastname",
+        ),
+        Column("بابت", lambda p: persianize(p.payment_for or "")),
+        Column("مبلغ", lambda p: _tooman(p.amount), "amount"),
+        Column("یادداشت", lambda p: persianize(p.note or "")),
+    ]
+    search_lookups = [
+        "source__firstname_normalized__startswith",
+        "source__lastname_normalized__startswith",
+        "note__icontains",
+    ]
+    default_ordering = ("-paid_at",)
+
+    def get_queryset(self) -> QuerySet:
+        return models.Payment.incomes.select_related(
+            "source", "order", "contract"
+        ).prefetch_related("source__types")
+
+
+class OutgoTable(PaymentTable):
+    name = "outgoes"
+    title = "دریافتی پرسنل"
+    columns = [
+        Column("تاریخ تسویه حساب", lambda p: persianize(p.paid_at), "paid_at"),
+        Column(
+            "پرسنل",
+            lambda p: _people_title(p.destination),
+            "destination__lastname",
+        ),
+        Column("بابت", lambda p: persianize(p.payment_for or "")),
+        Column("مبلغ", lambda p: _tooman(p.amount), "amount"),
+        Column("یادداشت", lambda p: persianize(p.note or "")),
+    ]
+    search_lookups = [
+        "destination__firstname_normalized__startswith",
+        "destination__lastname_normalized__startswith",
+        "note__icontains",
+    ]
+    default_ordering = ("-paid_at",)
+
+    def get_queryset(self) -> QuerySet:
+        return models.Payment.outgoes.select_related(
+            "destination", "order", "contract"
+        ).prefetch_related("destination__types")
+
+
+SECTION_TABLES: dict[str, list[type[SectionTable]]] = {
+    "people": [ClientTable, PersonnelTable],
+    "services": [OrderTable, ContractTable, ServiceTable],
+    "payments": [IncomeTable, OutgoTable],
+}
+
+
+def get_table(section: str, tab: str) -> Optional[SectionTable]:
+    for table in SECTION_TABLES.get(section, []):
+        if table.name == tab:
+            return table()
+
+    return None
+
+
+def get_section_tabs(section: str) -> list[dict]:
+    return [table().tab(section) for table in SECTION_TABLES[section]]
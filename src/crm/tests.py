@@ -1,3 +1,1555 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import io
+import threading
+import time
+from unittest import mock, skipIf
 
-# Create your tests here.
+import jdatetime
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db.models.deletion import Collector
+from django.db import connection
+from django.db.models import Count, Q
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.serializers import ValidationError
+
+from . import fuzzy, jalali, matching, models, payroll, previews, schedule
+from . import search, utils, visits, workdays
+
+
+def make_people(code: str, **fields) -> models.People:
+    return models.People.objects.create(
+        national_code=code,
+        firstname=fields.pop("firstname", "علی"),
+        lastname=fields.pop("lastname", f"کریمی {code}"),
+        gender=fields.pop("gender", "M"),
+        birthdate=fields.pop("birthdate", "1360/05/06"),
+        joined_at=fields.pop("joined_at", "1400/01/01"),
+        **fields,
+    )
+
+
+def make_order(
+    client: models.People,
+    personnel: models.People,
+    services: dict[models.Service, int],
+    **fields,
+) -> models.Order:
+    location = models.PeopleDetailedInfo.objects.create(
+        people=client, detail_type="A", value="تهران"
+    )
+    order = models.Order.objects.create(
+        order_at=fields.pop("order_at", "1403/02/01"),
+        client=client,
+        assigned_personnel=personnel,
+        service_location=location,
+        **fields,
+    )
+    for service, cost in services.items():
+        models.OrderServices.objects.create(
+            order=order, service=service, cost=cost
+        )
+
+    return order
+
+
+def make_contract(
+    client: models.People, personnel: models.People, **fields
+) -> models.Contract:
+    location = models.PeopleDetailedInfo.objects.create(
+        people=client, detail_type="A", value="تهران"
+    )
+    return models.Contract.objects.create(
+        contract_at=fields.pop("contract_at", "1403/01/10"),
+        client=client,
+        care_for="E",
+        relationship_with_patient="S",
+        personnel=personnel,
+        service_location=location,
+        shift="D",
+        start=fields.pop("start", "1403/01/15"),
+        start_hour="08:00",
+        end=fields.pop("end", "1403/12/15"),
+        end_hour="18:00",
+        personnel_salary_payment_time="E",
+        **fields,
+    )
+
+
+class JDateTests(SimpleTestCase):
+    def test_format(self):
+        date = jalali.from_parts(1402, 5, 6)
+
+        self.assertEqual(f"{date}", "1402/05/06")
+        self.assertEqual(format(date, ""), str(date))
+        self.assertEqual(f"{date:%Y}", "1402")
+        self.assertEqual(f"on {date}", "on 1402/05/06")
+
+    def test_round_trip(self):
+        first = jdatetime.date(jalali.FIRST_YEAR, 1, 1).togregorian()
+        last = jdatetime.date(jalali.LAST_YEAR, 12, 29).togregorian()
+        for ordinal in range(first.toordinal(), last.toordinal() + 1):
+            gregorian = datetime.date.fromordinal(ordinal)
+            expected = jdatetime.date.fromgregorian(date=gregorian)
+
+            date = jalali.from_gregorian(gregorian)
+            self.assertEqual(
+                (date.year, date.month, date.day),
+                (expected.year, expected.month, expected.day),
+            )
+            self.assertEqual(jalali.to_gregorian(date), gregorian)
+            self.assertEqual(jalali.to_ordinal(expected), ordinal)
+            self.assertEqual(
+                jalali.from_parts(date.year, date.month, date.day), date
+            )
+
+    def test_outside_tables(self):
+        date = jalali.from_parts(1600, 1, 1)
+        gregorian = jdatetime.date(1600, 1, 1).togregorian()
+
+        self.assertEqual(jalali.to_gregorian(date), gregorian)
+        self.assertEqual(jalali.from_gregorian(gregorian), date)
+
+    def test_leap_years(self):
+        for year in range(jalali.FIRST_YEAR, jalali.LAST_YEAR + 1):
+            leap = jdatetime.date(year, 1, 1).isleap()
+            self.assertEqual(jalali.is_leap(year), leap)
+            self.assertEqual(jalali.days_in_month(year, 12), 29 + leap)
+
+        self.assertTrue(jalali.is_leap(1403))
+        self.assertFalse(jalali.is_leap(1402))
+        self.assertEqual(
+            jalali.from_parts(1403, 12, 30) + datetime.timedelta(days=1),
+            jalali.from_parts(1404, 1, 1),
+        )
+
+    def test_invalid_dates(self):
+        for parts in [
+            (1402, 12, 30),
+            (1402, 13, 1),
+            (1402, 0, 1),
+            (1402, 7, 31),
+            (1402, 1, 32),
+            (1402, 1, 0),
+        ]:
+            with self.subTest(parts=parts), self.assertRaises(ValueError):
+                jalali.from_parts(*parts)
+
+    def test_parse_jdate(self):
+        date = jalali.from_parts(1402, 5, 6)
+        for value in [
+            "1402/05/06",
+            "1402/5/6",
+            "1402-05-06",
+            "۱۴۰۲/۰۵/۰۶",
+            date,
+            jdatetime.date(1402, 5, 6),
+            date.togregorian(),
+        ]:
+            with self.subTest(value=value):
+                parsed = utils.parse_jdate(value)
+                self.assertEqual(parsed, date)
+                self.assertIsInstance(parsed, jalali.JDate)
+
+        for value in ["1402/12/30", "1402/13/01", "14020506", "", "abc"]:
+            with self.subTest(value=value), self.assertRaises(ValueError):
+                utils.parse_jdate(value)
+
+    def test_model_str(self):
+        date = jalali.from_parts(1402, 5, 6)
+
+        self.assertEqual(
+            str(models.Holiday(date=date, title="عید")), "1402/05/06 عید"
+        )
+        self.assertEqual(
+            str(models.Visit(date=date, contract_id=3)),
+            "1402/05/06 of contract 3",
+        )
+        self.assertEqual(
+            str(models.AgendaSnapshot(date=date, personnel_id=2)),
+            "agenda of 2 on 1402/05/06",
+        )
+        self.assertEqual(
+            str(models.DailyRollup(day=date)), "rollup of 1402/05/06"
+        )
+        self.assertEqual(str(models.Call(called_at=date)), "1402/05/06")
+        self.assertEqual(str(models.JalaliDay(date=date)), "1402/05/06")
+
+
+class OrderPaymentTests(TestCase):
+    fields = models.OrderPayment.value_fields
+
+    def setUp(self):
+        client = make_people("1000000001")
+        self.personnel = make_people("2000000001")
+        injection = models.Service.objects.create(
+            title="تزریق", base_price=100000, healthcare_franchise=70
+        )
+        dressing = models.Service.objects.create(
+            title="پانسمان", base_price=250000, healthcare_franchise=40
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.plain = make_order(
+                client, self.personnel, {injection: 100000}
+            )
+            self.discounted = make_order(
+                client,
+                self.personnel,
+                {injection: 120050, dressing: 250000},
+                discount=20000,
+            )
+            self.paid = make_order(
+                client,
+                self.personnel,
+                {injection: 100000, dressing: 300000},
+                discount=5000,
+            )
+            self.empty = make_order(client, self.personnel, {})
+            for amount in (50000, 70000):
+                models.Payment.objects.create(
+                    paid_at="1403/02/02",
+                    source=client,
+                    amount=amount,
+                    order=self.paid,
+                )
+            models.Payment.objects.create(
+                paid_at="1403/02/03",
+                destination=self.personnel,
+                amount=30000,
+                order=self.paid,
+            )
+
+    def annotated(self, order: models.Order) -> dict[str, int]:
+        prefix = models.OrderQuerySet.payment_prefix
+        row = (
+            models.Order.objects.with_payment()
+            .values(*(f"{prefix}{field}" for field in self.fields))
+            .get(pk=order.pk)
+        )
+        return {field: row[f"{prefix}{field}"] for field in self.fields}
+
+    def test_matches_order_payment(self):
+        for order in (self.plain, self.discounted, self.paid, self.empty):
+            with self.subTest(order=order.pk):
+                stored = models.OrderPayment.objects.values(*self.fields).get(
+                    order=order
+                )
+                self.assertEqual(self.annotated(order), stored)
+
+    def test_values(self):
+        healthcare = 120050 // 100 * 70 + 250000 // 100 * 40
+        self.assertEqual(
+            self.annotated(self.discounted),
+            {
+                "cost_without_discount": 370050,
+                "cost": 350050,
+                "healthcare_franchise": healthcare - 20000,
+                "personnel_fee": 370050 - healthcare,
+                "personnel_paid": 0,
+                "client_paid": 0,
+                "personnel_debt": 370050 - healthcare,
+                "client_debt": 350050,
+            },
+        )
+
+        healthcare = 100000 // 100 * 70 + 300000 // 100 * 40
+        self.assertEqual(
+            self.annotated(self.paid),
+            {
+                "cost_without_discount": 400000,
+                "cost": 395000,
+                "healthcare_franchise": healthcare - 5000,
+                "personnel_fee": 400000 - healthcare,
+                "personnel_paid": 30000,
+                "client_paid": 120000,
+                "personnel_debt": 400000 - healthcare - 30000,
+                "client_debt": 395000 - 120000,
+            },
+        )
+
+        self.assertEqual(
+            self.annotated(self.empty), dict.fromkeys(self.fields, 0)
+        )
+
+    def test_refresh_on_payment_change(self):
+        payment = models.Payment.objects.filter(
+            order=self.paid, destination__isnull=True
+        ).first()
+        with self.captureOnCommitCallbacks(execute=True):
+            payment.delete()
+
+        self.assertEqual(
+            models.OrderPayment.objects.get(order=self.paid).client_paid,
+            120000 - payment.amount,
+        )
+        self.assertEqual(models.OrderPayment.verify([self.paid.pk]), [])
+
+    def rebuild(self, *args) -> str:
+        stdout = io.StringIO()
+        call_command("rebuild_order_payment", *args, stdout=stdout)
+        return stdout.getvalue()
+
+    def test_verify_and_rebuild(self):
+        self.assertIn("4 order payments verified.", self.rebuild("--verify"))
+
+        # stale and missing rows, left behind without signals
+        models.OrderPayment.objects.filter(order=self.paid).update(cost=1)
+        models.OrderPayment.objects.filter(order=self.empty).delete()
+        with self.assertRaisesMessage(
+            CommandError,
+            f"2 stale order payments: {self.paid.pk}, {self.empty.pk}",
+        ):
+            self.rebuild("--verify")
+        self.assertIn(
+            "1 order payments verified.",
+            self.rebuild("--verify", str(self.plain.pk)),
+        )
+
+        self.assertIn("4 order payments rebuilt.", self.rebuild())
+        self.assertIn("4 order payments verified.", self.rebuild("--verify"))
+        self.assertEqual(
+            models.OrderPayment.objects.get(order=self.paid).cost, 395000
+        )
+
+    @skipIf(connection.vendor == "postgresql", "the view runs on postgresql")
+    def test_against_view_needs_postgresql(self):
+        with self.assertRaisesMessage(CommandError, "PostgreSQL"):
+            self.rebuild("--against-view")
+
+
+class PeopleSummaryTests(TestCase):
+    def setUp(self):
+        self.client_people = make_people("1000000001")
+        self.personnel = make_people("2000000001")
+        self.service = models.Service.objects.create(
+            title="تزریق", base_price=100000, healthcare_franchise=70
+        )
+
+    def summary(self, people: models.People) -> tuple:
+        summary = models.PeopleSummary.objects.get(people=people)
+        return (
+            summary.client_orders,
+            summary.client_contracts,
+            summary.client_debt,
+            summary.personnel_orders,
+            summary.personnel_contracts,
+            summary.personnel_debt,
+        )
+
+    def test_orders_and_payments(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            order = make_order(
+                self.client_people, self.personnel, {self.service: 100000}
+            )
+        self.assertEqual(
+            self.summary(self.client_people), (1, 0, 100000, 0, 0, 0)
+        )
+        self.assertEqual(self.summary(self.personnel), (0, 0, 0, 1, 0, 30000))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            income = models.Payment.objects.create(
+                paid_at="1403/02/02",
+                source=self.client_people,
+                amount=40000,
+                order=order,
+            )
+            models.Payment.objects.create(
+                paid_at="1403/02/02",
+                destination=self.personnel,
+                amount=10000,
+                order=order,
+            )
+        self.assertEqual(self.summary(self.client_people)[2], 60000)
+        self.assertEqual(self.summary(self.personnel)[5], 20000)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            income.delete()
+        self.assertEqual(self.summary(self.client_people)[2], 100000)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            order.delete()
+        self.assertEqual(self.summary(self.client_people), (0,) * 6)
+        self.assertEqual(self.summary(self.personnel), (0,) * 6)
+
+    def test_contracts(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            contract = make_contract(
+                self.client_people,
+                self.personnel,
+                healthcare_franchise_amount=500000,
+            )
+            models.Payment.objects.create(
+                paid_at="1403/02/02",
+                source=self.client_people,
+                amount=200000,
+                contract=contract,
+            )
+        self.assertEqual(
+            self.summary(self.client_people), (0, 1, 300000, 0, 0, 0)
+        )
+        self.assertEqual(self.summary(self.personnel), (0, 0, 0, 0, 1, 0))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            contract.delete()
+        self.assertEqual(self.summary(self.client_people), (0,) * 6)
+        self.assertEqual(self.summary(self.personnel), (0,) * 6)
+
+    def test_rebuild_command(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            make_order(
+                self.client_people, self.personnel, {self.service: 100000}
+            )
+            make_contract(self.client_people, self.personnel)
+        expected = self.summary(self.client_people)
+
+        models.PeopleSummary.objects.all().delete()
+        call_command("rebuild_people_summary", stdout=io.StringIO())
+
+        self.assertEqual(self.summary(self.client_people), expected)
+        self.assertEqual(self.summary(self.personnel), (0, 0, 0, 1, 1, 30000))
+
+
+class NormalizedColumnsTests(TestCase):
+    def test_save_update_fields(self):
+        people = make_people("1000000001")
+        people.firstname = "علي"
+        people.save(update_fields=["firstname"])
+
+        people.refresh_from_db()
+        self.assertEqual(people.firstname_normalized, "علی")
+
+    def test_update(self):
+        service = models.Service.objects.create(
+            title="تزريق", base_price=100000
+        )
+        models.Service.objects.filter(pk=service.pk).update(title="پانسمان")
+
+        service.refresh_from_db()
+        self.assertEqual(service.title_normalized, "پانسمان")
+
+    def test_update_expression(self):
+        make_people("1000000001")
+        with self.assertRaises(TypeError):
+            models.People.objects.update(firstname=models.F("lastname"))
+
+    def test_bulk_update(self):
+        people = make_people("1000000001")
+        people.lastname = "كريمي"
+        models.People.objects.bulk_update([people], ["lastname"])
+
+        people.refresh_from_db()
+        self.assertEqual(people.lastname_normalized, "کریمی")
+
+
+class PreviewInvalidationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.service = models.Service.objects.create(
+            title="تزریق", base_price=100000
+        )
+        self.order = make_order(
+            make_people("1000000001"),
+            make_people("2000000001"),
+            {self.service: 100000},
+        )
+        self.builds = 0
+
+    def build(self) -> dict:
+        self.builds += 1
+        return {"title": self.service.title}
+
+    def test_service_change(self):
+        previews.get(previews.ORDER, self.order.pk, self.build)
+        previews.get(previews.ORDER, self.order.pk, self.build)
+        self.assertEqual(self.builds, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.service.title = "پانسمان"
+            self.service.save()
+
+        payload = previews.get(previews.ORDER, self.order.pk, self.build)
+        self.assertEqual(self.builds, 2)
+        self.assertEqual(payload, {"title": "پانسمان"})
+
+    def personnel_sections(self, personnel: models.People) -> dict:
+        response = self.client.get(f"/crm/api/personnel/{personnel.pk}/")
+        return {
+            section["name"]: section["count"]
+            for section in response.json()["sections"]
+        }
+
+    def test_personnel_catalogs(self):
+        personnel = make_people("2000000002")
+        personnel.types.add(
+            models.Catalog.objects.create(code="TYP_PERSONNEL", title="پرسنل")
+        )
+        skill = models.Catalog.objects.create(code="SPC_INJ", title="تزریق")
+        role = models.Catalog.objects.create(code="ROLE_NURSE", title="پرستار")
+        self.assertEqual(self.personnel_sections(personnel)["skills"], 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            models.Specification.objects.create(
+                people=personnel, catalog=skill, rate=3
+            )
+        self.assertEqual(self.personnel_sections(personnel)["skills"], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            personnel.roles.add(role)
+        self.assertEqual(self.personnel_sections(personnel)["roles"], 1)
+
+        path = f"/crm/api/personnel/{personnel.pk}/?section=skills"
+        self.client.get(path)
+        with self.captureOnCommitCallbacks(execute=True):
+            skill.title = "پانسمان"
+            skill.save()
+        (row,) = self.client.get(path).json()["data"]
+        self.assertEqual(row["title"]["value"], "پانسمان")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            role.people_roles.clear()
+        self.assertEqual(self.personnel_sections(personnel)["roles"], 0)
+
+    def test_fast_delete(self):
+        # receivers of every deletion would keep cascades from it
+        collector = Collector(using="default")
+        self.assertTrue(
+            collector.can_fast_delete(models.AgendaSnapshot.objects.all())
+        )
+
+
+class WorkdaysTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_holiday_change(self):
+        start = jalali.from_parts(1403, 2, 1)
+        end = jalali.from_parts(1403, 2, 31)
+        every_day = (1 << 7) - 1
+        self.assertEqual(
+            workdays.count_shift_days(every_day, False, start, end), 31
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            models.Holiday.objects.create(
+                date=jalali.from_parts(1403, 2, 10), title="تعطیل"
+            )
+
+        self.assertEqual(
+            workdays.count_shift_days(every_day, False, start, end), 30
+        )
+        self.assertEqual(
+            workdays.count_shift_days(every_day, True, start, end), 31
+        )
+
+    def test_lost_version(self):
+        start = jalali.from_parts(1403, 2, 1)
+        end = jalali.from_parts(1403, 2, 31)
+        every_day = (1 << 7) - 1
+        workdays.count_shift_days(every_day, False, start, end)
+
+        # another process adds a holiday while the cache is cleared
+        models.Holiday.objects.create(
+            date=jalali.from_parts(1403, 2, 10), title="تعطیل"
+        )
+        cache.clear()
+
+        self.assertEqual(
+            workdays.count_shift_days(every_day, False, start, end), 30
+        )
+
+
+class ScheduleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client_people = make_people("1000000001")
+        self.personnel = make_people("2000000001")
+        self.day = jalali.from_parts(1403, 2, 10)
+
+    def test_booking_of_another_process(self):
+        self.assertEqual(
+            schedule.conflicts(self.personnel.pk, self.day, self.day), []
+        )
+
+        # saved by another process, which bumps the shared version only
+        order = make_order(
+            self.client_people, self.personnel, {}, order_at=self.day
+        )
+        utils.invalidate_cache_version(f"schedule:{self.personnel.pk}")
+
+        self.assertEqual(
+            [
+                booking.id
+                for booking in schedule.conflicts(
+                    self.personnel.pk, self.day, self.day
+                )
+            ],
+            [order.pk],
+        )
+
+
+class MatchingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.type = models.Catalog.objects.create(
+            code="TYP_PERSONNEL", title="پرسنل"
+        )
+        self.role = models.Catalog.objects.create(
+            code="ROLE_NURSE", title="پرستار"
+        )
+
+    def make_nurse(self, code: str) -> models.People:
+        nurse = make_people(code)
+        nurse.types.add(self.type)
+        models.PeopleRole.objects.create(people=nurse, catalog=self.role)
+        return nurse
+
+    def test_changes_of_many_invalidations(self):
+        first = self.make_nurse("2000000001")
+        matching.get_index()
+
+        # added by two workers, each one only bumps the shared version
+        second = self.make_nurse("2000000002")
+        third = self.make_nurse("2000000003")
+        matching.invalidate([second.pk])
+        matching.invalidate([third.pk])
+
+        self.assertEqual(
+            {pk for pk, score in matching.match(role=self.role.pk)},
+            {first.pk, second.pk, third.pk},
+        )
+
+
+class CacheVersionTests(TestCase):
+    def test_lost_version(self):
+        cache.clear()
+        version = utils.get_cache_version("test")
+        self.assertEqual(utils.invalidate_cache_version("test"), version + 1)
+
+        # an evicted version never goes back to one it had
+        cache.clear()
+        self.assertGreater(utils.get_cache_version("test"), version + 1)
+        cache.clear()
+        self.assertGreater(utils.invalidate_cache_version("test"), version + 1)
+
+
+class PayrollTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client_people = make_people("1000000001")
+        self.personnel = make_people("2000000001")
+        self.service = models.Service.objects.create(
+            title="تزریق", base_price=100000, healthcare_franchise=70
+        )
+
+    def item(self, items, personnel=None) -> models.PayrollItem:
+        personnel = personnel or self.personnel
+        (item,) = [item for item in items if item.personnel_id == personnel.pk]
+        return item
+
+    def test_prorated_salary(self):
+        # 23 shift days from saturday to wednesday in 1403/02, 12 of them
+        # from the 16th
+        make_contract(
+            self.client_people,
+            self.personnel,
+            personnel_monthly_salary=23000000,
+        )
+        late = make_people("2000000002")
+        make_contract(
+            self.client_people,
+            late,
+            start="1403/02/16",
+            personnel_monthly_salary=23000000,
+        )
+
+        items = payroll.compute(1403, 2)
+
+        item = self.item(items)
+        self.assertEqual((item.shift_days, item.salary), (23, 23000000))
+        item = self.item(items, late)
+        self.assertEqual((item.shift_days, item.salary), (12, 12000000))
+        self.assertEqual(item.amount, 12000000)
+
+    def test_fees_less_payments(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            make_order(
+                self.client_people,
+                self.personnel,
+                {self.service: 100000},
+                order_at="1403/02/05",
+            )
+            make_order(
+                self.client_people,
+                self.personnel,
+                {self.service: 200000},
+                order_at="1403/02/06",
+            )
+            # outside of the month
+            make_order(
+                self.client_people,
+                self.personnel,
+                {self.service: 400000},
+                order_at="1403/03/01",
+            )
+        models.Payment.objects.create(
+            paid_at="1403/02/07", destination=self.personnel, amount=50000
+        )
+
+        item = self.item(payroll.compute(1403, 2))
+
+        self.assertEqual((item.orders, item.order_fees), (2, 90000))
+        self.assertEqual((item.paid, item.amount), (50000, 40000))
+
+    def test_fee_paid_next_month(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            order = make_order(
+                self.client_people,
+                self.personnel,
+                {self.service: 100000},
+                order_at="1403/06/31",
+            )
+            models.Payment.objects.create(
+                paid_at="1403/07/02",
+                destination=self.personnel,
+                amount=10000,
+                order=order,
+            )
+
+        item = self.item(payroll.compute(1403, 6))
+        self.assertEqual((item.order_fees, item.amount), (20000, 20000))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            models.Payment.objects.create(
+                paid_at="1403/07/03",
+                destination=self.personnel,
+                amount=20000,
+                order=order,
+            )
+
+        item = self.item(payroll.compute(1403, 6))
+        self.assertEqual((item.order_fees, item.amount), (0, 0))
+        # the payments of the order are not prepayments of the next month
+        self.assertEqual(payroll.compute(1403, 7), [])
+
+    def test_settlements_are_not_paid(self):
+        today = jalali.today()
+        with self.captureOnCommitCallbacks(execute=True):
+            make_order(
+                self.client_people,
+                self.personnel,
+                {self.service: 100000},
+                order_at=today,
+            )
+
+        batch = payroll.run(today.year, today.month)
+        self.assertEqual(payroll.post(batch), 1)
+        settlement = models.Payment.objects.get(payroll_item__batch=batch)
+        self.assertEqual(
+            (settlement.paid_at, settlement.amount), (today, 30000)
+        )
+
+        # the settlement is within the month but paid by the payroll
+        item = self.item(payroll.compute(today.year, today.month))
+        self.assertEqual((item.paid, item.amount), (0, 30000))
+
+    def test_post_invalidates_previews(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            make_order(
+                self.client_people,
+                self.personnel,
+                {self.service: 100000},
+                order_at="1403/02/05",
+            )
+        batch = payroll.run(1403, 2)
+
+        builds = []
+        for _ in range(2):
+            previews.get(
+                previews.PERSONNEL,
+                self.personnel.pk,
+                lambda: builds.append(1) or {},
+            )
+        self.assertEqual(len(builds), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            payroll.post(batch)
+
+        previews.get(
+            previews.PERSONNEL,
+            self.personnel.pk,
+            lambda: builds.append(1) or {},
+        )
+        self.assertEqual(len(builds), 2)
+
+    def test_posted_batch_is_locked(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            make_order(
+                self.client_people,
+                self.personnel,
+                {self.service: 100000},
+                order_at="1403/02/05",
+            )
+        batch = payroll.run(1403, 2)
+        payroll.post(batch)
+
+        with self.assertRaises(ValidationError):
+            payroll.run(1403, 2)
+        with self.assertRaises(ValidationError):
+            payroll.post(batch)
+        self.assertEqual(models.Payment.objects.count(), 1)
+
+    def test_recompute_draft(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            make_order(
+                self.client_people,
+                self.personnel,
+                {self.service: 100000},
+                order_at="1403/02/05",
+            )
+        batch = payroll.run(1403, 2)
+
+        other = make_people("2000000002")
+        with self.captureOnCommitCallbacks(execute=True):
+            make_order(
+                self.client_people,
+                self.personnel,
+                {self.service: 200000},
+                order_at="1403/02/06",
+            )
+            make_order(
+                self.client_people,
+                other,
+                {self.service: 100000},
+                order_at="1403/02/06",
+            )
+
+        self.assertEqual(payroll.run(1403, 2).pk, batch.pk)
+        items = list(batch.items.all())
+        self.assertEqual(len(items), 2)
+        self.assertEqual(self.item(items).amount, 90000)
+        self.assertEqual(self.item(items, other).amount, 30000)
+
+
+class SearchIndexTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.client_people = make_people(
+            "1000000001", firstname="مریم", lastname="احمدی"
+        )
+        self.personnel = make_people(
+            "2000000001", firstname="زهرا", lastname="رضایی"
+        )
+        self.service = models.Service.objects.create(
+            title="تزریق", base_price=100000
+        )
+
+    def found(self, q: str, entity: str) -> set[int]:
+        return {document.object_id for document in search.query(q, entity)}
+
+    def test_people(self):
+        people = models.SearchEntityChoices.PEOPLE
+        # arabic letters and a prefix of the last name
+        self.assertEqual(
+            self.found("مريم احم", people), {self.client_people.pk}
+        )
+
+        self.client_people.lastname = "کریمی"
+        self.client_people.save()
+        self.assertEqual(self.found("احمدی", people), set())
+        self.assertEqual(self.found("کریمی", people), {self.client_people.pk})
+
+        self.client_people.delete()
+        self.assertEqual(self.found("کریمی", people), set())
+
+    def test_orders_contracts_and_payments(self):
+        entities = models.SearchEntityChoices
+        order = make_order(
+            self.client_people, self.personnel, {self.service: 100000}
+        )
+        contract = make_contract(self.client_people, self.personnel)
+        payment = models.Payment.objects.create(
+            paid_at="1403/02/02",
+            source=self.client_people,
+            amount=1000,
+            order=order,
+        )
+
+        self.assertEqual(self.found("زهرا", entities.ORDER), {order.pk})
+        self.assertEqual(self.found("تزریق", entities.ORDER), {order.pk})
+        self.assertEqual(self.found("زهرا", entities.CONTRACT), {contract.pk})
+        self.assertEqual(self.found("مریم", entities.PAYMENT), {payment.pk})
+
+        payment.delete()
+        self.assertEqual(self.found("مریم", entities.PAYMENT), set())
+        order.delete()
+        self.assertEqual(self.found("زهرا", entities.ORDER), set())
+        contract.delete()
+        self.assertEqual(self.found("زهرا", entities.CONTRACT), set())
+
+    def test_sections(self):
+        entities = models.SearchEntityChoices
+        order = make_order(
+            self.client_people, self.personnel, {self.service: 100000}
+        )
+        query = search.query
+
+        def slow_orders(q, entity=None, **kwargs):
+            if entity == entities.ORDER:
+                time.sleep(0.5)
+                return []
+            return query(q, entity, **kwargs)
+
+        sections = search.query_sections(
+            "زهرا", [entities.PEOPLE, entities.ORDER], budget=2
+        )
+        self.assertEqual(
+            [
+                ([d.object_id for d in section.documents], section.timed_out)
+                for section in sections
+            ],
+            [([self.personnel.pk], False), ([order.pk], False)],
+        )
+
+        with mock.patch.object(search, "query", slow_orders):
+            people, orders = search.query_sections(
+                "زهرا", [entities.PEOPLE, entities.ORDER], budget=0.2
+            )
+        self.assertEqual(
+            [d.object_id for d in people.documents], [self.personnel.pk]
+        )
+        self.assertFalse(people.timed_out)
+        self.assertEqual((orders.documents, orders.timed_out), ([], True))
+
+
+class SearchSectionsTests(SimpleTestCase):
+    budget = 0.3
+
+    def query_section(self, q, entity, limit, budget):
+        time.sleep(0.2)
+        return search.Section(entity, [], False, 0.2, False)
+
+    def occupy_workers(self, seconds: float) -> threading.Event:
+        # every worker is busy with other searches for the given time
+        started = threading.Barrier(search._executor._max_workers + 1)
+        done = threading.Event()
+
+        def work():
+            started.wait()
+            done.wait(seconds)
+
+        for _ in range(search._executor._max_workers):
+            search._executor.submit(work)
+        started.wait()
+        return done
+
+    def test_budget_starts_with_the_worker(self):
+        done = self.occupy_workers(0.2)
+        with mock.patch.object(search, "_query_section", self.query_section):
+            sections = search.query_sections(
+                "علی", ["order", "contract"], budget=self.budget
+            )
+        done.set()
+
+        self.assertEqual(
+            [section.timed_out for section in sections], [False, False]
+        )
+
+    def test_queued_sections_are_given_up(self):
+        done = self.occupy_workers(5)
+        began = time.monotonic()
+        with mock.patch.object(search, "_query_section", self.query_section):
+            sections = asyncio.run(
+                search.aquery_sections(
+                    "علی", ["order", "contract"], budget=self.budget
+                )
+            )
+        elapsed = time.monotonic() - began
+        done.set()
+
+        self.assertEqual(
+            [section.timed_out for section in sections], [True, True]
+        )
+        self.assertLess(elapsed, 2 * self.budget)
+
+
+class PreviewPageTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.people = make_people("1000000001")
+        self.order = make_order(self.people, make_people("2000000001"), {})
+        self.notes = 0
+        for _ in range(5):
+            self.call()
+
+    def call(self) -> models.Call:
+        self.notes += 1
+        with self.captureOnCommitCallbacks(execute=True):
+            return models.Call.objects.create(
+                called_at="1403/02/01",
+                from_people=self.people,
+                call_direction=models.CallTypeChoices.RECEIVED,
+                response_status=models.StatusChoices.ANSWERED,
+                order=self.order,
+                note=f"call {self.notes}",
+            )
+
+    def page(self, after=None) -> tuple[list[str], int | None]:
+        params = {"section": "calls", "limit": 2}
+        if after is not None:
+            params["after"] = after
+        response = self.client.get(f"/crm/api/orders/{self.order.pk}/", params)
+        payload = response.json()
+        return [row["note"]["value"] for row in payload["data"]], payload[
+            "next"
+        ]
+
+    def test_rows_changed_between_pages(self):
+        notes, after = self.page()
+        self.assertEqual(notes, ["call 1", "call 2"])
+
+        # an offset would skip a row after the deletion
+        with self.captureOnCommitCallbacks(execute=True):
+            models.Call.objects.filter(note="call 1").delete()
+        self.call()
+        pages = [notes]
+        while after is not None:
+            notes, after = self.page(after)
+            pages.append(notes)
+            if len(pages) == 2:
+                self.call()
+
+        self.assertEqual(
+            pages,
+            [
+                ["call 1", "call 2"],
+                ["call 3", "call 4"],
+                ["call 5", "call 6"],
+                ["call 7"],
+            ],
+        )
+
+    def test_bad_cursor(self):
+        response = self.client.get(
+            f"/crm/api/orders/{self.order.pk}/",
+            {"section": "calls", "after": "x"},
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(
+    CACHES={
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    }
+)
+class PreviewQueriesTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client_type = models.Catalog.objects.create(
+            code="TYP_CLIENT", title="کارفرما"
+        )
+        self.personnel_type = models.Catalog.objects.create(
+            code="TYP_PERSONNEL", title="پرسنل"
+        )
+        self.service = models.Service.objects.create(
+            title="تزریق", base_price=100000
+        )
+
+    def make_history(self, index: int, count: int) -> tuple:
+        client = make_people(f"10000000{index:02d}")
+        client.types.add(self.client_type)
+        personnel = make_people(f"20000000{index:02d}")
+        personnel.types.add(self.personnel_type)
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(count):
+                order = make_order(client, personnel, {self.service: 100000})
+                make_contract(client, personnel)
+                models.Payment.objects.create(
+                    paid_at="1403/02/02",
+                    source=client,
+                    amount=1000,
+                    order=order,
+                )
+
+        return client, personnel
+
+    def queries(self, path: str) -> int:
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(path).status_code, 200)
+        return len(queries)
+
+    def test_constant_queries(self):
+        one = self.make_history(1, 1)
+        ten = self.make_history(2, 10)
+
+        for entity, index in (("clients", 0), ("personnel", 1)):
+            for section in ("", "?section=orders", "?section=contracts"):
+                with self.subTest(entity=entity, section=section):
+                    path = f"/crm/api/{entity}/{{}}/{section}"
+                    count = self.queries(path.format(one[index].pk))
+                    with self.assertNumQueries(count):
+                        self.client.get(path.format(ten[index].pk))
+
+        # totals are read from the summaries
+        table = self.client.get(f"/crm/api/clients/{ten[0].pk}/").json()[
+            "table"
+        ]
+        self.assertEqual(table["total_client_orders"]["value"], 10)
+        self.assertEqual(table["total_client_contracts"]["value"], 10)
+
+    def test_service_orders(self):
+        self.make_history(1, 1)
+        path = f"/crm/api/services/{self.service.pk}/?section=orders"
+        count = self.queries(path)
+
+        self.make_history(2, 10)
+        with self.assertNumQueries(count):
+            response = self.client.get(path)
+        rows = response.json()["data"]
+        self.assertEqual(len(rows), 11)
+        self.assertEqual(rows[0]["service_cost"]["value"], "100,000")
+
+
+class AsyncPreviewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_missing_order(self):
+        for path in ["/crm/api/orders/1/", "/crm/api/async/orders/1/"]:
+            with self.subTest(path=path):
+                response = self.client.get(path)
+                self.assertEqual(response.status_code, 404)
+                self.assertEqual(response.json(), {"detail": "Not found."})
+
+
+class DailyRollupSeriesTests(TestCase):
+    def setUp(self):
+        for day, orders, income in [
+            ((1403, 12, 25), 1, 100),
+            ((1403, 12, 30), 2, 200),
+            ((1404, 1, 1), 4, 400),
+            ((1404, 2, 10), 8, 800),
+        ]:
+            models.DailyRollup.objects.create(
+                day=jalali.from_parts(*day), orders=orders, income=income
+            )
+
+    def totals(self, granularity: str, start, end) -> list[tuple]:
+        return [
+            (period["period"], period["start"], period["end"])
+            + (period["orders"], period["income"])
+            for period in models.DailyRollup.series(
+                jalali.from_parts(*start), jalali.from_parts(*end), granularity
+            )
+        ]
+
+    def test_weeks_across_new_year(self):
+        # 1403/12/25 is a saturday, its week holds the new year
+        self.assertEqual(
+            self.totals("week", (1403, 12, 26), (1404, 1, 10)),
+            [
+                ("1403/12/25", "1403/12/26", "1404/01/01", 6, 600),
+                ("1404/01/02", "1404/01/02", "1404/01/08", 0, 0),
+                ("1404/01/09", "1404/01/09", "1404/01/10", 0, 0),
+            ],
+        )
+
+    def test_months_and_years(self):
+        self.assertEqual(
+            self.totals("month", (1403, 12, 1), (1404, 2, 5)),
+            [
+                ("1403/12", "1403/12/01", "1403/12/30", 3, 300),
+                ("1404/01", "1404/01/01", "1404/01/31", 4, 400),
+                ("1404/02", "1404/02/01", "1404/02/05", 0, 0),
+            ],
+        )
+        self.assertEqual(
+            self.totals("year", (1403, 6, 1), (1404, 12, 29)),
+            [
+                ("1403", "1403/06/01", "1403/12/30", 3, 300),
+                ("1404", "1404/01/01", "1404/12/29", 12, 1200),
+            ],
+        )
+
+    def test_days(self):
+        self.assertEqual(
+            self.totals("day", (1403, 12, 30), (1404, 1, 2)),
+            [
+                ("1403/12/30", "1403/12/30", "1403/12/30", 2, 200),
+                ("1404/01/01", "1404/01/01", "1404/01/01", 4, 400),
+                ("1404/01/02", "1404/01/02", "1404/01/02", 0, 0),
+            ],
+        )
+
+
+class JalaliDayReportTests(TestCase):
+    def setUp(self):
+        # 1404/01/01 is a friday, 1404/01/02 becomes a holiday
+        with self.captureOnCommitCallbacks(execute=True):
+            models.Holiday.objects.create(
+                date=jalali.from_parts(1404, 1, 2), title="نوروز"
+            )
+        for day in [
+            (1403, 12, 29),
+            (1403, 12, 30),
+            (1404, 1, 1),
+            (1404, 1, 2),
+        ]:
+            models.Call.objects.create(called_at=jalali.from_parts(*day))
+        models.Call.objects.create(called_at=jalali.from_parts(1404, 1, 3))
+
+    def report(self, period: str) -> list[dict]:
+        return models.JalaliDay.report(
+            models.Call.objects,
+            "called_day",
+            period,
+            calls=Count("pk"),
+            holiday_calls=Count("pk", filter=Q(called_day__is_holiday=True)),
+        )
+
+    def test_months(self):
+        self.assertEqual(
+            self.report(models.ReportPeriodChoices.MONTH),
+            [
+                dict(
+                    period="1403/12",
+                    year=1403,
+                    month=12,
+                    calls=2,
+                    holiday_calls=0,
+                ),
+                dict(
+                    period="1404/01",
+                    year=1404,
+                    month=1,
+                    calls=3,
+                    holiday_calls=2,
+                ),
+            ],
+        )
+
+    def test_weeks_and_years(self):
+        # weeks are numbered per year, the new year starts its first week
+        self.assertEqual(
+            [
+                (row["period"], row["calls"], row["holiday_calls"])
+                for row in self.report(models.ReportPeriodChoices.WEEK)
+            ],
+            [("1403/W53", 2, 0), ("1404/W01", 1, 1), ("1404/W02", 2, 1)],
+        )
+        self.assertEqual(
+            [
+                (row["period"], row["calls"], row["holiday_calls"])
+                for row in self.report(models.ReportPeriodChoices.YEAR)
+            ],
+            [("1403", 2, 0), ("1404", 3, 2)],
+        )
+
+
+class TypeaheadTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.people = make_people(
+            "1000000001", firstname="مریم", lastname="کریمی"
+        )
+        self.service = models.Service.objects.create(
+            title="کشیدن بخیه", base_price=100000
+        )
+        self.catalog = models.Catalog.objects.create(
+            code="SPC_KIDS", title="کودکان"
+        )
+
+    def suggest(self, q: str, **params) -> list[tuple]:
+        response = self.client.get("/crm/api/typeahead/", {"q": q, **params})
+        self.assertEqual(response.status_code, 200)
+        return [
+            (result["type"], result["id"])
+            for result in response.json()["results"]
+        ]
+
+    def test_prefixes(self):
+        people = ("people", self.people.pk)
+        # arabic letters, a last name and a full name
+        self.assertEqual(self.suggest("مري"), [people])
+        self.assertEqual(self.suggest("كريم"), [people])
+        self.assertEqual(self.suggest("مریم کر"), [people])
+        self.assertEqual(
+            self.suggest("ک"),
+            [
+                people,
+                ("service", self.service.pk),
+                ("catalog", self.catalog.pk),
+            ],
+        )
+        self.assertEqual(self.suggest("ک", limit=1), [people])
+        self.assertEqual(
+            self.suggest("ک", type="catalog"), [("catalog", self.catalog.pk)]
+        )
+        self.assertEqual(self.suggest(" "), [])
+
+    def test_unknown_type(self):
+        response = self.client.get(
+            "/crm/api/typeahead/", {"q": "ک", "type": "order"}
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_renamed(self):
+        self.assertEqual(self.suggest("کشیدن"), [("service", self.service.pk)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.service.title = "پانسمان"
+            self.service.save()
+        self.assertEqual(self.suggest("کشیدن"), [])
+        self.assertEqual(self.suggest("پانس"), [("service", self.service.pk)])
+
+
+class TrigramIndexTests(SimpleTestCase):
+    def test_misspelled_names(self):
+        index = fuzzy.TrigramIndex(
+            [
+                ("people", 1, "محمدرضا احمدی"),
+                ("people", 2, "مریم رضایی"),
+                ("referral", 3, "بیمارستان میلاد"),
+            ]
+        )
+
+        def search(text: str) -> list[tuple]:
+            return [
+                (match.entity, match.id)
+                for match in index.search(text, 5, time.monotonic() + 1)
+            ]
+
+        # a missing letter, a swapped letter and arabic letters
+        self.assertEqual(search("محمدرضا احمد"), [("people", 1)])
+        self.assertEqual(search("مریم رزایی"), [("people", 2)])
+        self.assertEqual(search("بيمارستان ميلاد"), [("referral", 3)])
+        self.assertEqual(search("سارا"), [])
+
+
+class SimilarNamesTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        fuzzy._index.update(version=None, index=None)
+
+    def built(self):
+        # the builder runs one index at a time, in order
+        fuzzy._builder.submit(lambda: None).result()
+
+    def names(self, text: str) -> list[str]:
+        return [match.name for match in fuzzy.similar_names(text)]
+
+    def test_built_in_the_background(self):
+        make_people("1000000001", firstname="مریم", lastname="احمدی")
+
+        # no suggestion until the names are indexed
+        self.assertEqual(self.names("مریم احمدی"), [])
+        self.built()
+        self.assertEqual(self.names("مریم احمدی"), ["مریم احمدی"])
+
+        people = make_people("1000000002", firstname="زهرا", lastname="رضایی")
+        # the previous index is used while the new one is built
+        self.assertEqual(self.names("زهرا رضایی"), [])
+        self.built()
+        self.assertEqual(self.names("زهرا رضایی"), ["زهرا رضایی"])
+
+        people.lastname = "رضوی"
+        people.save()
+        self.names("زهرا رضوی")
+        self.built()
+        self.assertEqual(self.names("زهرا رضوی"), ["زهرا رضوی"])
+
+    def test_endpoint(self):
+        make_people("1000000001", firstname="مریم", lastname="احمدی")
+        self.names("مریم احمدی")
+        self.built()
+
+        response = self.client.get("/crm/search/similar/", {"q": "مریم احمدي"})
+        (result,) = response.json()["results"]
+        self.assertEqual(result["name"], "مریم احمدی")
+        response = self.client.get("/crm/search/similar/", {"q": "مرین احمد"})
+        self.assertEqual(
+            [result["name"] for result in response.json()["results"]],
+            ["مریم احمدی"],
+        )
+
+
+class VisitsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.contract = make_contract(
+            make_people("1000000001"),
+            make_people("2000000001"),
+            start="1403/02/01",
+            end="1403/02/31",
+        )
+        self.start = jalali.from_parts(1403, 2, 1)
+        self.holiday = jalali.from_parts(1403, 2, 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            visits.generate(start=self.start, days=31)
+
+    def dates(self) -> set:
+        return set(self.contract.visits.values_list("date", flat=True))
+
+    def test_holidays_are_left_to_the_job(self):
+        self.assertIn(self.holiday, self.dates())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.contract.include_holidays = False
+            self.contract.save()
+            models.Holiday.objects.create(date=self.holiday, title="تعطیل")
+        # the visits of the contract follow it, the holiday waits
+        self.assertIn(self.holiday, self.dates())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command(
+                "generate_visits",
+                "--pending",
+                "--start=1403/02/01",
+                "--days=31",
+                stdout=io.StringIO(),
+            )
+        self.assertNotIn(self.holiday, self.dates())
+        self.assertFalse(visits.take_holidays_changed())
+
+    def test_stale_visits(self):
+        today = jalali.today()
+        self.contract.start = today - datetime.timedelta(days=10)
+        self.contract.end = today + datetime.timedelta(days=10)
+        self.contract.include_holidays = True
+        with self.captureOnCommitCallbacks(execute=True):
+            self.contract.save()
+        self.assertTrue(
+            models.AgendaSnapshot.objects.filter(date=today).exists()
+        )
+
+        weekday = today.weekday()
+        # the weekday fields of contracts start with saturday
+        setattr(self.contract, workdays.WEEKDAYS[weekday], False)
+        self.contract.save(update_fields=[workdays.WEEKDAYS[weekday]])
+        with self.captureOnCommitCallbacks(execute=True):
+            written, removed = visits.generate([self.contract.pk])
+
+        self.assertEqual(written, 0)
+        self.assertGreater(removed, 0)
+        self.assertNotIn(today, self.dates())
+        # the agenda of the deleted visit was refreshed by its receiver
+        self.assertFalse(
+            models.AgendaSnapshot.objects.filter(date=today).exists()
+        )
+
+
+class AgendaTests(TestCase):
+    def setUp(self):
+        self.client_people = make_people("1000000001")
+        self.personnel = make_people("2000000001")
+        self.path = f"/crm/api/personnel/{self.personnel.pk}/agenda/"
+        with self.captureOnCommitCallbacks(execute=True):
+            make_order(
+                self.client_people, self.personnel, {}, order_at=jalali.today()
+            )
+
+    def test_etag(self):
+        response = self.client.get(self.path)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["items"]), 1)
+        etag = response["ETag"]
+
+        response = self.client.get(self.path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+        response = self.client.get(
+            self.path, HTTP_IF_NONE_MATCH=f'"stale", {etag}'
+        )
+        self.assertEqual(response.status_code, 304)
+
+        # a new order of the day changes the agenda and its etag
+        with self.captureOnCommitCallbacks(execute=True):
+            make_order(
+                self.client_people, self.personnel, {}, order_at=jalali.today()
+            )
+        response = self.client.get(self.path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["items"]), 2)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_empty_day(self):
+        tomorrow = jalali.today() + datetime.timedelta(days=1)
+        response = self.client.get(self.path, {"date": str(tomorrow)})
+        self.assertEqual(response.json(), {"date": str(tomorrow), "items": []})
+
+        response = self.client.get(
+            self.path,
+            {"date": str(tomorrow)},
+            HTTP_IF_NONE_MATCH=response["ETag"],
+        )
+        self.assertEqual(response.status_code, 304)
+
+
+class SectionTableTests(TestCase):
+    path = "/crm/api/tables/services/services/"
+
+    def setUp(self):
+        for title, base_price in [
+            ("تزریق", 300000),
+            ("پانسمان", 100000),
+            ("سرم تراپی", 200000),
+            ("تزریق عضلانی", 50000),
+        ]:
+            models.Service.objects.create(title=title, base_price=base_price)
+
+    def serve(self, **params) -> dict:
+        response = self.client.get(self.path, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def titles(self, payload: dict) -> list[str]:
+        return [row["0"] for row in payload["data"]]
+
+    def test_ordering_and_pages(self):
+        params = {"order[0][column]": 2, "order[0][dir]": "asc", "length": 2}
+        payload = self.serve(draw=3, **params)
+        self.assertEqual(payload["draw"], 3)
+        self.assertEqual(payload["recordsTotal"], 4)
+        self.assertEqual(payload["recordsFiltered"], 4)
+        self.assertEqual(self.titles(payload), ["تزریق عضلانی", "پانسمان"])
+        service = models.Service.objects.get(title="تزریق عضلانی")
+        self.assertEqual(
+            payload["data"][0]["DT_RowAttr"],
+            {"data-link": service.get_absolute_url_api()},
+        )
+
+        payload = self.serve(draw=4, start=2, **params)
+        self.assertEqual(payload["draw"], 4)
+        self.assertEqual(self.titles(payload), ["سرم تراپی", "تزریق"])
+
+        # columns out of range fall back to the newest first
+        payload = self.serve(**{"order[0][column]": 9, "order[0][dir]": "asc"})
+        self.assertEqual(
+            self.titles(payload),
+            ["تزریق عضلانی", "سرم تراپی", "پانسمان", "تزریق"],
+        )
+
+    def test_search(self):
+        # arabic yeh is searched as the persian one
+        payload = self.serve(
+            draw=1,
+            **{
+                "search[value]": "تزريق",
+                "order[0][column]": 2,
+                "order[0][dir]": "desc",
+            },
+        )
+        self.assertEqual(payload["recordsTotal"], 4)
+        self.assertEqual(payload["recordsFiltered"], 2)
+        self.assertEqual(self.titles(payload), ["تزریق", "تزریق عضلانی"])
+
+        payload = self.serve(**{"search[value]": "تزریق پانسمان"})
+        self.assertEqual(payload["recordsFiltered"], 0)
+        self.assertEqual(payload["data"], [])
+
+    def test_unknown_tab(self):
+        response = self.client.get("/crm/api/tables/services/nothing/")
+        self.assertEqual(response.status_code, 404)
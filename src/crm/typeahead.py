@@ -0,0 +1,143 @@
+import hashlib
+
+from django.core.cache import cache
+from django.db.models import Prefetch, Q, QuerySet
+from django.urls import reverse
+
+from . import models, utils
+from .models import SearchEntityChoices as sec
+
+CATALOG = "catalog"
+
+CACHE_TIMEOUT = 30
+_CACHE_NAME = "typeahead"
+
+
+def invalidate():
+    """
+    Dropping every cached suggestion, called whenever a suggested name
+    is created, renamed or removed.
+    """
+
+    utils.invalidate_cache_version(_CACHE_NAME)
+
+
+def _prefix_lookups(prefix: str) -> Q:
+    lookups = Q(firstname_normalized__startswith=prefix) | Q(
+        lastname_normalized__startswith=prefix
+    )
+
+    # "firstname lastname" typed in full
+    firstname, _, lastname = prefix.partition(" ")
+    if lastname:
+        lookups |= Q(
+            firstname_normalized=firstname,
+            lastname_normalized__startswith=lastname,
+        )
+
+    return lookups
+
+
+def _people(prefix: str, limit: int) -> list[dict]:
+    people: QuerySet = (
+        models.People.objects.filter(_prefix_lookups(prefix))
+        .only("pk", "firstname", "lastname", "gender")
+        .prefetch_related(
+            Prefetch("types", models.Catalog.objects.only("pk", "title"))
+        )
+        .order_by("lastname_normalized", "firstname_normalized", "pk")
+    )
+
+    results = []
+    for person in people[:limit]:
+        try:
+            link = person.get_absolute_url_api()
+        except IndexError:
+            # people without any type do not have a preview
+            link = ""
+
+        results.append(
+            dict(
+                type=sec.PEOPLE.value,
+                id=person.pk,
+                name=person.fullname_with_prefix,
+                link=link,
+            )
+        )
+
+    return results
+
+
+def _services(prefix: str, limit: int) -> list[dict]:
+    services = (
+        models.Service.objects.filter(title_normalized__startswith=prefix)
+        .values_list("pk", "title")
+        .order_by("title_normalized", "pk")
+    )
+
+    return [
+        dict(
+            type=sec.SERVICE.value,
+            id=pk,
+            name=title,
+            link=reverse("crm:service_preview", kwargs={"id": pk}),
+        )
+        for pk, title in services[:limit]
+    ]
+
+
+def _catalogs(prefix: str, limit: int) -> list[dict]:
+    catalogs = (
+        models.Catalog.objects.filter(title_normalized__startswith=prefix)
+        .values_list("pk", "title")
+        .order_by("title_normalized", "pk")
+    )
+
+    return [
+        dict(type=CATALOG, id=pk, name=title, link="")
+        for pk, title in catalogs[:limit]
+    ]
+
+
+_SOURCES = {
+    sec.PEOPLE.value: _people,
+    sec.SERVICE.value: _services,
+    CATALOG: _catalogs,
+}
+TYPES = list(_SOURCES)
+
+
+def suggest(text: str, limit: int = 8, types: list[str] = TYPES) -> list[dict]:
+    """
+    Suggesting names which start with the typed text, served by the
+    indexes of normalized columns and cached for a short while.
+
+    Args:
+        text: Text typed in the search box so far.
+        limit: Maximum number of suggestions.
+        types: Types of suggested objects, in the order they are listed.
+
+    Returns:
+        Type, id, display name and preview link of each suggestion.
+    """
+
+    prefix = utils.normalize_persian(text)
+    if not prefix:
+        return []
+
+    # typed text may contain spaces, which some cache backends reject
+    digest = hashlib.md5(prefix.encode()).hexdigest()
+    version = utils.get_cache_version(_CACHE_NAME)
+    key = f"{_CACHE_NAME}:{version}:{','.join(types)}:{limit}:{digest}"
+    results = cache.get(key)
+    if results is not None:
+        return results
+
+    results = []
+    for type in types:
+        results.extend(_SOURCES[type](prefix, limit - len(results)))
+        if len(results) >= limit:
+            break
+
+    cache.set(key, results, CACHE_TIMEOUT)
+    return results
@@ -33,14 +33,33 @@ urlpatterns = [
     path("people/patient/<int:id>/delete/", views.delete_patient, name="delete_patient"),
     
     # REST
+    path("api/tables/<str:section>/<str:tab>/", views.section_table, name="section_table"),
+    path("api/dashboard/series/", views.dashboard_series, name="dashboard_series"),
+    path("api/reports/periods/<str:report>/", views.period_report, name="period_report"),
+    path("api/payroll/<int:year>/<int:month>/", views.payroll_batch, name="payroll_batch"),
+    path("api/payroll/<int:year>/<int:month>/post/", views.post_payroll_batch, name="post_payroll_batch"),
     # previews
     path("search/", views.search, name="search"),
+    path("search/similar/", views.similar_names, name="similar_names"),
+    path("api/typeahead/", views.typeahead_suggestions, name="typeahead"),
     path("api/orders/<int:id>/", views.order_preview, name="order_preview"),
     path("api/contracts/<int:id>/", views.contract_preview, name="contract_preview"),
+    path("api/contracts/<int:id>/shift-days/", views.contract_shift_days, name="contract_shift_days"),
     path("api/clients/<int:id>/", views.client_preview, name="client_preview"),
+    path("api/personnel/matches/", views.personnel_matches, name="personnel_matches"),
     path("api/personnel/<int:id>/", views.personnel_preview, name="personnel_preview"),
+    path("api/personnel/<int:id>/agenda/", views.personnel_agenda, name="personnel_agenda"),
+    path("api/personnel/<int:id>/availability/", views.personnel_availability, name="personnel_availability"),
     path("api/patients/<int:id>/", views.patient_preview, name="patient_preview"),
     path("api/services/<int:id>/", views.service_preview, name="service_preview"),
+    path("api/previews/", views.preview_batch, name="preview_batch"),
+    path("api/async/orders/<int:id>/", views.preview_async, {"entity": "order"}, name="order_preview_async"),
+    path("api/async/contracts/<int:id>/", views.preview_async, {"entity": "contract"}, name="contract_preview_async"),
+    path("api/async/clients/<int:id>/", views.preview_async, {"entity": "client"}, name="client_preview_async"),
+    path("api/async/personnel/<int:id>/", views.preview_async, {"entity": "personnel"}, name="personnel_preview_async"),
+    path("api/async/patients/<int:id>/", views.preview_async, {"entity": "patient"}, name="patient_preview_async"),
+    path("api/async/search/", views.search_async, name="search_async"),
+    path("api/previews/stats/", views.preview_stats, name="preview_stats"),
     # previews end
 
     # Form related
@@ -1,11 +1,132 @@
+import datetime
+import re
+import time
+from contextlib import contextmanager
 from math import ceil
+from typing import Iterable
 
 import jdatetime
-from django.db.models import QuerySet
+from django.core.cache import cache
+from django.db import connection, transaction
 from rest_framework.response import Response
 from rest_framework.serializers import ValidationError
 from rest_framework.status import HTTP_400_BAD_REQUEST
 
+from . import jalali
+from .jalali import JDate
+
+
+_PERSIAN_TRANSLATION = str.maketrans(
+    {
+        # arabic letters typed by arabic keyboards and old systems
+        "ي": "ی",
+        "ى": "ی",
+        "ئ": "ی",
+        "ك": "ک",
+        "ة": "ه",
+        "ۀ": "ه",
+        "أ": "ا",
+        "إ": "ا",
+        "ٱ": "ا",
+        "ؤ": "و",
+        # zero width non-joiner and joiner
+        "\u200c": " ",
+        "\u200d": "",
+        # tatweel and diacritics
+        "ـ": "",
+        **{chr(code): "" for code in range(0x064B, 0x0653)},
+        # persian and arabic digits
+        **{chr(0x06F0 + digit): str(digit) for digit in range(10)},
+        **{chr(0x0660 + digit): str(digit) for digit in range(10)},
+    }
+)
+_SPACES_RE = re.compile(r"\s+")
+
+
+def normalize_persian(text: str) -> str:
+    """
+    Normalizing the given text into the form stored in normalized
+    columns and search documents, so different spellings of the same
+    persian text compare equal.
+
+    Args:
+        text: Raw text typed by the user.
+
+    Returns:
+        Lowercase text with persian letters and latin digits, zero width
+        non-joiners replaced by space and whitespaces collapsed.
+    """
+
+    if not text:
+        return ""
+
+    text = str(text).translate(_PERSIAN_TRANSLATION).lower()
+    return _SPACES_RE.sub(" ", text).strip()
+
+
+@contextmanager
+def statement_timeout(seconds: float):
+    """
+    Cancelling queries of the block which run longer than the given
+    seconds, by raising django.db.OperationalError. Only PostgreSQL
+    supports it, on other databases the block runs unbounded.
+    """
+
+    if connection.vendor != "postgresql":
+        yield
+        return
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            "SET LOCAL statement_timeout = %s", [max(int(seconds * 1000), 1)]
+        )
+        yield
+        # an outer transaction would otherwise keep the timeout
+        cursor.execute("SET LOCAL statement_timeout = DEFAULT")
+
+
+def get_cache_version(name: str) -> int:
+    """
+    Current version of a group of cached values, which has to be part of
+    their cache keys.
+    """
+
+    # a lost version starts over from the clock, above every version the
+    # group had before, so old entries are never read again
+    return cache.get_or_set(f"{name}:version", time.time_ns, timeout=None)
+
+
+def get_cache_versions(names: Iterable[str]) -> dict[str, int]:
+    """
+    Current versions of many groups of cached values keyed by name, see
+    get_cache_version, with a single round trip for the cached ones.
+    """
+
+    keys = {f"{name}:version": name for name in names}
+    found = cache.get_many(keys)
+    return {
+        name: found[key] if key in found else get_cache_version(name)
+        for key, name in keys.items()
+    }
+
+
+def invalidate_cache_version(name: str) -> int:
+    """
+    Dropping every cached value of the group by moving to a new version,
+    old entries are never read again and expire by themselves.
+
+    Returns:
+        The new version, which no other invalidation returns.
+    """
+
+    try:
+        return cache.incr(f"{name}:version")
+    except ValueError:
+        # the version was evicted, it starts over from the clock
+        version = get_cache_version(name) + 1
+        cache.set(f"{name}:version", version, None)
+        return version
+
 
 def get_diff_in_percentage(now: int, before: int) -> float:
     assert isinstance(now, int)
@@ -17,9 +138,48 @@ def get_diff_in_percentage(now: int, before: int) -> float:
         return None
 
 
-def gdate_to_jdate(date: jdatetime.date) -> str:
-    jdate = jdatetime.GregorianToJalali(date.year, date.month, date.day)
-    return f"{jdate.jyear}/{jdate.jmonth}/{jdate.jday}"
+_JDATE_RE = re.compile(r"^(\d{4})[/-](\d{1,2})[/-](\d{1,2})$")
+
+
+def parse_jdate(value) -> JDate:
+    """
+    Converting the given value into a jalali date.
+
+    Args:
+        value: Jalali date string like 1402/05/06 or 1402/5/6, in persian
+            or latin digits, a jalali date or a gregorian date.
+
+    Raises:
+        ValueError: The value is not a valid date.
+    """
+
+    if isinstance(value, JDate):
+        return value
+
+    if isinstance(value, (jdatetime.date, datetime.date)):
+        return jalali.from_ordinal(jalali.to_ordinal(value))
+
+    match = _JDATE_RE.match(normalize_persian(value))
+    if match is None:
+        raise ValueError(f"invalid jalali date: {value!r}")
+
+    return jalali.from_parts(*(int(part) for part in match.groups()))
+
+
+def to_int(value, default: int) -> int:
+    """
+    Converting the given request parameter into an integer, missing or
+    malformed values fall back to the default.
+    """
+
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def gdate_to_jdate(date: datetime.date) -> str:
+    return str(parse_jdate(date))
 
 
 def get_month_start_end(
@@ -29,16 +189,11 @@ def get_month_start_end(
     get_month_start_end(2) returns  (1402/03/06, 1402/04/06)
     """
     assert month_count != 0
-    start = jdatetime.datetime.now() - jdatetime.timedelta(
-        days=30 * month_count
-    )
-    end = jdatetime.datetime.now() - jdatetime.timedelta(
-        days=30 * (month_count - 1)
-    )
-
-    format = "%Y/%m/%d"
+    today = jalali.today()
+    start = today - datetime.timedelta(days=30 * month_count)
+    end = today - datetime.timedelta(days=30 * (month_count - 1))
 
-    return start.strftime(format), end.strftime(format)
+    return start, end
 
 
 def make_dashboard_card_data(
@@ -54,14 +209,24 @@ def make_dashboard_card_data(
 
 
 def make_section_tab(
-    name, title, datatable_headers: list[str], qs: QuerySet, table_template: str
+    name, title, datatable_columns: list[tuple[str, bool]], url: str
 ) -> dict:
+    """
+    Args:
+        name: Tab name, used for selecting the tab by url.
+        title: Displayed title of the tab.
+        datatable_columns: Header and orderability of each column.
+        url: Server-side endpoint which serves the rows page by page.
+    """
+
     return dict(
         name=name,
         title=title,
-        data_table_headers=datatable_headers,
-        qs=qs,
-        table_template=table_template,
+        data_table_columns=[
+            dict(header=header, orderable=orderable)
+            for header, orderable in datatable_columns
+        ],
+        url=url,
     )
 
 
@@ -123,8 +288,7 @@ def translate_serializer_fields(
 
 
 def is_leap_year(year: int) -> bool:
-    leap_year_consts = (1, 5, 9, 13, 17, 22, 26, 30)
-    return year % 33 in leap_year_consts
+    return jalali.is_leap(year)
 
 
 def get_last_day_of_month(date_obj: jdatetime.date) -> int:
@@ -138,24 +302,7 @@ def get_last_day_of_month(date_obj: jdatetime.date) -> int:
         last day of the given month.
     """
 
-    if date_obj.month in (1, 2, 3, 4, 5, 6):
-        return 31
-
-    if date_obj.month == 12:
-        # leap year
-        if is_leap_year(date_obj.year):
-            return 30
-        return 29
-
-    return 30
-
-
-def create_jdate_from_str(str_date: str) -> jdatetime.date:
-    return jdatetime.date(
-        int(str_date.split("/")[0]),
-        int(str_date.split("/")[1]),
-        int(str_date.split("/")[2]),
-    )
+    return jalali.days_in_month(date_obj.year, date_obj.month)
 
 
 def calculate_time_between_2dates(
@@ -270,17 +417,14 @@ def raise_validation_err(code: str, value: str):
     raise ValidationError({"code": code, "value": value})
 
 
-def calculate_age(birthdate: str):
-    birth_year = int(birthdate.split("/")[0])
-    birth_month = int(birthdate.split("/")[1])
-    birth_day = int(birthdate.split("/")[2])
-
-    today = jdatetime.date.today()
+def calculate_age(birthdate: jdatetime.date | str):
+    birthdate = parse_jdate(birthdate)
+    today = jalali.today()
 
     return (
         today.year
-        - birth_year
+        - birthdate.year
         # 10 - True = 9, so if you were born on 03/01 and today is 02/01
         # you have not completed today's age yet.
-        - ((today.month, today.day) < (birth_month, birth_day))
+        - ((today.month, today.day) < (birthdate.month, birthdate.day))
     )
@@ -1,32 +1,37 @@
-from django.db.models import Q, Sum
+import asyncio
+import datetime
+import functools
+import time
+from typing import Optional
+
+from django.db.models import F, Prefetch, Q
+from django.http import Http404, HttpResponse, JsonResponse
 from django.shortcuts import get_object_or_404, render
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.decorators import api_view
+from rest_framework.exceptions import APIException, NotFound
 from rest_framework.response import Response
 
-from . import models
+from . import dashboard, fuzzy, jalali, matching, models, payroll, plans
+from . import previews, reports, schedule
+from . import search as search_index
 from . import serializers as s
-from . import utils, validators
+from . import tables, typeahead, utils, validators, workdays
 
+# about ten years, the series is built day by day
+_MAX_SERIES_DAYS = 3660
 
-def dashboard_section(request):
-    # fmt: off
-    one_month_ago_client_number = models.People.get_clients_in_months_ago(1).count() # noqa: E501
-    two_month_ago_client_number = models.People.get_clients_in_months_ago(2).count() # noqa: E501
-
-    one_month_ago_calls_number = models.Call.get_all_calls_in_months_ago(1).count() # noqa: E501
-    two_month_ago_calls_number = models.Call.get_all_calls_in_months_ago(2).count() # noqa: E501
-
-    one_month_ago_order_number = models.Order.get_orders_in_month_ago(1).count() # noqa: E501
-    two_month_ago_order_number = models.Order.get_orders_in_month_ago(2).count() # noqa: E501
 
-    one_month_ago_contract_number = models.Contract.get_contracts_in_month_ago(1).count() # noqa: E501
-    two_month_ago_contract_number = models.Contract.get_contracts_in_month_ago(2).count() # noqa: E501
-
-    income_past_month = models.Payment.get_incomes_in_months_ago(1).aggregate(Sum("amount"))["amount__sum"] # noqa: E501
-    income_past_2_month = models.Payment.get_incomes_in_months_ago(2).aggregate(Sum("amount"))["amount__sum"] # noqa: E501
-    # fmt: on
+def dashboard_section(request):
+    stats = dashboard.dashboard_stats()
+    one_month_ago_client_number, two_month_ago_client_number = stats["clients"]
+    one_month_ago_calls_number, two_month_ago_calls_number = stats["calls"]
+    one_month_ago_order_number, two_month_ago_order_number = stats["orders"]
+    one_month_ago_contract_number, two_month_ago_contract_number = stats[
+        "contracts"
+    ]
+    income_past_month, income_past_2_month = stats["incomes"]
 
     card_stats = [
         utils.make_dashboard_card_data(
@@ -81,32 +86,249 @@ def dashboard_section(request):
     )
 
 
+@api_view(["GET"])
+def dashboard_series(request):
+    granularity = request.GET.get("granularity") or "day"
+    if granularity not in models.RollupGranularityChoices.values:
+        return Response(status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        end = utils.parse_jdate(request.GET.get("end") or jalali.today())
+        start = utils.parse_jdate(
+            request.GET.get("start") or end - datetime.timedelta(days=29)
+        )
+    except ValueError:
+        return Response(status=status.HTTP_400_BAD_REQUEST)
+
+    if not 0 <= (end - start).days < _MAX_SERIES_DAYS:
+        return Response(status=status.HTTP_400_BAD_REQUEST)
+
+    return Response(
+        {
+            "granularity": granularity,
+            "series": models.DailyRollup.series(start, end, granularity),
+        }
+    )
+
+
+@api_view(["GET"])
+def personnel_matches(request):
+    try:
+        skills = {}
+        for skill in request.GET.getlist("skill"):
+            catalog_id, _, min_rate = skill.partition(":")
+            skills[int(catalog_id)] = int(min_rate or 0)
+        tags = [int(tag) for tag in request.GET.getlist("tag")]
+        role = request.GET.get("role")
+        role = int(role) if role else None
+        location = request.GET.get("location")
+        location = int(location) if location else None
+        start = request.GET.get("start")
+        start = utils.parse_jdate(start) if start else None
+        end = request.GET.get("end")
+        end = utils.parse_jdate(end) if end else None
+        weekdays = int(request.GET.get("weekdays", 127))
+        shift_start = int(request.GET.get("shift_start", 0))
+        shift_end = int(request.GET.get("shift_end", 0))
+    except ValueError:
+        return Response(status=status.HTTP_400_BAD_REQUEST)
+
+    gender = request.GET.get("gender") or None
+    if gender is not None and gender not in models.GenderChoices.values:
+        return Response(status=status.HTTP_400_BAD_REQUEST)
+
+    if not (
+        0 <= weekdays < 128 and 0 <= shift_start <= 24 and 0 <= shift_end <= 24
+    ):
+        return Response(status=status.HTTP_400_BAD_REQUEST)
+
+    limit = min(max(utils.to_int(request.GET.get("limit"), 10), 1), 50)
+
+    matches = matching.match(
+        skills=skills,
+        tags=tags,
+        role=role,
+        location=location,
+        gender=gender,
+        start=start,
+        end=end,
+        hours=schedule.shift_hours(weekdays, shift_start, shift_end),
+        limit=limit,
+    )
+    personnel = models.People.objects.only(
+        "pk", "firstname", "lastname", "gender"
+    ).in_bulk([people_id for people_id, _ in matches])
+
+    return Response(
+        {
+            "results": [
+                dict(
+                    id=people_id,
+                    name=personnel[people_id].fullname_with_prefix,
+                    score=score,
+                    link=reverse(
+                        "crm:personnel_preview", kwargs={"id": people_id}
+                    ),
+                )
+                for people_id, score in matches
+                if people_id in personnel
+            ]
+        }
+    )
+
+
+@api_view(["GET"])
+def personnel_agenda(request, id):
+    try:
+        date = utils.parse_jdate(request.GET.get("date") or jalali.today())
+    except ValueError:
+        return Response(status=status.HTTP_400_BAD_REQUEST)
+
+    # a single read of the snapshot, not even the personnel is looked up
+    snapshot = (
+        models.AgendaSnapshot.objects.filter(personnel_id=id, date=date)
+        .values_list("etag", "items")
+        .first()
+    )
+    etag, items = snapshot or (
+        models.AgendaSnapshot.etag_of(date, []),
+        [],
+    )
+
+    etag = f'"{etag}"'
+    if_none_match = request.headers.get("If-None-Match", "")
+    if etag in (tag.strip() for tag in if_none_match.split(",")):
+        return Response(
+            status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag}
+        )
+
+    return Response(
+        {"date": str(date), "items": items}, headers={"ETag": etag}
+    )
+
+
+@api_view(["GET"])
+def personnel_availability(request, id):
+    personnel = get_object_or_404(models.People.personnels, pk=id)
+
+    try:
+        start = utils.parse_jdate(request.GET["start"])
+        end = utils.parse_jdate(request.GET.get("end") or start)
+        weekdays = int(request.GET.get("weekdays", 127))
+        shift_start = int(request.GET.get("shift_start", 0))
+        shift_end = int(request.GET.get("shift_end", 0))
+    except (KeyError, ValueError):
+        return Response(status=status.HTTP_400_BAD_REQUEST)
+
+    if not (
+        0 <= weekdays < 128 and 0 <= shift_start <= 24 and 0 <= shift_end <= 24
+    ):
+        return Response(status=status.HTTP_400_BAD_REQUEST)
+
+    conflicts = schedule.conflicts(
+        personnel.pk,
+        start,
+        end,
+        schedule.shift_hours(weekdays, shift_start, shift_end),
+    )
+    return Response(
+        {
+            "free": not conflicts,
+            "conflicts": [
+                dict(
+                    type=conflict.kind,
+                    id=conflict.id,
+                    start=str(jalali.from_ordinal(conflict.first)),
+                    end=str(jalali.from_ordinal(conflict.last)),
+                )
+                for conflict in conflicts
+            ],
+        }
+    )
+
+
+@api_view(["GET"])
+def contract_shift_days(request, id):
+    contract = get_object_or_404(models.Contract, pk=id)
+
+    try:
+        start = utils.parse_jdate(request.GET.get("start") or contract.start)
+        end = utils.parse_jdate(request.GET.get("end") or contract.end)
+    except ValueError:
+        return Response(status=status.HTTP_400_BAD_REQUEST)
+
+    days = workdays.contract_shift_days(contract, start, end)
+    return Response({"count": len(days), "days": [str(day) for day in days]})
+
+
+def _payroll_batch_data(year: int, month: int) -> dict:
+    batch = get_object_or_404(
+        models.PayrollBatch.objects.prefetch_related(
+            Prefetch(
+                "items",
+                models.PayrollItem.objects.select_related(
+                    "personnel"
+                ).order_by("personnel__lastname", "personnel__firstname"),
+            )
+        ),
+        year=year,
+        month=month,
+    )
+    return s.PayrollBatchSerializer(batch).data
+
+
+@api_view(["GET", "POST"])
+def payroll_batch(request, year, month):
+    try:
+        payroll.month_period(year, month)
+    except ValueError:
+        return Response(status=status.HTTP_400_BAD_REQUEST)
+
+    if request.method == "POST":
+        payroll.run(year, month)
+
+    return Response(_payroll_batch_data(year, month))
+
+
+@api_view(["POST"])
+def post_payroll_batch(request, year, month):
+    batch = get_object_or_404(models.PayrollBatch, year=year, month=month)
+    payroll.post(batch)
+
+    return Response(_payroll_batch_data(year, month))
+
+
+@api_view(["GET"])
+def period_report(request, report):
+    if report not in reports.REPORTS:
+        return Response(status=status.HTTP_404_NOT_FOUND)
+
+    period = request.GET.get("period") or "month"
+    if period not in models.ReportPeriodChoices.values:
+        return Response(status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        end = utils.parse_jdate(request.GET.get("end") or jalali.today())
+        start = utils.parse_jdate(
+            request.GET.get("start") or end - datetime.timedelta(days=364)
+        )
+    except ValueError:
+        return Response(status=status.HTTP_400_BAD_REQUEST)
+
+    if start > end:
+        return Response(status=status.HTTP_400_BAD_REQUEST)
+
+    return Response(
+        {
+            "report": report,
+            "period": period,
+            "rows": reports.period_report(report, period, start, end),
+        }
+    )
+
+
 def services_section(request):
-    orders = models.Order.objects.filter().order_by("-order_at")
-    contracts = models.Contract.objects.all().order_by("-start")
-    services = models.Service.objects.all()
-    data = {
-        "tabs": [
-            utils.make_section_tab(
-                "خدمات موردی",
-                ["تاریخ", "کارفرما", "کار های انجام شده"],
-                orders,
-                "services/tables/orders.html",
-            ),
-            utils.make_section_tab(
-                "قراردادها",
-                ["تاریخ عقد قرارداد", "کارفرما", "سررسید", "فرانشیز مرکز"],
-                contracts,
-                "services/tables/contracts.html",
-            ),
-            utils.make_section_tab(
-                "سرویس ها",
-                ["عنوان سرویس", "فرانشیز مرکز", "قیمت پیشنهادی پایه"],
-                services,
-                "services/tables/services.html",
-            ),
-        ]
-    }
+    data = {"tabs": tables.get_section_tabs("services")}
 
     return render(
         request, "services/main.html", dict(section="services", data=data)
@@ -114,53 +336,13 @@ def services_section(request):
 
 
 def people_section(request):
-    clients = models.People.clients.all().order_by("-updated_at")
-    personnel = models.People.personnels.all().order_by("-updated_at")
-    cases = models.People.patients.all().order_by("-updated_at")
-    
     allowed_tabs = ("client", "personnel", "patient")
-    selected_tab = request.GET.get("tab") 
+    selected_tab = request.GET.get("tab")
     selected_tab = selected_tab if selected_tab in allowed_tabs else None
-    
+
     initiate_preview = request.GET.get("preview")
-    
-    
 
-    data = {
-        "tabs": [
-            utils.make_section_tab(
-                "client",
-                "کارفرما",
-                [
-                    "نام و نام خانوادگی",
-                    "خدمات دریافتی",
-                    "قرارداد ها",
-                    "بدهکاری",
-                ],
-                clients,
-                "people/tables/clients.html",
-            ),
-            utils.make_section_tab(
-                "personnel",
-                "پرسنل",
-                [
-                    "نام و نام خانوادگی",
-                    "نقش در مرکز",
-                    "خدمت دهی",
-                    "قرارداد ها",
-                    "قابل تسویه",
-                ],
-                personnel,
-                "people/tables/personnel.html",
-            ),
-            #     utils.make_section_tab(
-            #         "مددجو",
-            #         ["نام و نام خانوادگی", "قرارداد ها"],
-            #         cases,
-            #         "people/tables/cases.html",
-            #     ),
-        ]
-    }
+    data = {"tabs": tables.get_section_tabs("people")}
     return render(
         request,
         "people/main.html",
@@ -174,29 +356,21 @@ def people_section(request):
 
 
 def payments_section(request):
-    incomes = models.Payment.incomes.all().order_by("-paid_at")
-    outgoes = models.Payment.outgoes.all().order_by("-paid_at")
-    data = {
-        "tabs": [
-            utils.make_section_tab(
-                "پرداختی کارفرما",
-                ["تاریخ واریز", "کارفرما", "بابت", "مبلغ", "یادداشت"],
-                incomes,
-                "payments/tables/incomes.html",
-            ),
-            utils.make_section_tab(
-                "دریافتی پرسنل",
-                ["تاریخ تسویه حساب", "پرسنل", "بابت", "مبلغ", "یادداشت"],
-                outgoes,
-                "payments/tables/outgoes.html",
-            ),
-        ]
-    }
+    data = {"tabs": tables.get_section_tabs("payments")}
     return render(
         request, "payments/main.html", dict(section="payments", data=data)
     )
 
 
+@api_view(["GET"])
+def section_table(request, section, tab):
+    table = tables.get_table(section, tab)
+    if table is None:
+        return Response(status=status.HTTP_404_NOT_FOUND)
+
+    return Response(table.serve(request.query_params))
+
+
 def reports_section(request):
     return render(request, "reports/main.html", dict(section="reports"))
 
@@ -282,143 +456,408 @@ def delete_patient(request, id):
     return render(request, "users/create_change/client.html")
 
 
+def _search_params(request) -> tuple[str, str | None, int, int] | None:
+    # text, entity, page and limit of a search, None when invalid
+    query: str = (request.GET.get("q") or "").strip()
+    entity = request.GET.get("type") or None
+    if query and entity and entity not in models.SearchEntityChoices.values:
+        return None
+
+    page = max(utils.to_int(request.GET.get("page"), 1), 1)
+    if entity is None:
+        limit = min(max(utils.to_int(request.GET.get("limit"), 5), 1), 20)
+    else:
+        limit = min(max(utils.to_int(request.GET.get("limit"), 20), 1), 50)
+
+    return query, entity, page, limit
+
+
 @api_view(["GET"])
 def search(request):
-    query: str = request.GET.get("q")
+    params = _search_params(request)
+    if params is None:
+        return Response(status=status.HTTP_400_BAD_REQUEST)
+
+    query, entity, page, limit = params
     if not query:
         return Response()
 
-    if query.isdigit():
-        people_info = []
-        payments = []
-        people = []
-        if len(query) >= 3:
-            people_info = models.PeopleDetailedInfo.objects.filter(
-                Q(phone_number__contains=query)
-                | Q(card_number__contains=query)
-            )
-            payments = models.Payment.objects.filter(amount__contains=query)
-            people = models.People.objects.filter(
-                national_code__contains=query
-            )
+    if entity is None:
+        start = time.perf_counter()
+        sections = search_index.query_sections(query, limit=limit)
+        return Response(
+            _search_sections(query, sections, time.perf_counter() - start)
+        )
 
-        if people:
-            people.union(
-                models.People.objects.filter(
-                    Q(birthdate__contains=query)
-                    | Q(contract_date__contains=query)
-                    | Q(end_contract_date__contains=query)
-                )
-            )
-        else:
-            people = models.People.objects.filter(
-                Q(birthdate__contains=query)
-                | Q(contract_date__contains=query)
-                | Q(end_contract_date__contains=query)
-            )
+    return Response(_search_entity(query, entity, page, limit))
 
-        orders = models.Order.objects.filter(
-            Q(pk=query) | Q(order_at__contains=query)
-        )
-        contracts = models.Contract.objects.filter(
-            Q(pk=query) | Q(contract_at__contains=query)
-        )
 
-        return Response(
-            {
-                "people_info": s.PeopleDetailsSerializer(
-                    people_info, many=True
-                ).data,
-                "people": s.PeopleSerializer(people, many=True).data,
-                "payments": s.PaymentSerializer(payments, many=True).data,
-                "orders": s.OrderSerializer(orders, many=True).data,
-                "contracts": s.ContractSerializer(contracts, many=True).data,
-            }
-        )
+async def search_async(request):
+    """
+    Async version of search, sections are looked up without blocking the
+    event loop.
+    """
 
-    if "/" in query:
-        people = models.People.objects.filter(birthdate__contains=query)
-        orders = models.Order.objects.filter(order_at__contains=query)
-        contracts = models.Contract.objects.filter(contract_at__contains=query)
+    params = _search_params(request)
+    if params is None:
+        return HttpResponse(status=status.HTTP_400_BAD_REQUEST)
 
-        return Response(
-            {
-                "people": s.PeopleSerializer(people, many=True).data,
-                "orders": s.OrderSerializer(orders, many=True).data,
-                "contract": s.ContractSerializer(contracts, many=True).data,
-            }
+    query, entity, page, limit = params
+    if not query:
+        return HttpResponse()
+
+    if entity is None:
+        start = time.perf_counter()
+        sections = await search_index.aquery_sections(query, limit=limit)
+        elapsed = time.perf_counter() - start
+        return _json(
+            await previews.run(_search_sections, query, sections, elapsed)
         )
 
-    people = models.People.objects.filter(
-        Q(firstname__contains=query) | Q(lastname__contains=query)
+    return _json(
+        await previews.run(_search_entity, query, entity, page, limit)
     )
 
-    people_info = models.PeopleDetailedInfo.objects.filter(
-        address__contains=query
+
+def _search_entity(query: str, entity: str, page: int, limit: int) -> dict:
+    # one extra document tells whether a next page exists
+    start = time.perf_counter()
+    documents = search_index.query(
+        query, entity, limit=limit + 1, offset=(page - 1) * limit
     )
+    elapsed = time.perf_counter() - start
 
-    services = models.Service.objects.filter(title__contains=query)
+    return {
+        "query": query,
+        "page": page,
+        "did_you_mean": (
+            _did_you_mean(query) if not documents and page == 1 else None
+        ),
+        "results": _search_results(documents[:limit]),
+        "has_next": len(documents) > limit,
+        "timings": {entity: _ms(elapsed)},
+    }
 
-    tags = models.TagSpecefication.objects.filter(title__contains=query)
 
-    orders = models.Order.objects.filter(
-        Q(client__firstname__contains=query)
-        | Q(client__lastname__contains=query)
-        | Q(assigned_personnel__firstname__contains=query)
-        | Q(assigned_personnel__lastname__contains=query)
-        | Q(referral_people__firstname__contains=query)
-        | Q(referral_people__lastname__contains=query)
-        | Q(referral_other__title__contains=query)
-    )
+def _search_sections(
+    query: str, sections: list[search_index.Section], elapsed: float
+) -> dict:
+    entities = dict(models.SearchEntityChoices.choices)
+    found = any(section.documents for section in sections)
 
-    contracts = models.Contract.objects.filter(
-        Q(client__firstname__contains=query)
-        | Q(client__lastname__contains=query)
-        | Q(patients__firstname__contains=query)
-        | Q(patients__lastname__contains=query)
-        | Q(personnel__firstname__contains=query)
-        | Q(personnel__lastname__contains=query)
-        | Q(referral_people__firstname__contains=query)
-        | Q(referral_people__lastname__contains=query)
-        | Q(referral_other__title__contains=query)
-    )
+    return {
+        "query": query,
+        "did_you_mean": None if found else _did_you_mean(query),
+        "sections": [
+            {
+                "type": section.entity,
+                "type_display": entities[section.entity],
+                "results": _search_results(section.documents),
+                "has_next": section.has_next,
+                "timed_out": section.timed_out,
+            }
+            for section in sections
+        ],
+        "timings": {
+            **{section.entity: _ms(section.elapsed) for section in sections},
+            "total": _ms(elapsed),
+        },
+    }
+
+
+def _search_results(documents: list[models.SearchDocument]) -> list[dict]:
+    entities = dict(models.SearchEntityChoices.choices)
+    return [
+        {
+            "type": document.entity,
+            "type_display": entities[document.entity],
+            "id": document.object_id,
+            "title": document.title,
+            "link": document.link,
+        }
+        for document in documents
+    ]
+
+
+def _did_you_mean(query: str) -> Optional[str]:
+    # a misspelled name finds nothing, the closest name is suggested
+    matches = fuzzy.similar_names(query, limit=1)
+    return matches[0].name if matches else None
+
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000, 2)
 
-    payments = models.Payment.objects.filter(
-        Q(source__firstname__contains=query)
-        | Q(source__lastname__contains=query)
-        | Q(destination__firstname__contains=query)
-        | Q(destination__lastname__contains=query)
-    )
 
-    json_people = s.PeopleSerializer(people, many=True).data
-    json_people_info = s.PeopleDetailsSerializer(people_info, many=True).data
-    json_services = s.ServiceSerializer(services, many=True).data
-    json_tags = s.SpecificationSerializer(tags, many=True).data
-    json_orders = s.OrderSerializer(orders, many=True).data
-    json_contracts = s.ContractSerializer(contracts, many=True).data
-    json_payments = s.PaymentSerializer(payments, many=True).data
+@api_view(["GET"])
+def similar_names(request):
+    query: str = (request.GET.get("q") or "").strip()
+    if not query:
+        return Response()
+
+    limit = min(max(utils.to_int(request.GET.get("limit"), 5), 1), 20)
 
     return Response(
         {
-            "people": json_people,
-            "people_info": json_people_info,
-            "services": json_services,
-            "tags": json_tags,
-            "orders": json_orders,
-            "contracts": json_contracts,
-            "payments": json_payments,
+            "query": query,
+            "results": [
+                match._asdict()
+                for match in fuzzy.similar_names(query, limit=limit)
+            ],
         }
     )
 
 
 @api_view(["GET"])
-def order_preview(request, id):
-    order = get_object_or_404(models.Order, pk=id)
-    payment = models.Payment.objects.filter(order=order)
-    services = models.OrderServices.objects.filter(order=order)
-    data = s.OrderSerializer(order)
+def typeahead_suggestions(request):
+    query: str = request.GET.get("q") or ""
+    types = request.GET.getlist("type") or typeahead.TYPES
+    if any(type not in typeahead.TYPES for type in types):
+        return Response(status=status.HTTP_400_BAD_REQUEST)
 
-    data = {
+    limit = min(max(utils.to_int(request.GET.get("limit"), 8), 1), 20)
+
+    return Response(
+        {
+            "query": query,
+            "results": typeahead.suggest(query, limit=limit, types=types),
+        }
+    )
+
+
+_ORDER_PAYMENT_FIELDS = ["payment_type", "amount", "paid_at", "note", "link"]
+_PEOPLE_PAYMENT_FIELDS = ["amount", "paid_at", "reason", "note", "link"]
+_CALL_FIELDS = [
+    "called_at",
+    "call_direction",
+    "from_number",
+    "to_number",
+    "who_called",
+    "response_status",
+    "note",
+]
+
+ORDER_SECTIONS = [
+    previews.Section(
+        "services",
+        "خدمات",
+        "services icon",
+        lambda order: models.OrderServices.objects.filter(order=order),
+        s.OrderServiceSerializer,
+        plans.order_services,
+    ),
+    previews.Section(
+        "payments",
+        "پرداختی‌ها",
+        "payment icon",
+        lambda order: models.Payment.objects.filter(order=order),
+        functools.partial(s.PaymentSerializer, fields=_ORDER_PAYMENT_FIELDS),
+        plans.payments,
+    ),
+    previews.Section(
+        "calls",
+        "تماس‌ها",
+        "call icon",
+        lambda order: models.Call.objects.filter(order=order),
+        functools.partial(s.CallSerializer, fields=_CALL_FIELDS),
+        plans.calls,
+    ),
+]
+
+CONTRACT_SECTIONS = [
+    previews.Section(
+        "payments",
+        "پرداختی‌ها",
+        "payment icon",
+        lambda contract: models.Payment.objects.filter(contract=contract),
+        functools.partial(s.PaymentSerializer, fields=_ORDER_PAYMENT_FIELDS),
+        plans.payments,
+    ),
+    previews.Section(
+        "calls",
+        "تماس‌ها",
+        "call icon",
+        lambda contract: models.Call.objects.filter(contract=contract),
+        functools.partial(s.CallSerializer, fields=_CALL_FIELDS),
+        plans.calls,
+    ),
+]
+
+_DETAILS_SECTION = previews.Section(
+    "details",
+    "اطلاعات جزئی",
+    "details icon",
+    lambda people: models.PeopleDetailedInfo.objects.filter(
+        people=people, is_active=True
+    ),
+    s.PeopleDetailsSerializer,
+)
+
+
+# orders, contracts, payments and calls of the people, referring to them
+# by the given fields
+def _people_sections(
+    order_field: str,
+    contract_field: str,
+    order_fields: list[str],
+    contract_fields: list[str],
+) -> list[previews.Section]:
+    return [
+        previews.Section(
+            "orders",
+            "خدمات",
+            "order icon",
+            lambda people: models.Order.objects.filter(
+                **{order_field: people}
+            ),
+            functools.partial(s.OrderSerializer, fields=order_fields),
+            plans.orders,
+        ),
+        previews.Section(
+            "contracts",
+            "قراردادها",
+            "contract icon",
+            lambda people: models.Contract.objects.filter(
+                **{contract_field: people}
+            ),
+            functools.partial(s.ContractSerializer, fields=contract_fields),
+            plans.contracts,
+        ),
+        previews.Section(
+            "payments",
+            "پرداختی‌ها",
+            "payment icon",
+            lambda people: models.Payment.objects.filter(source=people),
+            functools.partial(
+                s.PaymentSerializer, fields=_PEOPLE_PAYMENT_FIELDS
+            ),
+            plans.payments,
+        ),
+        previews.Section(
+            "calls",
+            "تماس‌ها",
+            "call icon",
+            lambda people: models.Call.objects.filter(
+                Q(from_people=people) | Q(to_people=people)
+            ),
+            functools.partial(s.CallSerializer, exclude=["who_called"]),
+            plans.calls,
+        ),
+        previews.Section(
+            "referral_orders",
+            "خدمات معرفی شده",
+            "referral icon",
+            lambda people: models.Order.objects.filter(referral_people=people),
+            functools.partial(
+                s.OrderSerializer,
+                fields=["order_at", "client", "services", "link"],
+            ),
+            plans.orders,
+        ),
+        previews.Section(
+            "referral_contracts",
+            "قراردادهای معرفی شده",
+            "referral icon",
+            lambda people: models.Contract.objects.filter(
+                referral_people=people
+            ),
+            functools.partial(
+                s.ContractSerializer,
+                fields=["contract_at", "client", "patients", "link"],
+            ),
+            plans.contracts,
+        ),
+    ]
+
+
+CLIENT_SECTIONS = [
+    _DETAILS_SECTION,
+    *_people_sections(
+        "client",
+        "client",
+        [
+            "order_at",
+            "services",
+            "client_debt",
+            "client_payment_status",
+            "link",
+        ],
+        [
+            "start",
+            "end_verbose",
+            "healthcare_franchise_amount",
+            "client_payment_status",
+            "link",
+        ],
+    ),
+]
+
+PERSONNEL_SECTIONS = [
+    _DETAILS_SECTION,
+    previews.Section(
+        "tags",
+        "صفت‌ها",
+        "tags icon",
+        lambda personnel: models.Specification.objects.filter(
+            people=personnel, rate__isnull=True
+        ).values(title=F("catalog__title")),
+        s.ReferralOtherSerializer,  # They have same schema
+    ),
+    previews.Section(
+        "roles",
+        "نقش‌ها",
+        "roles icon",
+        lambda personnel: models.Catalog.objects.filter(
+            people_roles=personnel
+        ).values("title"),
+        s.TranslatedCatalogSerializer,
+    ),
+    previews.Section(
+        "skills",
+        "توانایی‌ها",
+        "sklls icon",
+        lambda personnel: models.Specification.objects.filter(
+            people=personnel, rate__isnull=False
+        ).values("rate", title=F("catalog__title")),
+        s.TranslatedCatalogSerializer,
+    ),
+    *_people_sections(
+        "assigned_personnel",
+        "personnel",
+        [
+            "order_at",
+            "services",
+            "debt_to_personnel",
+            "personnel_payment_status",
+            "link",
+        ],
+        [
+            "start",
+            "end_verbose",
+            "healthcare_franchise_amount",
+            "client_payment_status",
+            "link",
+        ],
+    ),
+]
+
+PATIENT_SECTIONS = [
+    previews.Section(
+        "contracts",
+        "قراردادها",
+        "contract icon",
+        lambda patient: models.Contract.objects.filter(patients=patient),
+        functools.partial(
+            s.ContractSerializer,
+            fields=["client", "start", "end_verbose", "link"],
+        ),
+        plans.contracts,
+    ),
+]
+
+
+def _order_header(order: models.Order) -> dict:
+    return {
         "title": "خدمت موردی",
         "icon": "test icon",
         "description": order.__str__(),
@@ -462,57 +901,11 @@ def order_preview(request, id):
         "table": s.OrderSerializer(
             order, exclude=["title", "link", "service_cost"]
         ),
-        "data_tables": [
-            {
-                "title": "خدمات",
-                "icon": "services icon",
-                "data": s.OrderServiceSerializer(services, many=True),
-            },
-            {
-                "title": "پرداختی‌ها",
-                "icon": "payment icon",
-                "data": s.PaymentSerializer(
-                    payment,
-                    fields=[
-                        "payment_type",
-                        "amount",
-                        "paid_at",
-                        "note",
-                        "link",
-                    ],
-                    many=True,
-                ),
-            },
-            {
-                "title": "تماس‌ها",
-                "icon": "call icon",
-                "data": s.CallSerializer(
-                    order.call_set.all(),
-                    many=True,
-                    fields=[
-                        "called_at",
-                        "call_direction",
-                        "from_number",
-                        "to_number",
-                        "who_called",
-                        "response_status",
-                        "note",
-                    ],
-                ),
-            },
-        ],
     }
-    serializer = s.PreviewSerializer(data).data
-
-    return Response(serializer)
 
 
-@api_view(["GET"])
-def contract_preview(request, id):
-    contract = get_object_or_404(models.Contract, pk=id)
-    payment = models.Payment.objects.filter(contract=contract)
-
-    data = {
+def _contract_header(contract: models.Contract) -> dict:
+    return {
         "title": "قرارداد مراقبت",
         "icon": "test icon",
         "description": contract.__str__(),
@@ -549,63 +942,13 @@ def contract_preview(request, id):
             },
         ],
         "table": s.ContractSerializer(contract, exclude=["link"]),
-        "data_tables": [
-            {
-                "title": "پرداختی‌ها",
-                "icon": "payment icon",
-                "data": s.PaymentSerializer(
-                    payment,
-                    fields=[
-                        "payment_type",
-                        "amount",
-                        "paid_at",
-                        "note",
-                        "link",
-                    ],
-                    many=True,
-                ),
-            },
-            {
-                "title": "تماس‌ها",
-                "icon": "call icon",
-                "data": s.CallSerializer(
-                    contract.call_set.all(),
-                    many=True,
-                    fields=[
-                        "called_at",
-                        "call_direction",
-                        "from_number",
-                        "to_number",
-                        "who_called",
-                        "response_status",
-                        "note",
-                    ],
-                ),
-            },
-        ],
     }
-    serializer = s.PreviewSerializer(data).data
-
-    return Response(serializer)
-
 
-@api_view(["GET"])
-def client_preview(request, id):
-    client = models.People.clients.filter(pk=id).first()
-    if not client:
-        return Response({"error": "client not found."})
-
-    client_calls = models.Call.objects.filter(
-        Q(from_people=client) | Q(to_people=client)
-    )
-    referraled_orders = models.Order.objects.filter(referral_people=client)
-    referraled_contracts = models.Contract.objects.filter(
-        referral_people=client
-    )
 
-    edit_link = reverse("crm:edit_client", kwargs={"id": id})
+def _client_header(client: models.People) -> dict:
+    edit_link = reverse("crm:edit_client", kwargs={"id": client.pk})
 
-    data = {
+    return {
         "title": "کارفرما",
         "icon": "client icon",
         "description": client.__str__(),
@@ -650,102 +993,13 @@ def client_preview(request, id):
             ],
             exclude=["link"],
         ),
-        "data_tables": [
-            {
-                "title": "اطلاعات جزئی",
-                "icon": "details icon",
-                "data": s.PeopleDetailsSerializer(
-                    client.details.filter(is_active=True), many=True
-                ),
-            },
-            {
-                "title": "خدمات",
-                "icon": "order icon",
-                "data": s.OrderSerializer(
-                    client.client_orders.all(),
-                    fields=[
-                        "order_at",
-                        "services",
-                        "client_debt",
-                        "client_payment_status",
-                        "link",
-                    ],
-                    many=True,
-                ),
-            },
-            {
-                "title": "قراردادها",
-                "icon": "contract icon",
-                "data": s.ContractSerializer(
-                    client.client_contracts.all(),
-                    fields=[
-                        "start",
-                        "end_verbose",
-                        "healthcare_franchise_amount",
-                        "client_payment_status",
-                        "link",
-                    ],
-                    many=True,
-                ),
-            },
-            {
-                "title": "پرداختی‌ها",
-                "icon": "payment icon",
-                "data": s.PaymentSerializer(
-                    client.source_payments.all(),
-                    fields=["amount", "paid_at", "reason", "note", "link"],
-                    many=True,
-                ),
-            },
-            {
-                "title": "تماس‌ها",
-                "icon": "call icon",
-                "data": s.CallSerializer(
-                    client_calls, many=True, exclude=["who_called"]
-                ),
-            },
-            {
-                "title": "خدمات معرفی شده",
-                "icon": "referral icon",
-                "data": s.OrderSerializer(
-                    referraled_orders,
-                    many=True,
-                    fields=["order_at", "client", "services", "link"],
-                ),
-            },
-            {
-                "title": "قراردادهای معرفی شده",
-                "icon": "referral icon",
-                "data": s.ContractSerializer(
-                    referraled_contracts,
-                    many=True,
-                    fields=["contract_at", "client", "patients", "link"],
-                ),
-            },
-        ],
     }
 
-    serializer = s.PreviewSerializer(data).data
-    return Response(serializer)
-
-
-@api_view(["GET"])
-def personnel_preview(request, id):
-    personnel: models.People = models.People.personnels.filter(pk=id).first()
-    if not personnel:
-        return Response({"error": "personnel not found."})
-
-    personnel_calls = models.Call.objects.filter(
-        Q(from_people=personnel) | Q(to_people=personnel)
-    )
-    referraled_orders = models.Order.objects.filter(referral_people=personnel)
-    referraled_contracts = models.Contract.objects.filter(
-        referral_people=personnel
-    )
 
-    edit_link = reverse("crm:edit_personnel", kwargs={"id": id})
+def _personnel_header(personnel: models.People) -> dict:
+    edit_link = reverse("crm:edit_personnel", kwargs={"id": personnel.pk})
 
-    data = {
+    return {
         "title": "پرسنل",
         "icon": "personnel icon",
         "description": personnel.__str__(),
@@ -784,113 +1038,11 @@ def personnel_preview(request, id):
             ],
             exclude=["link"],
         ),
-        "data_tables": [
-            {
-                "title": "اطلاعات جزئی",
-                "icon": "details icon",
-                "data": s.PeopleDetailsSerializer(
-                    personnel.details.filter(is_active=True), many=True
-                ),
-            },
-            {
-                "title": "صفت‌ها",
-                "icon": "tags icon",
-                "data": s.ReferralOtherSerializer(  # They have same schema
-                    personnel.tags_title, many=True
-                ),
-            },
-            {
-                "title": "نقش‌ها",
-                "icon": "roles icon",
-                "data": s.TranslatedCatalogSerializer(
-                    personnel.get_roles_titles, many=True
-                ),
-            },
-            {
-                "title": "توانایی‌ها",
-                "icon": "sklls icon",
-                "data": s.TranslatedCatalogSerializer(
-                    personnel.skills_title, many=True
-                ),
-            },
-            {
-                "title": "خدمات",
-                "icon": "order icon",
-                "data": s.OrderSerializer(
-                    personnel.personnel_orders.all(),
-                    fields=[
-                        "order_at",
-                        "services",
-                        "debt_to_personnel",
-                        "personnel_payment_status",
-                        "link",
-                    ],
-                    many=True,
-                ),
-            },
-            {
-                "title": "قراردادها",
-                "icon": "contract icon",
-                "data": s.ContractSerializer(
-                    personnel.personnel_contracts.all(),
-                    fields=[
-                        "start",
-                        "end_verbose",
-                        "healthcare_franchise_amount",
-                        "client_payment_status",
-                        "link",
-                    ],
-                    many=True,
-                ),
-            },
-            {
-                "title": "پرداختی‌ها",
-                "icon": "payment icon",
-                "data": s.PaymentSerializer(
-                    personnel.source_payments.all(),
-                    fields=["amount", "paid_at", "reason", "note", "link"],
-                    many=True,
-                ),
-            },
-            {
-                "title": "تماس‌ها",
-                "icon": "call icon",
-                "data": s.CallSerializer(
-                    personnel_calls, many=True, exclude=["who_called"]
-                ),
-            },
-            {
-                "title": "خدمات معرفی شده",
-                "icon": "referral icon",
-                "data": s.OrderSerializer(
-                    referraled_orders,
-                    many=True,
-                    fields=["order_at", "client", "services", "link"],
-                ),
-            },
-            {
-                "title": "قراردادهای معرفی شده",
-                "icon": "referral icon",
-                "data": s.ContractSerializer(
-                    referraled_contracts,
-                    many=True,
-                    fields=["contract_at", "client", "patients", "link"],
-                ),
-            },
-        ],
     }
 
-    serializer = s.PreviewSerializer(data).data
-    return Response(serializer)
-
-
-@api_view(["GET"])
-def patient_preview(request, id):
-    patient = models.People.patients.filter(pk=id).first()
-    if not patient:
-        return Response({"error": "patient not found."})
 
-    data = {
+def _patient_header(patient: models.People) -> dict:
+    return {
         "title": "بیمار",
         "icon": "patient icon",
         "description": patient.__str__(),
@@ -907,56 +1059,269 @@ def patient_preview(request, id):
             },
         ],
         "table": s.PeopleSerializer(patient, exclude=["link"]),
-        "data_tables": [
-            {
-                "title": "قراردادها",
-                "icon": "contract icon",
-                "data": s.ContractSerializer(
-                    patient.patient_contracts.all(),
-                    fields=[
-                        "client",
-                        "start",
-                        "end_verbose",
-                        "link",
-                    ],
-                    many=True,
-                ),
-            },
-        ],
     }
 
-    serializer = s.PreviewSerializer(data).data
-    return Response(serializer)
+
+# objects, query plan, header and sections of each preview
+_PREVIEWS = {
+    previews.ORDER: (
+        models.Order.objects,
+        plans.order_headers,
+        _order_header,
+        ORDER_SECTIONS,
+    ),
+    previews.CONTRACT: (
+        models.Contract.objects,
+        plans.contract_headers,
+        _contract_header,
+        CONTRACT_SECTIONS,
+    ),
+    previews.CLIENT: (
+        models.People.clients,
+        plans.people_headers,
+        _client_header,
+        CLIENT_SECTIONS,
+    ),
+    previews.PERSONNEL: (
+        models.People.personnels,
+        plans.people_headers,
+        _personnel_header,
+        PERSONNEL_SECTIONS,
+    ),
+    previews.PATIENT: (
+        models.People.patients,
+        plans.people_headers,
+        _patient_header,
+        PATIENT_SECTIONS,
+    ),
+}
+
+
+def _preview_link(entity: str, id: int) -> str:
+    return reverse(f"crm:{entity}_preview", kwargs={"id": id})
+
+
+def _build_previews(entity: str, ids: list[int]) -> dict[int, dict]:
+    # previews of the given objects keyed by id, the objects, the rows of
+    # their headers and the counts of their sections are queried once for
+    # all of them
+    objects, plan, header, sections = _PREVIEWS[entity]
+    built = {}
+    for obj in previews.with_counts(
+        plan(objects.filter(pk__in=ids)), sections
+    ):
+        data = header(obj)
+        data["sections"] = previews.describe(
+            sections,
+            previews.counts(obj, sections),
+            _preview_link(entity, obj.pk),
+        )
+        built[obj.pk] = s.PreviewSerializer(data).data
+
+    return built
+
+
+def _header(entity: str, id: int) -> dict | None:
+    # the preview of the object without its sections, None when it does
+    # not exist
+    objects, plan, header, _ = _PREVIEWS[entity]
+    obj = plan(objects.filter(pk=id)).first()
+    if obj is None:
+        return None
+
+    return s.PreviewSerializer({**header(obj), "sections": []}).data
+
+
+def _section_page(params, sections: list[previews.Section], id: int):
+    # the page of the section asked by the query parameters, None when no
+    # section is asked
+    page = previews.page(params, sections, id)
+    return None if page is None else s.DataTableSerializer(page).data
+
+
+def _preview(request, entity: str, id: int) -> dict | None:
+    # the page of a section when one is asked, the preview otherwise and
+    # None when the object does not exist
+    page = _section_page(request.query_params, _PREVIEWS[entity][3], id)
+    if page is not None:
+        return page
+
+    return _build_previews(entity, [id]).get(id)
+
+
+def _json(data) -> JsonResponse:
+    return JsonResponse(
+        data, safe=False, json_dumps_params={"ensure_ascii": False}
+    )
+
+
+async def preview_async(request, entity: str, id: int):
+    """
+    Async version of the preview views, the header and the count of
+    every section are queried at the same time, each on its own
+    connection. Payloads are shared with the cache of the sync views.
+    """
+
+    sections = _PREVIEWS[entity][3]
+
+    async def build() -> dict:
+        page = await previews.run(_section_page, request.GET, sections, id)
+        if page is not None:
+            return page
+
+        header, counts = await asyncio.gather(
+            previews.run(_header, entity, id),
+            previews.acounts(sections, id),
+        )
+        if header is None:
+            if entity in (previews.ORDER, previews.CONTRACT):
+                # answered like the 404 of the sync views
+                raise NotFound
+            return {"error": f"{entity} not found."}
+
+        header["sections"] = previews.describe(
+            sections, counts, _preview_link(entity, id)
+        )
+        return header
+
+    try:
+        payload = await previews.aget(
+            entity, id, build, previews.page_part(request.GET)
+        )
+    except APIException as exc:
+        return JsonResponse({"detail": exc.detail}, status=exc.status_code)
+
+    return _json(payload)
+
+
+@api_view(["GET"])
+def preview_stats(request):
+    return Response(previews.stats())
+
+
+@api_view(["GET"])
+def preview_batch(request):
+    ids = {}
+    try:
+        for entity in previews.PREVIEWS:
+            ids[entity] = [
+                int(id)
+                for value in request.GET.getlist(entity)
+                for id in value.split(",")
+                if id
+            ]
+    except ValueError:
+        return Response(status=status.HTTP_400_BAD_REQUEST)
+
+    if sum(len(entity_ids) for entity_ids in ids.values()) > (
+        previews.MAX_BATCH
+    ):
+        return Response(status=status.HTTP_400_BAD_REQUEST)
+
+    return Response(
+        {
+            entity: previews.get_many(
+                entity,
+                entity_ids,
+                functools.partial(_build_previews, entity),
+            )
+            for entity, entity_ids in ids.items()
+            if entity_ids
+        }
+    )
+
+
+@api_view(["GET"])
+@previews.cached(previews.ORDER)
+def order_preview(request, id):
+    preview = _preview(request, previews.ORDER, id)
+    if preview is None:
+        raise Http404
+
+    return Response(preview)
+
+
+@api_view(["GET"])
+@previews.cached(previews.CONTRACT)
+def contract_preview(request, id):
+    preview = _preview(request, previews.CONTRACT, id)
+    if preview is None:
+        raise Http404
+
+    return Response(preview)
+
+
+@api_view(["GET"])
+@previews.cached(previews.CLIENT)
+def client_preview(request, id):
+    preview = _preview(request, previews.CLIENT, id)
+    if preview is None:
+        return Response({"error": "client not found."})
+
+    return Response(preview)
+
+
+@api_view(["GET"])
+@previews.cached(previews.PERSONNEL)
+def personnel_preview(request, id):
+    preview = _preview(request, previews.PERSONNEL, id)
+    if preview is None:
+        return Response({"error": "personnel not found."})
+
+    return Response(preview)
+
+
+@api_view(["GET"])
+@previews.cached(previews.PATIENT)
+def patient_preview(request, id):
+    preview = _preview(request, previews.PATIENT, id)
+    if preview is None:
+        return Response({"error": "patient not found."})
+
+    return Response(preview)
 
 
 @api_view(["GET"])
 def service_preview(request, id):
     service = get_object_or_404(models.Service, pk=id)
-    related_orders = models.Order.objects.filter(services=service)
+    sections = [
+        previews.Section(
+            "orders",
+            "خدمات",
+            "order icon",
+            lambda service: models.Order.objects.filter(services=service),
+            functools.partial(
+                s.OrderSerializer,
+                fields=[
+                    "order_at",
+                    "title",
+                    "service_cost",
+                    "total_cost",
+                    "link",
+                ],
+            ),
+            functools.partial(plans.service_orders, service=service),
+        ),
+    ]
+    page = _section_page(request.query_params, sections, id)
+    if page is not None:
+        return Response(page)
 
     data = {
         "title": "سرویس",
         "icon": "service icon",
         "description": f"سرویس {service.__str__()}",
         "table": s.ServiceSerializer(service),
-        "data_tables": [
-            {
-                "title": "خدمات",
-                "icon": "order icon",
-                "data": s.OrderSerializer(
-                    related_orders,
-                    many=True,
-                    fields=[
-                        "order_at",
-                        "title",
-                        "service_cost",
-                        "total_cost",
-                        "link",
-                    ],
-                    context={"service": service},
-                ),
-            },
-        ],
+        "sections": previews.describe(
+            sections,
+            previews.counts(
+                previews.with_counts(
+                    models.Service.objects.filter(pk=id), sections
+                ).get(),
+                sections,
+            ),
+            request.path,
+        ),
     }
     serializer = s.PreviewSerializer(data).data
 
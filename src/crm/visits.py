@@ -0,0 +1,165 @@
+from typing import Iterable
+
+from django.core.cache import cache
+from django.db import transaction
+
+from . import jalali, models, workdays
+from .models import VisitStatusChoices as vsc
+
+# visits are generated this many days ahead, the job generating them
+# has to run more often than that
+HORIZON_DAYS = 28
+BATCH_SIZE = 1000
+
+_HOLIDAYS_CHANGED = "visits:holidays_changed"
+
+
+def holidays_changed():
+    """
+    Marking the visits as stale after holidays were added, moved or
+    removed, the next run of the generate_visits command with --pending
+    regenerates them.
+    """
+
+    cache.set(_HOLIDAYS_CHANGED, True, None)
+
+
+def take_holidays_changed() -> bool:
+    """
+    Whether holidays changed since the last call, the mark is removed
+    before generating so changes made meanwhile are not lost.
+    """
+
+    return cache.delete(_HOLIDAYS_CHANGED)
+
+
+def _visits(contracts, start, end) -> dict[tuple, tuple]:
+    # personnel and shift hours of the visits keyed by contract and day,
+    # contracts with the same weekdays, holiday choice and period share
+    # their shift days
+    shift_days = {}
+    visits = {}
+    for (
+        pk,
+        personnel_id,
+        *weekdays,
+        include_holidays,
+        shift_start,
+        shift_end,
+        contract_start,
+        contract_end,
+    ) in contracts.order_by().values_list(
+        "pk",
+        "personnel_id",
+        *workdays.WEEKDAYS,
+        "include_holidays",
+        "shift_start",
+        "shift_end",
+        "start",
+        "end",
+    ):
+        mask = sum(1 << weekday for weekday, on in enumerate(weekdays) if on)
+        first = max(
+            jalali.to_ordinal(start), jalali.to_ordinal(contract_start)
+        )
+        last = min(jalali.to_ordinal(end), jalali.to_ordinal(contract_end))
+
+        key = (mask, include_holidays, first, last)
+        if key not in shift_days:
+            shift_days[key] = workdays.list_shift_days(
+                mask,
+                include_holidays,
+                jalali.from_ordinal(first),
+                jalali.from_ordinal(last),
+            )
+
+        for date in shift_days[key]:
+            visits[(pk, date)] = (personnel_id, shift_start, shift_end)
+
+    return visits
+
+
+@transaction.atomic
+def generate(
+    contract_ids: Iterable[int] | None = None,
+    start: jalali.JDate | None = None,
+    days: int = HORIZON_DAYS,
+) -> tuple[int, int]:
+    """
+    Generating the visits of the given days from the calendars of the
+    contracts, with batched inserts of the new and changed ones.
+    Scheduled visits which are not shift days anymore are removed and
+    the rest follow the personnel and shift hours of their contract.
+
+    Args:
+        contract_ids: Contracts to generate the visits of, every contract
+            by default.
+        start: First day to generate, today by default.
+        days: Number of days to generate.
+
+    Returns:
+        Number of written and removed visits.
+    """
+
+    start = start or jalali.today()
+    end = jalali.from_ordinal(jalali.to_ordinal(start) + days - 1)
+
+    contracts = models.Contract.objects.filter(start__lte=end, end__gte=start)
+    existing = models.Visit.objects.filter(date__range=(start, end))
+    if contract_ids is not None:
+        contract_ids = set(contract_ids)
+        contracts = contracts.filter(pk__in=contract_ids)
+        existing = existing.filter(contract_id__in=contract_ids)
+
+    visits = _visits(contracts, start, end)
+
+    # only new and changed visits are written, so daily runs mostly
+    # insert the day which came within the horizon
+    stale_ids = []
+    # agendas holding the visits before they change
+    changed = set()
+    for pk, contract_id, date, status, *values in existing.values_list(
+        "pk",
+        "contract_id",
+        "date",
+        "status",
+        "personnel_id",
+        "shift_start",
+        "shift_end",
+    ):
+        wanted = visits.get((contract_id, date))
+        if status != vsc.SCHEDULED:
+            # attended and absent visits stay with the personnel who had
+            # them
+            visits.pop((contract_id, date), None)
+        elif wanted is None:
+            stale_ids.append(pk)
+        elif wanted == tuple(values):
+            del visits[(contract_id, date)]
+        else:
+            changed.add((values[0], date))
+
+    # the receivers of the deleted visits refresh their agendas
+    models.Visit.objects.filter(pk__in=stale_ids).delete()
+    models.Visit.objects.bulk_create(
+        [
+            models.Visit(
+                contract_id=contract_id,
+                date=date,
+                personnel_id=values[0],
+                shift_start=values[1],
+                shift_end=values[2],
+            )
+            for (contract_id, date), values in visits.items()
+        ],
+        batch_size=BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=["contract", "date"],
+        update_fields=["personnel", "shift_start", "shift_end", "updated_at"],
+    )
+
+    # bulk writes do not send the signals which patch the agendas
+    changed.update((values[0], date) for (_, date), values in visits.items())
+    transaction.on_commit(lambda: models.AgendaSnapshot.refresh(changed))
+
+    return len(visits), len(stale_ids)
@@ -0,0 +1,255 @@
+import time
+from functools import lru_cache
+from typing import Iterator
+
+from django.db.models import QuerySet
+
+from . import jalali, models, utils
+
+# weekday fields of contracts, saturday is bit 0 of a weekday mask the
+# same as the weekday of jalali dates
+WEEKDAYS = [
+    "saturday",
+    "sunday",
+    "monday",
+    "tuesday",
+    "wednesday",
+    "thursday",
+    "friday",
+]
+
+_CACHE_NAME = "holidays"
+# seconds the shift days memoized by a process are used for at most, in
+# case the shared holidays version is lost together with the cache
+MEMO_TIMEOUT = 10 * 60
+
+
+def invalidate():
+    """
+    Dropping the cached shift days, called whenever holidays change.
+    """
+
+    utils.invalidate_cache_version(_CACHE_NAME)
+
+
+def _version() -> tuple[int, int]:
+    # the memos of every process are keyed by the holidays version of the
+    # shared cache and the current period of the memo timeout
+    return (
+        utils.get_cache_version(_CACHE_NAME),
+        int(time.monotonic() // MEMO_TIMEOUT),
+    )
+
+
+def weekday_mask(contract) -> int:
+    """
+    Bitset of the weekdays the given contract has a shift on.
+    """
+
+    return sum(
+        1 << weekday
+        for weekday, name in enumerate(WEEKDAYS)
+        if getattr(contract, name)
+    )
+
+
+# days of a month are bitsets too, day 1 is bit 0
+
+
+@lru_cache(maxsize=4096)
+def _weekday_days(year: int, month: int) -> tuple[int, ...]:
+    # days of the month falling on each weekday
+    first_weekday = jalali.from_parts(year, month, 1).weekday()
+    days = [0] * 7
+    for day in range(jalali.days_in_month(year, month)):
+        days[(first_weekday + day) % 7] |= 1 << day
+
+    return tuple(days)
+
+
+@lru_cache(maxsize=256)
+def _holiday_days(year: int, version: tuple) -> tuple[int, ...]:
+    # holidays of every month of the year, read with one query
+    months = [0] * 12
+    for date in models.Holiday.objects.filter(
+        date__gte=jalali.from_parts(year, 1, 1),
+        date__lt=jalali.from_parts(year + 1, 1, 1),
+    ).values_list("date", flat=True):
+        months[date.month - 1] |= 1 << (date.day - 1)
+
+    return tuple(months)
+
+
+@lru_cache(maxsize=8192)
+def _month_shift_days(
+    mask: int, include_holidays: bool, year: int, month: int, version: tuple
+) -> int:
+    weekday_days = _weekday_days(year, month)
+    days = 0
+    for weekday in range(7):
+        if mask >> weekday & 1:
+            days |= weekday_days[weekday]
+
+    if not include_holidays:
+        days &= ~_holiday_days(year, version)[month - 1]
+
+    return days
+
+
+def _months(
+    start: jalali.JDate, end: jalali.JDate
+) -> Iterator[tuple[int, int, int]]:
+    # year, month and the days between start and end of every month
+    year, month = start.year, start.month
+    while (year, month) <= (end.year, end.month):
+        first = start.day if (year, month) == (start.year, start.month) else 1
+        if (year, month) == (end.year, end.month):
+            last = end.day
+        else:
+            last = jalali.days_in_month(year, month)
+
+        yield year, month, (1 << last) - (1 << (first - 1))
+
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def _count_shift_days(mask, include_holidays, start, end, version) -> int:
+    return sum(
+        (
+            _month_shift_days(mask, include_holidays, year, month, version)
+            & days
+        ).bit_count()
+        for year, month, days in _months(start, end)
+    )
+
+
+def count_shift_days(
+    mask: int,
+    include_holidays: bool,
+    start: jalali.JDate,
+    end: jalali.JDate,
+) -> int:
+    """
+    Number of shift days between the given dates, both included.
+
+    Args:
+        mask: Weekdays with a shift, see weekday_mask.
+        include_holidays: Whether shifts are held on holidays too.
+        start: First day of the period.
+        end: Last day of the period.
+    """
+
+    return _count_shift_days(
+        mask,
+        include_holidays,
+        start,
+        end,
+        _version(),
+    )
+
+
+def list_shift_days(
+    mask: int,
+    include_holidays: bool,
+    start: jalali.JDate,
+    end: jalali.JDate,
+) -> list[jalali.JDate]:
+    """
+    Shift days between the given dates, both included, the arguments
+    are the same as count_shift_days.
+    """
+
+    version = _version()
+    shift_days = []
+    for year, month, days in _months(start, end):
+        days &= _month_shift_days(mask, include_holidays, year, month, version)
+        while days:
+            lowest = days & -days
+            shift_days.append(
+                jalali.from_parts(year, month, lowest.bit_length())
+            )
+            days ^= lowest
+
+    return shift_days
+
+
+def _contract_period(contract, start, end) -> tuple | None:
+    # the part of the period within the contract
+    first = max(jalali.to_ordinal(start), jalali.to_ordinal(contract.start))
+    last = min(jalali.to_ordinal(end), jalali.to_ordinal(contract.end))
+    if first > last:
+        return None
+
+    return jalali.from_ordinal(first), jalali.from_ordinal(last)
+
+
+def contract_shift_days(
+    contract: models.Contract,
+    start: jalali.JDate | None = None,
+    end: jalali.JDate | None = None,
+) -> list[jalali.JDate]:
+    """
+    Shift days of the contract within the given period, the whole
+    contract by default.
+    """
+
+    period = _contract_period(
+        contract, start or contract.start, end or contract.end
+    )
+    if period is None:
+        return []
+
+    return list_shift_days(
+        weekday_mask(contract), contract.include_holidays, *period
+    )
+
+
+def count_contracts_shift_days(
+    contracts: QuerySet, start: jalali.JDate, end: jalali.JDate
+) -> dict[int, int]:
+    """
+    Number of shift days of every contract within the given period, for
+    thousands of contracts at once. Contracts only differ by their
+    weekdays, holiday choice and dates, so every month is computed once
+    per combination and each contract costs a few bit operations.
+
+    Args:
+        contracts: Contracts to count the days of.
+        start: First day of the period.
+        end: Last day of the period.
+
+    Returns:
+        Number of shift days keyed by contract id.
+    """
+
+    rows = contracts.order_by().values_list(
+        "pk", *WEEKDAYS, "include_holidays", "start", "end"
+    )
+
+    version = _version()
+    counts = {}
+    computed = {}
+    for pk, *weekdays, include_holidays, contract_start, contract_end in rows:
+        mask = sum(1 << weekday for weekday, on in enumerate(weekdays) if on)
+        first = max(
+            jalali.to_ordinal(start), jalali.to_ordinal(contract_start)
+        )
+        last = min(jalali.to_ordinal(end), jalali.to_ordinal(contract_end))
+
+        key = (mask, include_holidays, first, last)
+        if key not in computed:
+            computed[key] = (
+                _count_shift_days(
+                    mask,
+                    include_holidays,
+                    jalali.from_ordinal(first),
+                    jalali.from_ordinal(last),
+                    version,
+                )
+                if first <= last
+                else 0
+            )
+
+        counts[pk] = computed[key]
+
+    return counts
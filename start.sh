@@ -9,4 +9,5 @@ until psql -h localhost -U postgres -c '\l'; do
 done
 
 python3 src/manage.py migrate
+python3 src/manage.py createcachetable
 python3 src/manage.py runserver 0.0.0.0:8000
@@ -0,0 +1,16 @@
+#!/bin/bash
+
+# start postgreSQL in the background
+docker-entrypoint.sh postgres &
+
+until psql -h localhost -U postgres -c '\l'; do
+  echo 'Waiting for PostgreSQL to start...'
+  sleep 1
+done
+
+python3 src/manage.py migrate
+python3 src/manage.py createcachetable
+# async views run on the event loop of each worker, sync ones on its
+# threads
+uvicorn config.asgi:application --app-dir src --host 0.0.0.0 --port 8000 \
+  --workers "${WEB_CONCURRENCY:-4}"